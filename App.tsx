@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Navbar } from './components/Navbar';
 import { Dashboard } from './components/Dashboard';
 import { Login } from './components/Login';
@@ -7,8 +7,10 @@ import { ReportsPage } from './components/ReportsPage';
 import { UploadSection } from './components/UploadSection';
 import { EquipmentTable } from './components/EquipmentTable';
 import { HistoryList } from './components/HistoryList';
-import { getSummary, getEquipment, getHistory, isDemoMode as apiIsDemoMode } from './services/api';
-import { EquipmentItem, SummaryStats, HistoryEntry } from './types';
+import {
+  getSummary, getEquipment, getHistory, getDataVersion, getChanges, applyChanges, isDemoMode as apiIsDemoMode
+} from './services/api';
+import { EquipmentItem, SummaryStats, HistoryEntry, ChangeSet, DataUpdate } from './types';
 
 type Tab = 'dashboard' | 'equipment' | 'reports';
 
@@ -46,6 +48,8 @@ const App: React.FC = () => {
   const [isLive, setIsLive] = useState(false);
   const [isDemo, setIsDemo] = useState(true);
   const [notifications, setNotifications] = useState<Notification[]>([]);
+  // Data version the local equipment/history state is up to date with
+  const dataVersion = useRef<number | null>(null);
 
   // Check if user is already logged in on mount
   useEffect(() => {
@@ -122,6 +126,8 @@ const App: React.FC = () => {
   const fetchData = useCallback(async () => {
     setLoading(true);
     try {
+      // Read the version first: anything committed during the load is replayed harmlessly
+      const version = await getDataVersion();
       const [sumRes, eqRes, histRes] = await Promise.all([
         getSummary(),
         getEquipment(),
@@ -130,6 +136,7 @@ const App: React.FC = () => {
       setSummary(sumRes);
       setEquipment(eqRes);
       setHistory(histRes);
+      dataVersion.current = version;
       // apiIsDemoMode updates based on the success of the fetch calls in services/api.ts
       setIsDemo(apiIsDemoMode);
     } catch (err) {
@@ -140,6 +147,35 @@ const App: React.FC = () => {
     }
   }, []);
 
+  // Patch local state with what changed since the last load; full reload if that fails
+  const syncChanges = useCallback(async () => {
+    const since = dataVersion.current;
+    const changes = since === null ? null : await getChanges(since);
+    if (!changes) {
+      fetchData();
+      return;
+    }
+    setEquipment(prev => applyChanges(prev, changes, changes.items, item => item.upload_session));
+    setHistory(prev => applyChanges(prev, changes, changes.sessions, entry => entry.id));
+    dataVersion.current = changes.version;
+    setSummary(await getSummary());
+  }, [fetchData]);
+
+  // Apply a pushed delta when it starts at or before our version; otherwise sync over HTTP
+  const applyUpdate = useCallback((update: DataUpdate) => {
+    const current = dataVersion.current;
+    if (current !== null && update.version !== undefined && update.version <= current) return;
+    if (update.refetch || !update.summary || current === null || update.since == null || update.since > current) {
+      syncChanges();
+      return;
+    }
+    const changes = update as ChangeSet;
+    setEquipment(prev => applyChanges(prev, changes, changes.items, item => item.upload_session));
+    setHistory(prev => applyChanges(prev, changes, changes.sessions, entry => entry.id));
+    setSummary(update.summary);
+    dataVersion.current = changes.version;
+  }, [syncChanges]);
+
   // Initial Data Load (only if authenticated)
   useEffect(() => {
     if (isAuthenticated) {
@@ -164,8 +200,8 @@ const App: React.FC = () => {
         socket.onopen = () => setIsLive(true);
         socket.onmessage = (event) => {
           const data = JSON.parse(event.data);
-          // If backend says data changed, refresh our local state
-          if (data.message === 'data_updated') fetchData();
+          // The update carries what changed; fall back to fetching it
+          if (data.message === 'data_updated') applyUpdate(data);
         };
         socket.onclose = () => {
           setIsLive(false);
@@ -183,7 +219,7 @@ const App: React.FC = () => {
 
     connectWS();
     return () => { if (socket) socket.close(); };
-  }, [isAuthenticated, isDemo, fetchData]);
+  }, [isAuthenticated, isDemo, applyUpdate]);
 
   // If not authenticated, show login page
   if (!isAuthenticated) {
@@ -0,0 +1,135 @@
+"""
+Batch uploads: several data files, or one zip of them, stored as a single
+UploadSession. Files are parsed in parallel on a process pool while the
+parent inserts finished files, all inside one transaction, so a batch pays
+for one retention sweep and one ``data_update`` broadcast.
+"""
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from .caching import bump_data_version
+from .ingest import chunk_rows, deferred_indexes, insert_columns, upload_rows
+from .models import UploadSession
+from .parsing import SUPPORTED_EXTENSIONS, IngestError, parse_file
+from .stats import SessionStatsBuilder
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parse_workers():
+    return getattr(settings, 'INGEST_PARSE_WORKERS', None) or os.cpu_count() or 1
+
+
+def new_parse_pool(workers=None):
+    # spawn, not fork: the server process is multi-threaded
+    return ProcessPoolExecutor(
+        max_workers=workers or parse_workers(),
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def get_parse_pool():
+    """Process pool shared by all batch uploads in this process, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = new_parse_pool()
+        return _pool
+
+
+def _is_supported(name):
+    base = os.path.basename(name)
+    return base.lower().endswith(SUPPORTED_EXTENSIONS) and not base.startswith('.') and '__MACOSX' not in name
+
+
+def _spool(stream, directory, index, name):
+    # Keep the extension: parse_file() picks the reader from it
+    ext = os.path.splitext(name)[1].lower() if _is_supported(name) else '.csv'
+    path = os.path.join(directory, f'{index:05d}{ext}')
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: stream.read(1 << 20), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def spool_batch(files, directory):
+    """
+    Writes every data file in ``files`` (zip archives are expanded) into
+    ``directory``. Returns ``([(name, path), ...], batch_hash)``; the batch
+    hash depends only on the set of file contents, not on names or order.
+    """
+    entries = []
+    digests = []
+    for uploaded in files:
+        if uploaded.name.lower().endswith('.zip'):
+            with zipfile.ZipFile(uploaded) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not _is_supported(info.filename):
+                        continue
+                    with archive.open(info) as member:
+                        path, digest = _spool(member, directory, len(entries), info.filename)
+                    entries.append((info.filename, path))
+                    digests.append(digest)
+        else:
+            path, digest = _spool(uploaded, directory, len(entries), uploaded.name)
+            entries.append((uploaded.name, path))
+            digests.append(digest)
+    if not entries:
+        raise IngestError("No data files found in upload")
+    batch_hash = hashlib.sha256(''.join(sorted(digests)).encode()).hexdigest()
+    return entries, batch_hash
+
+
+def batch_filename(files, entries):
+    if len(files) == 1:
+        return files[0].name[:255]
+    first = os.path.basename(entries[0][0])
+    return f"{first} (+{len(entries) - 1} more)"[:255]
+
+
+def ingest_batch(entries, filename, content_hash=None, workers=None):
+    """
+    Parses ``entries`` on the process pool and inserts each file as soon as it
+    is parsed, in submission order, inside one transaction. ``workers`` runs
+    on a dedicated pool of that size instead of the shared one.
+    """
+    pool = new_parse_pool(workers) if workers else get_parse_pool()
+    futures = [pool.submit(parse_file, path, chunk_rows()) for _, path in entries]
+    try:
+        with transaction.atomic():
+            session = UploadSession.objects.create(filename=filename, item_count=0, content_hash=content_hash or None)
+            stats = SessionStatsBuilder()
+            total = 0
+            with deferred_indexes(upload_rows(*(path for _, path in entries))):
+                for (name, _), future in zip(entries, futures):
+                    try:
+                        columns = future.result()
+                    except Exception as e:
+                        raise IngestError(f"{name}: {e}") from e
+                    total += insert_columns(session, columns)
+                    stats.add(columns)
+            stats.save(session)
+            session.item_count = total
+            session.save(update_fields=['item_count'])
+            bump_data_version(added=[session.id])
+    finally:
+        for future in futures:
+            future.cancel()
+        if workers:
+            pool.shutdown()
+    return session
+
+
+def discard_spool(directory):
+    shutil.rmtree(directory, ignore_errors=True)
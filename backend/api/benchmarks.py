@@ -0,0 +1,138 @@
+"""
+Shared helpers for the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: they run against a throwaway
+test database (a temp file for SQLite, ``test_<name>`` elsewhere) and each
+measured case runs in a forked child so that peak RSS is reported per case.
+"""
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from django.db import connection, connections
+
+DUMMY_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+EQUIPMENT_TYPES = ['Pump', 'Boiler', 'Tank', 'Exchanger', 'Mixer', 'Compressor', 'Valve', 'Reactor']
+
+
+@contextmanager
+def benchmark_database():
+    """Points the default connection at a fresh, migrated scratch database."""
+    old_name = connection.settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as tmp:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def write_equipment_csv(path, rows, chunk=250000, seed=0):
+    """Writes a synthetic upload with ``rows`` rows without holding it in memory."""
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, 'w', newline='') as f:
+        while written < rows:
+            n = min(chunk, rows - written)
+            ids = np.arange(written, written + n)
+            pd.DataFrame({
+                'Equipment Name': [f'Unit-{i}' for i in ids],
+                'Type': rng.choice(EQUIPMENT_TYPES, n),
+                'Flowrate': rng.uniform(0, 200, n).round(2),
+                'Pressure': rng.uniform(0, 20, n).round(2),
+                'Temperature': rng.uniform(-20, 400, n).round(2),
+            }).to_csv(f, header=(written == 0), index=False)
+            written += n
+    return path
+
+
+def convert_equipment_file(csv_path, path, chunk=250000):
+    """Re-encodes a CSV written by write_equipment_csv as Parquet or Arrow IPC (by extension)."""
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    writer = None
+    try:
+        for df in pd.read_csv(csv_path, chunksize=chunk):
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                if path.endswith('.parquet'):
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                else:
+                    writer = pyarrow.ipc.new_file(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _isolated_child(conn, fn, args):
+    try:
+        start_rss = peak_rss_mb()
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        conn.send(('ok', result, elapsed, start_rss, peak_rss_mb()))
+    except Exception as e:  # pragma: no cover - reported by the parent
+        conn.send(('error', repr(e), 0, 0, 0))
+    finally:
+        connections.close_all()
+        conn.close()
+
+
+def run_isolated(fn, *args):
+    """
+    Runs ``fn(*args)`` in a forked child and returns
+    ``(result, seconds, baseline_rss_mb, peak_rss_mb)``.
+    """
+    # Never share a live DB connection across fork()
+    connections.close_all()
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_isolated_child, args=(child_conn, fn, args))
+    proc.start()
+    child_conn.close()
+    state, result, elapsed, start_rss, peak = parent_conn.recv()
+    proc.join()
+    if state != 'ok':
+        raise RuntimeError(f'benchmark case failed: {result}')
+    return result, elapsed, start_rss, peak
+
+
+def best_of(fn, repeat):
+    """Runs ``fn()`` ``repeat`` times; returns (last result, fastest seconds)."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples, dtype=float), q)) if len(samples) else 0.0
+
+
+def request_latencies(client, url, n, **headers):
+    """Issues ``n`` GETs; returns (per-request milliseconds, last response)."""
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get(url, **headers)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, response
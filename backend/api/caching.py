@@ -0,0 +1,128 @@
+"""
+Data-versioned response cache.
+
+A global data version (DataVersion row, mirrored in the cache) is bumped by
+every ingest and retention sweep. Read views decorated with
+``versioned_cache`` key their rendered responses on that version and send a
+strong ETag, so a client presenting ``If-None-Match`` gets a 304 and a cache
+hit is served without touching the equipment tables.
+
+The cached version expires after ``DATA_VERSION_CACHE_SECONDS``, so a
+process whose cache is not shared (LocMemCache) still sees versions bumped
+by other processes, e.g. ``run_ingest_worker`` or ``load_sample_data``,
+within that time.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import DataVersion, SessionChange
+
+VERSION_KEY = 'chemvis:data-version'
+
+
+def version_cache_seconds():
+    return getattr(settings, 'DATA_VERSION_CACHE_SECONDS', 1)
+
+
+def _stored_version():
+    row = DataVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+    return row or 0
+
+
+def get_data_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _stored_version()
+        # add(), not set(): never overwrite a newer value published by a writer
+        cache.add(VERSION_KEY, version, version_cache_seconds())
+    return version
+
+
+def bump_data_version(added=(), deleted=(), deleted_types=None, appended=None):
+    """
+    Increments the data version and logs the ``added``/``deleted`` session
+    ids against it (see changes.py), each deleted one with the equipment
+    types it held from ``deleted_types``, and each ``appended``
+    ``{session_id: (first_item, last_item)}`` row range written to an
+    existing session; returns the new version. The cached copy is dropped
+    now (so this connection sees its own change) and republished once the
+    change commits. Call it last in the writing transaction: the version row
+    stays locked until commit, so versions commit in order.
+    """
+    if not DataVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        DataVersion.objects.create(pk=1, version=1)
+    version = _stored_version()
+    SessionChange.objects.bulk_create(
+        [SessionChange(version=version, kind=SessionChange.ADDED, session_id=pk) for pk in added]
+        + [
+            SessionChange(
+                version=version, kind=SessionChange.DELETED, session_id=pk,
+                equipment_types=(deleted_types or {}).get(pk, []),
+            )
+            for pk in deleted
+        ]
+        + [
+            SessionChange(version=version, kind=SessionChange.APPENDED, session_id=pk, first_item=first, last_item=last)
+            for pk, (first, last) in (appended or {}).items()
+        ]
+    )
+    cache.delete(VERSION_KEY)
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, _stored_version(), version_cache_seconds()))
+    return version
+
+
+def _representation_key(view, request, version):
+    # Hashed: query values are client input (any length, spaces), unsafe in memcached keys
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.lists()))
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f'chemvis:{type(view).__name__}:v{version}:{request.accepted_media_type}:{digest}'
+
+
+def _etag(key):
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def versioned_cache(get):
+    """
+    Caches a DRF ``get`` handler's rendered response under the current data
+    version and answers conditional requests with 304 Not Modified.
+    """
+    @wraps(get)
+    def wrapper(self, request, *args, **kwargs):
+        key = _representation_key(self, request, get_data_version())
+        etag = _etag(key)
+        # Weak comparison (RFC 9110): compressed responses carry W/"..."
+        if_none_match = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            hit = cache.get(key)
+            if hit is not None:
+                content, content_type = hit
+                response = HttpResponse(content, content_type=content_type)
+                patch_vary_headers(response, ['Accept'])
+            else:
+                response = get(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                # Render now so the bytes themselves can be cached
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                response.render()
+                if len(response.content) <= getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', 8 * 2**20):
+                    cache.set(key, (response.content, response['Content-Type']))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
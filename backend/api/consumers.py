@@ -1,27 +1,251 @@
-
+import asyncio
+import base64
+import binascii
 import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth import authenticate
+from django.db import DatabaseError
+
+from .notifications import (
+    PACKED_PROTOCOL, UPDATE_GROUP, bind_loop, filter_update, msgpack, pack_update, subscription_filters,
+    subscription_groups,
+)
+from .telemetry import (
+    TelemetryBuffer, TelemetryWriter, batch_rows, flush_seconds, max_buffer_rows, publish_seconds, reading_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+class MessageConsumer(AsyncWebsocketConsumer):
+    """JSON text frames, or MessagePack binary ones for clients asking for the ``chemvis.msgpack`` subprotocol."""
+
+    async def accept_negotiated(self):
+        self.packed = msgpack is not None and PACKED_PROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(PACKED_PROTOCOL if self.packed else None)
+
+    def decode(self, text_data=None, bytes_data=None):
+        """The message in a received frame; raises ValueError when it does not parse."""
+        if bytes_data is not None and msgpack:
+            return msgpack.unpackb(bytes_data)
+        return json.loads(text_data or '')
+
+    async def send_message(self, message):
+        if self.packed:
+            await self.send(bytes_data=pack_update(message))
+        else:
+            await self.send(text_data=json.dumps(message))
+
+    async def send_error(self, error):
+        await self.send_message({'message': 'error', 'error': error})
+
+class DataUpdateConsumer(MessageConsumer):
+    """
+    Sends ``data_update`` messages. Every socket starts subscribed to all
+    updates; clients narrow that with
+    ``{"action": "subscribe", "filters": {...}}`` and stop it with
+    ``{"action": "unsubscribe"}`` (see notifications.py). Clients asking
+    for the ``chemvis.msgpack`` subprotocol get MessagePack binary frames.
+    """
 
-class DataUpdateConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.group_name = 'equipment_updates'
+        # Updates are sent from this loop (see notifications.bind_loop)
+        bind_loop(asyncio.get_running_loop())
         # Join the equipment updates group
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
-        await self.accept()
+        self.topic_groups = []
+        self.item_filters = {}
+        await self.join([UPDATE_GROUP])
+        await self.accept_negotiated()
 
     async def disconnect(self, close_code):
-        # Leave the group
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
+        # Leave the groups
+        await self.join([])
+
+    async def join(self, groups):
+        for group in self.topic_groups:
+            if group not in groups:
+                await self.channel_layer.group_discard(group, self.channel_name)
+        for group in groups:
+            if group not in self.topic_groups:
+                await self.channel_layer.group_add(group, self.channel_name)
+        self.topic_groups = groups
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            request = self.decode(text_data, bytes_data)
+        except ValueError:
+            request = None
+        action = request.get('action') if isinstance(request, dict) else None
+        if action == 'subscribe':
+            try:
+                filters = subscription_filters(request.get('filters') or {})
+            except ValueError as e:
+                await self.send_error(str(e))
+                return
+            groups, self.item_filters = subscription_groups(filters)
+            await self.join(groups)
+            await self.send_message({'message': 'subscribed', 'filters': filters})
+        elif action == 'unsubscribe':
+            self.item_filters = {}
+            await self.join([])
+            await self.send_message({'message': 'unsubscribed'})
+        else:
+            await self.send_error("action must be 'subscribe' or 'unsubscribe'")
 
     # Receive message from room group
     async def data_update(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': 'data_updated'
-        }))
+        # The sender encodes the delta once per group (see notifications.py)
+        if 'text' not in event:
+            await self.send_message({'message': 'data_updated'})
+        elif self.item_filters or (self.packed and 'bytes' not in event):
+            await self.send_message(filter_update(event['text'], self.item_filters))
+        elif self.packed:
+            await self.send(bytes_data=event['bytes'])
+        else:
+            await self.send(text_data=event['text'])
+
+
+@database_sync_to_async
+def basic_auth_user(scope):
+    """The active user named by an ``Authorization: Basic`` handshake header, as BasicAuthentication checks it."""
+    header = dict(scope.get('headers', [])).get(b'authorization', b'').split()
+    if len(header) != 2 or header[0].lower() != b'basic':
+        return None
+    try:
+        username, _, password = base64.b64decode(header[1]).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    user = authenticate(username=username, password=password)
+    return user if user is not None and user.is_active else None
+
+class TelemetryConsumer(MessageConsumer):
+    """
+    Live equipment readings from plant gateways (see telemetry.py), written
+    to one upload session per connection, named by ``?name=``. Frames hold
+    one reading, a list of readings or ``{"columns": {...}}``. The gateway
+    gets ``{"message": "ack", "rows", "total"}`` after every batch written,
+    ``pause``/``resume`` for backpressure, and ``rejected`` or ``error`` for
+    readings that were not taken. Written batches are published to
+    dashboards on a timer, so an idle stream's last batch goes out too.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            user = await basic_auth_user(self.scope)
+        if user is None:
+            await self.close()
+            return
+        name = parse_qs(self.scope.get('query_string', b'').decode()).get('name', ['telemetry'])[0]
+        self.writer = TelemetryWriter(f'{name[:200]} (live)')
+        self.buffer = TelemetryBuffer()
+        self.flushing = None
+        self.timer = None
+        self.publish_timer = None
+        self.publishing = None
+        self.paused = False
+        self.open = True
+        await self.accept_negotiated()
+
+    async def disconnect(self, close_code):
+        if not getattr(self, 'open', False):
+            return
+        # Write and publish what is still buffered before the socket goes away
+        self.open = False
+        for timer in (self.timer, self.publish_timer):
+            if timer is not None:
+                timer.cancel()
+        if self.flushing is not None:
+            await self.flushing
+        if len(self.buffer):
+            await self.write(self.buffer.take())
+        if self.publishing is not None:
+            await self.publishing
+        await self.publish()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            columns = reading_columns(self.decode(text_data, bytes_data))
+        except ValueError as e:
+            await self.send_error(str(e))
+            return
+        if self.paused:
+            await self.send_message({'message': 'rejected', 'rows': len(columns[0])})
+            return
+        self.buffer.extend(columns)
+        if len(self.buffer) >= max_buffer_rows():
+            self.paused = True
+            await self.send_message({'message': 'pause', 'buffered': len(self.buffer)})
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        """Writes now when a batch is full, else once ``flush_seconds()`` have passed."""
+        if self.flushing is not None or not len(self.buffer):
+            return
+        if len(self.buffer) >= batch_rows():
+            self.start_flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(flush_seconds(), self.start_flush)
+
+    def start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.flushing is None and len(self.buffer):
+            self.flushing = asyncio.ensure_future(self.flush(self.buffer.take()))
+
+    async def write(self, columns):
+        """Writes one batch; returns ``(rows, error)``, logging any failure instead of raising."""
+        try:
+            return await database_sync_to_async(self.writer.write)(columns), None
+        except Exception as e:
+            logger.exception("%d telemetry readings for %r were not written", len(columns[0]), self.writer.name)
+            # Database and validation errors are the gateway's to see; anything else stays in the log
+            return 0, str(e) if isinstance(e, (DatabaseError, ValueError)) else 'internal error'
+
+    async def flush(self, columns):
+        # Readings keep buffering while this batch is written on the sync thread
+        try:
+            rows, error = await self.write(columns)
+        finally:
+            self.flushing = None
+        if not self.open:
+            return
+        if error is not None:
+            await self.send_message({
+                'message': 'error', 'error': f"{len(columns[0])} readings were not written: {error}",
+                'rows': len(columns[0]),
+            })
+        else:
+            await self.send_message({'message': 'ack', 'rows': rows, 'total': self.writer.total})
+        if self.paused and len(self.buffer) <= max_buffer_rows() // 2:
+            self.paused = False
+            await self.send_message({'message': 'resume', 'buffered': len(self.buffer)})
+        self.schedule_publish()
+        self.schedule_flush()
+
+    def schedule_publish(self):
+        """Publishes the written batches once ``publish_seconds()`` have passed since the last publish."""
+        if self.publish_timer is not None or self.publishing is not None or not self.writer.unpublished:
+            return
+        delay = max(0.0, self.writer.published_at + publish_seconds() - time.monotonic())
+        self.publish_timer = asyncio.get_running_loop().call_later(delay, self.start_publish)
+
+    def start_publish(self):
+        self.publish_timer = None
+        self.publishing = asyncio.ensure_future(self.publish())
+
+    async def publish(self):
+        try:
+            await database_sync_to_async(self.writer.publish)()
+        except Exception:
+            logger.exception("telemetry readings for %r were written but not published", self.writer.name)
+            if self.open:
+                # Retried after a full interval, not in a loop
+                self.publish_timer = asyncio.get_running_loop().call_later(publish_seconds(), self.start_publish)
+        finally:
+            self.publishing = None
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.batch import ingest_batch, new_parse_pool
+from api.benchmarks import benchmark_database, write_equipment_csv
+from api.ingest import chunk_rows
+from api.models import UploadSession
+from api.parsing import parse_file
+
+
+def _warm_up(pool, workers, path):
+    list(pool.map(parse_file, [path] * workers))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batch upload scaling: N files parsed on 1..cpu_count processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=32)
+        parser.add_argument('--rows', type=int, default=50000, help='Rows per file')
+        parser.add_argument('--workers', type=int, nargs='+', default=None)
+
+    def handle(self, *args, **options):
+        cpus = os.cpu_count() or 1
+        workers_list = options['workers'] or sorted({1, 2, 4, 8, 16, 32, cpus} & set(range(1, cpus + 1)))
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            template = write_equipment_csv(os.path.join(tmp, 'template.csv'), options['rows'])
+            entries = []
+            for i in range(options['files']):
+                path = os.path.join(tmp, f'unit_{i:02d}.csv')
+                os.link(template, path)
+                entries.append((os.path.basename(path), path))
+            total_rows = options['files'] * options['rows']
+
+            self.stdout.write(f"{options['files']} files x {options['rows']} rows on {cpus} CPUs")
+            self.stdout.write(f"{'workers':>8} {'parse s':>9} {'speedup':>8} {'ingest s':>9} {'speedup':>8} {'rows/s':>11}")
+            base_parse = base_ingest = None
+            for workers in workers_list:
+                pool = new_parse_pool(workers)
+                _warm_up(pool, workers, entries[0][1])
+                start = time.perf_counter()
+                list(pool.map(parse_file, [path for _, path in entries], [chunk_rows()] * len(entries)))
+                parse = time.perf_counter() - start
+                pool.shutdown()
+
+                start = time.perf_counter()
+                ingest_batch(entries, 'bench.zip', workers=workers)
+                ingest = time.perf_counter() - start
+                UploadSession.objects.all().delete()
+
+                base_parse = base_parse or parse
+                base_ingest = base_ingest or ingest
+                self.stdout.write(
+                    f"{workers:>8} {parse:>9.2f} {base_parse / parse:>7.2f}x {ingest:>9.2f} {base_ingest / ingest:>7.2f}x {total_rows / ingest:>11,.0f}"
+                )
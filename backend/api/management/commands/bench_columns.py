@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import benchmark_database, best_of, write_equipment_csv
+from api.ingest import ingest_file
+from api.middleware import CODECS
+from api.models import EquipmentItem
+from api.renderers import FastJSONRenderer
+from api.serializers import COLUMN_DICTIONARY_FIELDS, EquipmentItemSerializer, ValuesSerializer
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional codec
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+DECODERS = {
+    'identity': lambda data: data,
+    'gzip': gzip.decompress,
+    'br': brotli.decompress if brotli else None,
+    'zstd': (lambda data: zstandard.ZstdDecompressor().decompress(data)) if zstandard else None,
+}
+
+
+def _rows_body(queryset):
+    serializer = ValuesSerializer(EquipmentItemSerializer)
+    return FastJSONRenderer().render(serializer.data(serializer.values(queryset)))
+
+
+def _columns_body(queryset):
+    serializer = ValuesSerializer(EquipmentItemSerializer)
+    rows = list(queryset.values_list(*serializer.fields))
+    columns = serializer.columns(rows, COLUMN_DICTIONARY_FIELDS)
+    return FastJSONRenderer().render({"count": len(rows), "columns": columns})
+
+
+class Command(BaseCommand):
+    help = 'Benchmark equipment list payloads: rows vs columns, per content encoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+        parser.add_argument('--repeat', type=int, default=3, help='Best of N runs per case')
+
+    def handle(self, *args, **options):
+        encodings = [('identity', lambda data: data), *CODECS]
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(
+                f"{'rows':>8} {'layout':<8} {'encoding':<9} {'KiB':>9} {'ratio':>6} "
+                f"{'render ms':>10} {'encode ms':>10} {'decode+parse ms':>16}"
+            )
+            for rows in options['rows']:
+                EquipmentItem.objects.all().delete()
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+                queryset = EquipmentItem.objects.order_by('-id')
+                baseline = None
+                for layout, render in (('rows', _rows_body), ('columns', _columns_body)):
+                    body, render_secs = best_of(lambda: render(queryset), options['repeat'])
+                    baseline = baseline or len(body)
+                    for name, encode in encodings:
+                        data, encode_secs = best_of(lambda: encode(body), options['repeat'])
+                        decode = DECODERS[name]
+                        _, decode_secs = best_of(lambda: json.loads(decode(data)), options['repeat'])
+                        self.stdout.write(
+                            f"{rows:>8} {layout:<8} {name:<9} {len(data) / 1024:>9.0f} "
+                            f"{baseline / len(data):>6.1f} {render_secs * 1000:>10.1f} "
+                            f"{encode_secs * 1000:>10.1f} {decode_secs * 1000:>16.1f}"
+                        )
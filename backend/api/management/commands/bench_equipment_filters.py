@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import (
+    DUMMY_CACHE, EQUIPMENT_TYPES, benchmark_database, percentile, request_latencies, write_equipment_csv
+)
+from api.ingest import ingest_file
+
+CASES = [
+    ('first page', {}),
+    ('type', {'equipment_type': EQUIPMENT_TYPES[0]}),
+    ('session + type', {'session': '{session}', 'equipment_type': EQUIPMENT_TYPES[1]}),
+    ('flowrate range (narrow)', {'flowrate_min': '100', 'flowrate_max': '100.5'}),
+    ('flowrate range (wide)', {'flowrate_min': '20', 'flowrate_max': '180'}),
+    ('pressure + temperature', {'pressure_min': '5', 'pressure_max': '6', 'temperature_min': '300'}),
+    ('sort -temperature', {'ordering': '-temperature'}),
+    ('sort equipment_name', {'ordering': 'equipment_name'}),
+    ('name prefix', {'search': 'unit-12345'}),
+    ('name prefix + type', {'search': 'unit-9', 'equipment_type': EQUIPMENT_TYPES[2]}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark filtered/sorted/searched /api/equipment/ pages (uncached)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Rows loaded before measuring')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per case')
+        parser.add_argument('--page-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            path = write_equipment_csv(os.path.join(tmp, 'bench.csv'), options['rows'])
+            session = ingest_file(path, 'bench.csv')
+            os.remove(path)
+            if connection.vendor == 'sqlite':
+                # Planner statistics, as a maintained database would have
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user('bench'))
+
+            self.stdout.write(f"{options['rows']} rows, page_size={options['page_size']}, {options['requests']} requests per case (ms)")
+            self.stdout.write(f"{'case':<26} {'rows':>5} {'p50':>9} {'p99':>9}")
+            with override_settings(CACHES=DUMMY_CACHE):
+                for label, params in CASES:
+                    params = {k: v.format(session=session.id) for k, v in params.items()}
+                    params['page_size'] = options['page_size']
+                    query = '&'.join(f'{k}={v}' for k, v in params.items())
+                    samples, response = request_latencies(client, f'/api/equipment/?{query}', options['requests'])
+                    assert response.status_code == 200, response.content
+                    rows = len(response.json()['results'])
+                    self.stdout.write(
+                        f"{label:<26} {rows:>5} {percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}"
+                    )
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarks import benchmark_database, run_isolated, write_equipment_csv
+from api.ingest import ingest_file
+from api.models import UploadSession
+from api.views import EquipmentExportView
+
+
+def _export(user, export_format, gzipped):
+    headers = {'HTTP_ACCEPT_ENCODING': 'gzip'} if gzipped else {}
+    request = APIRequestFactory().get('/api/export/', {'format': export_format}, **headers)
+    force_authenticate(request, user)
+    response = EquipmentExportView.as_view()(request)
+    return sum(len(chunk) for chunk in response.streaming_content)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the streaming export: throughput and peak RSS per dataset size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000])
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            user = User.objects.create_user('bench')
+            self.stdout.write(
+                f"{'rows':>10} {'format':<8} {'gzip':<5} {'seconds':>8} {'rows/s':>11} {'MiB out':>8} {'delta MiB':>10}"
+            )
+            for rows in options['rows']:
+                UploadSession.objects.all().delete()
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+                for export_format in ('ndjson', 'csv'):
+                    for gzipped in (False, True):
+                        size, elapsed, base, peak = run_isolated(_export, user, export_format, gzipped)
+                        self.stdout.write(
+                            f"{rows:>10} {export_format:<8} {'yes' if gzipped else 'no':<5} {elapsed:>8.2f} "
+                            f"{rows / elapsed:>11,.0f} {size / 2**20:>8.1f} {peak - base:>10.1f}"
+                        )
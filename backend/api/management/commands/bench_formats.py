@@ -0,0 +1,47 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import benchmark_database, convert_equipment_file, run_isolated, write_equipment_csv
+from api.ingest import chunk_rows, ingest_file
+from api.models import UploadSession
+from api.parsing import chunk_columns, read_chunks
+
+
+def _parse_only(path):
+    start = time.perf_counter()
+    rows = 0
+    for df in read_chunks(path, path, chunk_rows()):
+        rows += len(chunk_columns(df)[0])
+    return rows, time.perf_counter() - start
+
+
+def _ingest(path):
+    return ingest_file(path, os.path.basename(path)).item_count
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CSV vs Parquet vs Arrow IPC ingest (parse-only and end-to-end)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            csv_path = write_equipment_csv(os.path.join(tmp, 'bench.csv'), options['rows'])
+            paths = [
+                csv_path,
+                convert_equipment_file(csv_path, os.path.join(tmp, 'bench.parquet')),
+                convert_equipment_file(csv_path, os.path.join(tmp, 'bench.arrow')),
+            ]
+            self.stdout.write(f"{'format':>8} {'MiB':>8} {'parse s':>9} {'parse rows/s':>13} {'ingest s':>9} {'ingest rows/s':>14} {'peak MiB':>9}")
+            for path in paths:
+                (rows, parse), _, _, _ = run_isolated(_parse_only, path)
+                count, ingest, _, peak = run_isolated(_ingest, path)
+                UploadSession.objects.all().delete()
+                self.stdout.write(
+                    f"{os.path.splitext(path)[1][1:]:>8} {os.path.getsize(path) / 2**20:>8.1f} {parse:>9.2f} "
+                    f"{rows / parse:>13,.0f} {ingest:>9.2f} {count / ingest:>14,.0f} {peak:>9.1f}"
+                )
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import benchmark_database, run_isolated, write_equipment_csv
+from api.ingest import ingest_file
+from api.models import UploadSession
+
+
+def _ingest_file(path, chunk):
+    session = ingest_file(path, os.path.basename(path), rows=chunk)
+    return session.item_count
+
+
+class Command(BaseCommand):
+    help = 'Benchmark streaming CSV ingest: rows/s and peak RSS per file size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000, 5000000])
+        parser.add_argument('--chunk', type=int, default=None, help='Rows per chunk (default: INGEST_CHUNK_ROWS)')
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(f"{'rows':>10} {'seconds':>9} {'rows/s':>11} {'base MiB':>9} {'peak MiB':>9} {'delta MiB':>10}")
+            for rows in options['rows']:
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                count, elapsed, base, peak = run_isolated(_ingest_file, path, options['chunk'])
+                self.stdout.write(
+                    f"{count:>10} {elapsed:>9.2f} {count / elapsed:>11,.0f} {base:>9.1f} {peak:>9.1f} {peak - base:>10.1f}"
+                )
+                UploadSession.objects.all().delete()
+                os.remove(path)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import benchmark_database, write_equipment_csv
+from api.ingest import ingest_file, insert_batch_size
+from api.models import UploadSession, EquipmentItem
+from api.parsing import read_csv_chunks
+
+
+def legacy_insert_chunk(session, df):
+    """The pre-columnar path: one pandas Series and one model instance per row."""
+    items = []
+    for _, row in df.iterrows():
+        items.append(EquipmentItem(
+            upload_session=session,
+            equipment_name=row['Equipment Name'],
+            equipment_type=row['Type'],
+            flowrate=float(row['Flowrate']),
+            pressure=float(row['Pressure']),
+            temperature=float(row['Temperature'])
+        ))
+    EquipmentItem.objects.bulk_create(items, batch_size=insert_batch_size())
+    return len(items)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark a CSV upload end to end (parse + insert): iterrows + bulk_create vs '
+        'ingest_file (columnar cast, raw bulk insert, deferred indexes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+
+    def legacy_ingest(self, path):
+        with transaction.atomic():
+            session = UploadSession.objects.create(filename=os.path.basename(path))
+            return sum(legacy_insert_chunk(session, df) for df in read_csv_chunks(path))
+
+    def columnar_ingest(self, path):
+        return ingest_file(path, os.path.basename(path)).item_count
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            path = write_equipment_csv(os.path.join(tmp, 'bench.csv'), options['rows'])
+            results = {}
+            self.stdout.write(f"{'path':>10} {'rows':>10} {'seconds':>9} {'rows/s':>11}")
+            for label, ingest in (('iterrows', self.legacy_ingest), ('columnar', self.columnar_ingest)):
+                start = time.perf_counter()
+                total = ingest(path)
+                results[label] = time.perf_counter() - start
+                UploadSession.objects.all().delete()
+                self.stdout.write(f"{label:>10} {total:>10} {results[label]:>9.2f} {total / results[label]:>11,.0f}")
+            speedup = results['iterrows'] / results['columnar']
+            self.stdout.write(
+                f"speedup (parse + insert): {speedup:.1f}x, target 10x {'met' if speedup >= 10 else 'NOT met'}"
+            )
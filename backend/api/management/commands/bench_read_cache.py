@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import DUMMY_CACHE, benchmark_database, percentile, request_latencies, write_equipment_csv
+from api.ingest import ingest_file
+
+ENDPOINTS = ['/api/summary/', '/api/history/', '/api/equipment/']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark read latency: uncached vs data-versioned cache hit vs 304 Not Modified'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Rows loaded before measuring')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint and mode')
+
+    def report(self, url, mode, samples):
+        self.stdout.write(f"{url:<18} {mode:<10} {percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}")
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            path = write_equipment_csv(os.path.join(tmp, 'bench.csv'), options['rows'])
+            ingest_file(path, 'bench.csv')
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user('bench'))
+
+            self.stdout.write(f"{options['rows']} rows, {n} requests per case (ms)")
+            self.stdout.write(f"{'endpoint':<18} {'mode':<10} {'p50':>9} {'p99':>9}")
+            for url in ENDPOINTS:
+                with override_settings(CACHES=DUMMY_CACHE):
+                    samples, _ = request_latencies(client, url, n)
+                self.report(url, 'uncached', samples)
+
+                cache.clear()
+                client.get(url)
+                samples, response = request_latencies(client, url, n)
+                self.report(url, 'cache hit', samples)
+
+                samples, response = request_latencies(client, url, n, HTTP_IF_NONE_MATCH=response['ETag'])
+                assert response.status_code == 304
+                self.report(url, '304', samples)
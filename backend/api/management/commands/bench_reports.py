@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from api.benchmarks import benchmark_database, run_isolated, write_equipment_csv
+from api.ingest import ingest_file
+from api.models import EquipmentItem, UploadSession
+from api.reports import (
+    LISTING_COL_WIDTHS, LISTING_FIELDS, LISTING_HEADER, LISTING_TABLE_STYLE, _listing_row, build_report,
+)
+
+
+def _streamed(path, include_equipment):
+    build_report(path, include_equipment)
+    return os.path.getsize(path)
+
+
+def _one_table(path):
+    """The previous approach: every row in memory, one Table with a repeated header row."""
+    rows = [LISTING_HEADER] + [_listing_row(row) for row in EquipmentItem.objects.order_by('id').values_list(*LISTING_FIELDS)]
+    doc = SimpleDocTemplate(path, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=36)
+    doc.build([Table(rows, colWidths=LISTING_COL_WIDTHS, style=LISTING_TABLE_STYLE, repeatRows=1)])
+    return os.path.getsize(path)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PDF report rendering: summary, streamed equipment listing, single-table listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument(
+            '--one-table-max-rows', type=int, default=20000,
+            help='Skip the single-table baseline above this size (its page splitting is quadratic)',
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(f"{'rows':>8} {'case':<20} {'seconds':>8} {'rows/s':>9} {'MiB out':>8} {'delta MiB':>10}")
+            for rows in options['rows']:
+                UploadSession.objects.all().delete()
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+                out = os.path.join(tmp, 'report.pdf')
+                cases = [
+                    ('summary only', _streamed, out, False),
+                    ('streamed listing', _streamed, out, True),
+                ]
+                if rows <= options['one_table_max_rows']:
+                    cases.append(('one-table listing', _one_table, out))
+                for label, fn, *args in cases:
+                    size, elapsed, base, peak = run_isolated(fn, *args)
+                    self.stdout.write(
+                        f"{rows:>8} {label:<20} {elapsed:>8.2f} {rows / elapsed:>9,.0f} "
+                        f"{size / 2**20:>8.1f} {peak - base:>10.1f}"
+                    )
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import benchmark_database, write_equipment_csv
+from api.ingest import ingest_file
+from api.models import EquipmentItem
+from api.renderers import FastJSONRenderer
+from api.serializers import EquipmentItemSerializer, ValuesSerializer
+
+
+def _model_serializer(queryset):
+    return JSONRenderer().render(EquipmentItemSerializer(queryset, many=True).data)
+
+
+def _values_stdlib(queryset):
+    serializer = ValuesSerializer(EquipmentItemSerializer)
+    return JSONRenderer().render(serializer.data(serializer.values(queryset)))
+
+
+def _values_fast(queryset, fields=None):
+    serializer = ValuesSerializer(EquipmentItemSerializer, fields)
+    return FastJSONRenderer().render(serializer.data(serializer.values(queryset)))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark equipment list serialization: ModelSerializer vs values() + fast JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='Best of N runs per case')
+
+    def handle(self, *args, **options):
+        cases = [
+            ('ModelSerializer + JSONRenderer', _model_serializer),
+            ('values() + JSONRenderer', _values_stdlib),
+            ('values() + FastJSONRenderer', _values_fast),
+            ('values() + Fast, 2 fields', lambda qs: _values_fast(qs, ['equipment_name', 'flowrate'])),
+        ]
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(f"{'rows':>8} {'case':<32} {'ms':>9} {'rows/s':>12} {'MiB':>7} {'same bytes':>10}")
+            for rows in options['rows']:
+                EquipmentItem.objects.all().delete()
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+                queryset = EquipmentItem.objects.order_by('-id')
+                baseline = None
+                for label, fn in cases:
+                    best = float('inf')
+                    for _ in range(options['repeat']):
+                        start = time.perf_counter()
+                        content = fn(queryset)
+                        best = min(best, time.perf_counter() - start)
+                    if baseline is None:
+                        baseline = content
+                    same = 'yes' if content == baseline else ('-' if 'fields' in label else 'NO')
+                    self.stdout.write(
+                        f"{rows:>8} {label:<32} {best * 1000:>9.1f} {rows / best:>12,.0f} "
+                        f"{len(content) / 2**20:>7.1f} {same:>10}"
+                    )
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import benchmark_database, write_equipment_csv
+from api.ingest import ingest_file
+from api.models import UploadSession
+from api.reports import render_session_reports
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-session PDF reports rendered into a zip: scaling with worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=16)
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per session')
+        parser.add_argument('--workers', type=int, nargs='+', default=None,
+                            help='Pool sizes to compare (default: 1, 2, 4, ... up to the core count)')
+        parser.add_argument('--include-equipment', action='store_true')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count()
+        workers = options['workers'] or [n for n in (1, 2, 4, 8, 16, 32, 64) if n < cores] + [cores]
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+            for i in range(options['sessions']):
+                path = write_equipment_csv(os.path.join(tmp, f'session_{i}.csv'), options['rows'], seed=i)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+            sessions = list(UploadSession.objects.all())
+            self.stdout.write(f"{len(sessions)} sessions x {options['rows']} rows, {cores} CPU cores")
+            self.stdout.write(f"{'workers':>7} {'seconds':>8} {'reports/s':>10} {'speedup':>8} {'efficiency':>10}")
+            baseline = None
+            for n in workers:
+                output = os.path.join(tmp, 'reports.zip')
+                start = time.perf_counter()
+                written = render_session_reports(sessions, output, n, options['include_equipment'])
+                elapsed = time.perf_counter() - start
+                # Relative to the first pool size
+                baseline = baseline or elapsed
+                speedup = baseline / elapsed
+                self.stdout.write(
+                    f"{n:>7} {elapsed:>8.2f} {written / elapsed:>10.1f} {speedup:>8.2f} "
+                    f"{speedup / (n / workers[0]):>10.0%}"
+                )
@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import json
+import time
+
+import msgpack
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import EQUIPMENT_TYPES, benchmark_database
+from api.models import DataVersion, EquipmentItem
+from api.routing import websocket_urlpatterns
+from api.telemetry import READING_FIELDS, publish_seconds
+
+# Readings/s one worker should sustain
+TARGET_RATE = 50000
+
+
+def _columns(rows, rng):
+    return {
+        'equipment_name': [f'Unit-{i}' for i in range(rows)],
+        'equipment_type': rng.choice(EQUIPMENT_TYPES, rows).tolist(),
+        'flowrate': rng.uniform(0, 200, rows).round(2),
+        'pressure': rng.uniform(0, 20, rows).round(2),
+        'temperature': rng.uniform(-20, 400, rows).round(2),
+    }
+
+
+def _rows_frame(columns):
+    values = [columns[name].tolist() if isinstance(columns[name], np.ndarray) else columns[name] for name in READING_FIELDS]
+    return {'text_data': json.dumps([dict(zip(READING_FIELDS, row)) for row in zip(*values)])}
+
+
+def _columns_frame(columns):
+    return {'text_data': json.dumps({'columns': {
+        name: values.tolist() if isinstance(values, np.ndarray) else values for name, values in columns.items()
+    }})}
+
+
+def _packed_frame(columns):
+    return {'bytes_data': msgpack.packb({'columns': {
+        name: values.astype('<f8').tobytes() if isinstance(values, np.ndarray) else values
+        for name, values in columns.items()
+    }})}
+
+
+def _version():
+    return DataVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+FORMATS = {'json rows': _rows_frame, 'json columns': _columns_frame, 'msgpack columns': _packed_frame}
+
+
+async def _stream(frames, count, frame_rows):
+    """
+    Streams ``count`` frames (cycling through ``frames``) as one gateway,
+    resending rejected ones; returns (seconds until every reading is written
+    and published, pauses).
+    """
+    application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    gateway = WebsocketCommunicator(
+        application, '/ws/telemetry/?name=bench', headers=[(b'authorization', b'Basic ' + base64.b64encode(b'bench:bench'))],
+    )
+    connected, _ = await gateway.connect()
+    assert connected
+    total, queue, next_frame = count * frame_rows, count, 0
+    acked = pauses = 0
+    paused = False
+    start = time.perf_counter()
+    while acked < total:
+        if queue and not paused:
+            await gateway.send_to(**frames[next_frame % len(frames)])
+            next_frame += 1
+            queue -= 1
+            # Let the server take the frame, as a socket read would
+            await asyncio.sleep(0)
+        elif gateway.output_queue.empty():
+            await asyncio.sleep(0.001)
+        while not gateway.output_queue.empty():
+            reply = json.loads(await gateway.receive_from())
+            if reply['message'] == 'ack':
+                acked = reply['total']
+            elif reply['message'] == 'pause':
+                paused, pauses = True, pauses + 1
+            elif reply['message'] == 'resume':
+                paused = False
+            elif reply['message'] == 'rejected':
+                queue += reply['rows'] // frame_rows
+            else:
+                raise RuntimeError(reply)
+    # The consumer publishes the last batches before the connection ends
+    await gateway.disconnect(timeout=600)
+    return time.perf_counter() - start, pauses
+
+
+class Command(BaseCommand):
+    help = 'Benchmark live telemetry ingest over WebSocket: sustained readings/s per frame format'
+
+    def add_arguments(self, parser):
+        # Long enough for several publish intervals
+        parser.add_argument('--readings', type=int, default=1000000)
+        parser.add_argument('--frame-rows', type=int, default=1000, help='Readings per WebSocket frame')
+        parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+
+    def handle(self, *args, **options):
+        frame_rows = options['frame_rows']
+        frames_needed = options['readings'] // frame_rows
+        total = frames_needed * frame_rows
+        rng = np.random.default_rng(0)
+        columns = [_columns(frame_rows, rng) for _ in range(min(frames_needed, 50))]
+        with benchmark_database():
+            User.objects.create_user('bench', password='bench')
+            self.stdout.write(
+                f"{total} readings in frames of {frame_rows}, published every {publish_seconds():g} s and on close"
+            )
+            self.stdout.write(f"{'format':<16} {'seconds':>8} {'readings/s':>11} {'pauses':>7} {'versions':>9}")
+            rates = []
+            for name in options['formats']:
+                frames = [FORMATS[name](frame) for frame in columns]
+                EquipmentItem.objects.all().delete()
+                version = _version()
+                elapsed, pauses = async_to_sync(_stream)(frames, frames_needed, frame_rows)
+                written = EquipmentItem.objects.count()
+                assert written == total, (written, total)
+                rates.append(total / elapsed)
+                self.stdout.write(
+                    f"{name:<16} {elapsed:>8.2f} {total / elapsed:>11,.0f} {pauses:>7} {_version() - version:>9}"
+                )
+            best = max(rates)
+            self.stdout.write(
+                f"target {TARGET_RATE:,} readings/s written and published: "
+                f"{'met' if best >= TARGET_RATE else 'NOT met'} (best {best:,.0f}/s)"
+            )
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+from channels.auth import AuthMiddlewareStack
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.benchmarks import benchmark_database, percentile, run_isolated, write_equipment_csv
+from api.caching import get_data_version
+from api.ingest import ingest_file
+from api.notifications import UPDATE_GROUP, encode_update, update_message
+from api.routing import websocket_urlpatterns
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def _application():
+    # The websocket side of backend/asgi.py
+    return AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+
+async def _receive(communicator):
+    await communicator.receive_from(timeout=120)
+    return time.perf_counter()
+
+
+async def _fan_out(text, clients, broadcasts, concurrency):
+    application = _application()
+    sockets = []
+    start = time.perf_counter()
+    for first in range(0, clients, concurrency):
+        batch = [WebsocketCommunicator(application, '/ws/updates/') for _ in range(first, min(first + concurrency, clients))]
+        results = await asyncio.gather(*(socket.connect(timeout=120) for socket in batch))
+        assert all(connected for connected, _ in results)
+        sockets.extend(batch)
+    connect_secs = time.perf_counter() - start
+
+    channel_layer = get_channel_layer()
+    latencies, broadcast_secs = [], []
+    for _ in range(broadcasts):
+        receivers = [asyncio.ensure_future(_receive(socket)) for socket in sockets]
+        # Let every receiver start waiting before the clock starts
+        await asyncio.sleep(0)
+        sent = time.perf_counter()
+        await channel_layer.group_send(UPDATE_GROUP, {'type': 'data_update', 'text': text})
+        received = await asyncio.gather(*receivers)
+        latencies.extend((at - sent) * 1000 for at in received)
+        broadcast_secs.append(max(received) - sent)
+
+    for first in range(0, clients, concurrency):
+        await asyncio.gather(*(socket.disconnect() for socket in sockets[first:first + concurrency]))
+    return connect_secs, latencies, broadcast_secs
+
+
+def _run(text, clients, broadcasts, concurrency):
+    connect_secs, latencies, broadcast_secs = async_to_sync(_fan_out)(text, clients, broadcasts, concurrency)
+    return (
+        clients / connect_secs, percentile(latencies, 50), percentile(latencies, 99),
+        percentile([secs * 1000 for secs in broadcast_secs], 50),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark WebSocket fan-out: connect throughput, delivery latency and memory per connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument('--broadcasts', type=int, default=5, help='Broadcasts measured per client count')
+        parser.add_argument('--concurrency', type=int, default=100, help='Handshakes in flight while connecting')
+        parser.add_argument('--rows', type=int, default=20, help='Rows in the update each broadcast carries')
+        parser.add_argument('--redis-url', help='Use the Redis channel layer (as backend/settings.py does) at this URL')
+
+    def handle(self, *args, **options):
+        layers = IN_MEMORY_LAYER
+        if options['redis_url']:
+            layers = {'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [options['redis_url']]},
+            }}
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp, override_settings(CHANNEL_LAYERS=layers):
+            since = get_data_version()
+            path = write_equipment_csv(os.path.join(tmp, 'update.csv'), options['rows'])
+            ingest_file(path, 'update.csv')
+            text = encode_update(update_message(since))
+
+            self.stdout.write(f"{len(text)} byte update, {options['broadcasts']} broadcasts per client count")
+            self.stdout.write(
+                f"{'clients':>8} {'connect/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+                f"{'all delivered ms':>17} {'KiB/conn':>9}"
+            )
+            for clients in options['clients']:
+                (rate, p50, p99, fan_out), _, base, peak = run_isolated(
+                    _run, text, clients, options['broadcasts'], options['concurrency']
+                )
+                self.stdout.write(
+                    f"{clients:>8} {rate:>10,.0f} {p50:>8.1f} {p99:>8.1f} "
+                    f"{fan_out:>17.1f} {(peak - base) * 1024 / clients:>9.1f}"
+                )
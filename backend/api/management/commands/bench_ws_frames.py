@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+
+import msgpack
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.benchmarks import benchmark_database, best_of, write_equipment_csv
+from api.caching import get_data_version
+from api.filters import METRICS
+from api.ingest import ingest_file
+from api.models import UploadSession
+from api.notifications import encode_update, pack_update, update_message
+
+
+def _unpack(frame):
+    message = msgpack.unpackb(frame)
+    columns = message['items']['columns']
+    for metric in METRICS:
+        columns[metric] = np.frombuffer(columns[metric], '<f8')
+    return message
+
+
+class Command(BaseCommand):
+    help = 'Benchmark data_update frames: JSON text vs MessagePack with packed metric columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5, help='Best of N runs per case')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp, override_settings(WS_UPDATE_MAX_BYTES=2**40):
+            self.stdout.write(f"{'rows':>8} {'format':<8} {'KiB':>9} {'ratio':>6} {'encode ms':>10} {'decode ms':>10}")
+            for rows in options['rows']:
+                UploadSession.objects.all().delete()
+                since = get_data_version()
+                path = write_equipment_csv(os.path.join(tmp, f'bench_{rows}.csv'), rows)
+                ingest_file(path, os.path.basename(path))
+                os.remove(path)
+                message = update_message(since)
+                baseline = None
+                for name, encode, decode in (('json', encode_update, json.loads), ('msgpack', pack_update, _unpack)):
+                    frame, encode_secs = best_of(lambda: encode(message), repeat)
+                    _, decode_secs = best_of(lambda: decode(frame), repeat)
+                    baseline = baseline or len(frame)
+                    self.stdout.write(
+                        f"{rows:>8} {name:<8} {len(frame) / 1024:>9.1f} {baseline / len(frame):>6.2f} "
+                        f"{encode_secs * 1000:>10.2f} {decode_secs * 1000:>10.2f}"
+                    )
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import benchmark_database, write_equipment_csv
+from api.caching import get_data_version
+from api.consumers import DataUpdateConsumer
+from api.ingest import ingest_file
+from api.notifications import broadcast_update
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 1000}}}
+# What each client fetched after a signal-only update, before and after delta sync
+RELOAD_URLS = ['/api/changes/', '/api/summary/', '/api/equipment/', '/api/history/']
+SYNC_URLS = ['/api/changes/?since={since}', '/api/summary/']
+
+
+def _poll(client, urls, clients):
+    """Every client GETs ``urls``; returns (requests, bytes sent)."""
+    requests = sent = 0
+    for _ in range(clients):
+        for url in urls:
+            sent += len(client.get(url).content)
+            requests += 1
+    return requests, sent
+
+
+async def _push(since, clients):
+    """Connects ``clients`` sockets, broadcasts the delta once; returns (bytes sent, server secs, delivery secs)."""
+    sockets = [WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/') for _ in range(clients)]
+    for socket in sockets:
+        await socket.connect()
+    start = time.perf_counter()
+    await sync_to_async(broadcast_update)(since)
+    server_secs = time.perf_counter() - start
+    sent = 0
+    for socket in sockets:
+        sent += len(await socket.receive_from(timeout=30))
+    delivered_secs = time.perf_counter() - start
+    for socket in sockets:
+        await socket.disconnect()
+    return sent, server_secs, delivered_secs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark server load of one data update across N dashboards: refetch vs delta sync vs pushed delta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--rows', type=int, default=10000, help='Rows loaded before the update')
+        parser.add_argument('--delta', type=int, default=100, help='Rows in the update')
+
+    def handle(self, *args, **options):
+        clients = options['clients']
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp, override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+            path = write_equipment_csv(os.path.join(tmp, 'base.csv'), options['rows'])
+            ingest_file(path, 'base.csv')
+            since = get_data_version()
+            path = write_equipment_csv(os.path.join(tmp, 'update.csv'), options['delta'], seed=1)
+            ingest_file(path, 'update.csv')
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user('bench'))
+
+            self.stdout.write(f"{clients} clients, {options['rows']} rows + {options['delta']} row update")
+            self.stdout.write(f"{'case':<22} {'requests':>9} {'MiB sent':>9} {'server s':>9} {'delivered s':>12}")
+            for label, urls in (('signal + reload', RELOAD_URLS), ('signal + delta sync', SYNC_URLS)):
+                cache.clear()
+                urls = [url.format(since=since) for url in urls]
+                start = time.perf_counter()
+                requests, sent = _poll(client, urls, clients)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{label:<22} {requests:>9} {sent / 2**20:>9.2f} {elapsed:>9.2f} {elapsed:>12.2f}")
+
+            cache.clear()
+            sent, server_secs, delivered_secs = async_to_sync(_push)(since, clients)
+            self.stdout.write(
+                f"{'pushed delta':<22} {0:>9} {sent / 2**20:>9.2f} {server_secs:>9.2f} {delivered_secs:>12.2f}"
+            )
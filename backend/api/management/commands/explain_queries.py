@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+
+from api.filters import equipment_queryset, filter_equipment
+from api.ingest import SESSIONS_TO_KEEP
+from api.models import EquipmentItem, IngestJob, SessionTypeStats, UploadSession
+from api.stats import METRICS, type_stats_queryset
+
+
+def _queries(session_id, content_hash, equipment_type):
+    """
+    ``(label, queryset, indexed_tables, ordered)`` for the queries behind each
+    view and maintenance path. ``indexed_tables`` must not be read with a full
+    scan; ``ordered`` queries must not need a sort step.
+    """
+    items, sessions = EquipmentItem._meta.db_table, UploadSession._meta.db_table
+    return [
+        ('summary: combined type stats', type_stats_queryset(), (), False),
+        ('summary: sketches', SessionTypeStats.objects.values_list('equipment_type', 'sketches'), (), False),
+        ('equipment list', EquipmentItem.objects.order_by('-id'), (), True),
+        ('history list', UploadSession.objects.order_by('-upload_date'), (sessions,), True),
+        ('retention: sessions to keep',
+         UploadSession.objects.order_by('-upload_date').values_list('id', flat=True)[:SESSIONS_TO_KEEP],
+         (sessions,), True),
+        ('retention: cascade to items', EquipmentItem.objects.filter(upload_session_id__in=[session_id]), (items,), False),
+        ('upload dedup lookup', UploadSession.objects.filter(content_hash=content_hash), (sessions,), False),
+        ('stats rebuild',
+         EquipmentItem.objects.filter(upload_session_id=session_id).values_list('equipment_type', *METRICS),
+         (items,), False),
+        ('session type distribution',
+         EquipmentItem.objects.filter(upload_session_id=session_id).values('equipment_type').annotate(count=Count('id')),
+         (items,), False),
+        ('equipment list: type filter',
+         equipment_queryset({'equipment_type': equipment_type})[:101], (items,), True),
+        ('equipment list: session + type filter',
+         equipment_queryset({'session': str(session_id), 'equipment_type': equipment_type})[:101], (items,), True),
+        ('equipment list: selective flowrate range',
+         filter_equipment(EquipmentItem.objects.all(), {'flowrate_min': '10', 'flowrate_max': '20'}).order_by('-id')[:101],
+         (items,), False),
+        ('equipment list: sort by name', equipment_queryset({'ordering': 'equipment_name'})[:101], (items,), True),
+        ('equipment list: sort by temperature', equipment_queryset({'ordering': '-temperature'})[:101], (items,), True),
+        ('equipment list: name prefix', equipment_queryset({'search': 'pump'})[:101], (items,), False),
+        ('ingest job queue',
+         IngestJob.objects.filter(state=IngestJob.QUEUED).order_by('created_at'),
+         (IngestJob._meta.db_table,), True),
+    ]
+
+
+def _problems(vendor, plan, indexed_tables, ordered):
+    problems = []
+    lines = plan.splitlines()
+    for table in indexed_tables:
+        if vendor == 'sqlite':
+            full_scan = any(f'SCAN {table}' in line and 'USING' not in line for line in lines)
+        else:
+            full_scan = any(f'Seq Scan on {table}' in line for line in lines)
+        if full_scan:
+            problems.append(f'full scan of {table}')
+    if ordered:
+        if vendor == 'sqlite':
+            needs_sort = any('TEMP B-TREE FOR ORDER BY' in line for line in lines)
+        else:
+            needs_sort = any(line.strip().lstrip('->').strip().startswith('Sort') for line in lines)
+        if needs_sort:
+            problems.append('sort step')
+    return problems
+
+
+@contextmanager
+def _planner_settings(connection, check):
+    """
+    On PostgreSQL the planner prefers sequential scans and sorts on small
+    tables; under --check they are discouraged so a plan only contains one
+    when no index can serve the query.
+    """
+    if not (check and connection.vendor == 'postgresql'):
+        yield
+        return
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+        yield
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans for the queries behind each API view (SQLite and PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--sql', action='store_true', help='Also print each query')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail if a query that should use an index does a full scan or sort'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Unsupported database vendor: {connection.vendor}')
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze is only supported on PostgreSQL')
+            explain_options['analyze'] = True
+
+        using = options['database']
+        session_id = UploadSession.objects.using(using).values_list('id', flat=True).first() or 1
+        content_hash = '0' * 64
+        equipment_type = EquipmentItem.objects.using(using).values_list('equipment_type', flat=True).first() or 'Pump'
+
+        failures = []
+        with _planner_settings(connection, options['check']):
+            for label, qs, indexed_tables, ordered in _queries(session_id, content_hash, equipment_type):
+                qs = qs.using(using)
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                if options['sql']:
+                    self.stdout.write(f'  {qs.query}')
+                plan = qs.explain(**explain_options)
+                for line in plan.splitlines():
+                    self.stdout.write(f'  {line}')
+                problems = _problems(connection.vendor, plan, indexed_tables, ordered)
+                if problems:
+                    failures.append(f"{label}: {', '.join(problems)}")
+                    self.stdout.write(self.style.WARNING(f"  ! {', '.join(problems)}"))
+                self.stdout.write('')
+
+        if options['check'] and failures:
+            raise CommandError('Query plan regressions:\n' + '\n'.join(failures))
@@ -1,11 +1,15 @@
 from django.core.management.base import BaseCommand
+from api.caching import bump_data_version
 from api.models import UploadSession, EquipmentItem
+from api.stats import rebuild_session_stats, session_types
 
 class Command(BaseCommand):
     help = 'Load sample equipment data for demonstration'
 
     def handle(self, *args, **options):
         # Clear existing data
+        replaced = list(UploadSession.objects.values_list('id', flat=True))
+        replaced_types = session_types(replaced)
         EquipmentItem.objects.all().delete()
         UploadSession.objects.all().delete()
         
@@ -29,5 +33,7 @@ class Command(BaseCommand):
         
         for item in sample_equipment:
             EquipmentItem.objects.create(**item)
+        rebuild_session_stats(session)
+        bump_data_version(added=[session.id], deleted=replaced, deleted_types=replaced_types)
         
         self.stdout.write(self.style.SUCCESS(f'Successfully loaded {len(sample_equipment)} equipment items'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import UploadSession
+from api.reports import render_session_reports
+
+
+class Command(BaseCommand):
+    help = 'Render one PDF report per upload session on a process pool into a zip file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the zip file to write')
+        parser.add_argument('--sessions', type=int, nargs='+', help='Session ids (default: all sessions)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--include-equipment', action='store_true', help='Append the full equipment listing')
+
+    def handle(self, *args, **options):
+        sessions = UploadSession.objects.all()
+        if options['sessions']:
+            sessions = sessions.filter(id__in=options['sessions'])
+            missing = set(options['sessions']) - {session.id for session in sessions}
+            if missing:
+                raise CommandError(f"Unknown session ids: {', '.join(map(str, sorted(missing)))}")
+        start = time.perf_counter()
+        written = render_session_reports(
+            list(sessions), options['output'], options['workers'], options['include_equipment']
+        )
+        self.stdout.write(f"Wrote {written} reports to {options['output']} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_job
+from api.models import IngestJob
+
+
+class Command(BaseCommand):
+    help = 'Process queued ingest jobs (use with INGEST_JOB_BACKEND = "queue")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        while True:
+            queued = list(
+                IngestJob.objects.filter(state=IngestJob.QUEUED).order_by('created_at').values_list('id', flat=True)
+            )
+            for job_id in queued:
+                job = run_job(job_id)
+                if job:
+                    self.stdout.write(f"{job.id} {job.state} rows={job.rows_processed} {job.error}".rstrip())
+            if options['once']:
+                break
+            if not queued:
+                time.sleep(options['interval'])
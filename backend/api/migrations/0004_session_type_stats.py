@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    EquipmentItem = apps.get_model('api', 'EquipmentItem')
+    SessionTypeStats = apps.get_model('api', 'SessionTypeStats')
+    annotations = {'count': Count('id')}
+    for metric in ['flowrate', 'pressure', 'temperature']:
+        annotations.update({
+            f'{metric}_sum': Sum(metric),
+            f'{metric}_sumsq': Sum(F(metric) * F(metric)),
+            f'{metric}_min': Min(metric),
+            f'{metric}_max': Max(metric),
+        })
+    rows = EquipmentItem.objects.values('upload_session_id', 'equipment_type').annotate(**annotations)
+    SessionTypeStats.objects.bulk_create([SessionTypeStats(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_upload_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionTypeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_type', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('flowrate_sum', models.FloatField(default=0)),
+                ('flowrate_sumsq', models.FloatField(default=0)),
+                ('flowrate_min', models.FloatField(null=True)),
+                ('flowrate_max', models.FloatField(null=True)),
+                ('pressure_sum', models.FloatField(default=0)),
+                ('pressure_sumsq', models.FloatField(default=0)),
+                ('pressure_min', models.FloatField(null=True)),
+                ('pressure_max', models.FloatField(null=True)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_sumsq', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('upload_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='type_stats', to='api.uploadsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('upload_session', 'equipment_type'), name='unique_session_type_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:03
+
+import math
+
+import numpy as np
+from django.db import migrations, models
+
+METRICS = ['flowrate', 'pressure', 'temperature']
+RELATIVE_ACCURACY = 0.01
+
+
+def _store(magnitudes, log_gamma):
+    keys, counts = np.unique(np.ceil(np.log(magnitudes) / log_gamma).astype(np.int64), return_counts=True)
+    return [keys.tolist(), counts.tolist()]
+
+
+def sketch_dict(values):
+    # Frozen copy of QuantileSketch.add() + to_dict() as of this migration,
+    # so the backfill keeps writing this format whatever api.sketches becomes
+    values = np.asarray(values, dtype=np.float64)
+    log_gamma = math.log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))
+    return {
+        'a': RELATIVE_ACCURACY,
+        'zero': int(np.count_nonzero(values == 0)),
+        'pos': _store(values[values > 0], log_gamma),
+        'neg': _store(-values[values < 0], log_gamma),
+    }
+
+
+def backfill_sketches(apps, schema_editor):
+    EquipmentItem = apps.get_model('api', 'EquipmentItem')
+    SessionTypeStats = apps.get_model('api', 'SessionTypeStats')
+    for row in SessionTypeStats.objects.all().iterator():
+        values = EquipmentItem.objects.filter(
+            upload_session_id=row.upload_session_id, equipment_type=row.equipment_type
+        ).values_list(*METRICS)
+        columns = list(zip(*values)) or [[] for _ in METRICS]
+        row.sketches = {metric: sketch_dict(column) for metric, column in zip(METRICS, columns)}
+        row.save(update_fields=['sketches'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessiontypestats',
+            name='sketches',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
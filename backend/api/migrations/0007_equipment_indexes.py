@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_type_stats_sketches'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipmentitem',
+            name='upload_session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.uploadsession'),
+        ),
+        migrations.AlterField(
+            model_name='ingestjob',
+            name='state',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['upload_session', 'equipment_type'], name='equipment_session_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['equipment_type'], name='equipment_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingestjob',
+            index=models.Index(fields=['state', 'created_at'], name='ingest_job_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['upload_date'], name='upload_session_date_idx'),
+        ),
+    ]
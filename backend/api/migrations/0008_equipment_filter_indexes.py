@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+# Serves equipment_name__istartswith: SQLite's LIKE is case-insensitive and
+# can only use a NOCASE index; PostgreSQL compares UPPER(name) with LIKE,
+# which needs a pattern_ops index on that expression.
+NAME_PREFIX_INDEX = {
+    'sqlite': 'CREATE INDEX equipment_name_prefix_idx ON api_equipmentitem (equipment_name COLLATE NOCASE)',
+    'postgresql': 'CREATE INDEX equipment_name_prefix_idx ON api_equipmentitem (UPPER(equipment_name::text) text_pattern_ops)',
+}
+
+
+def create_name_prefix_index(apps, schema_editor):
+    sql = NAME_PREFIX_INDEX.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_name_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor in NAME_PREFIX_INDEX:
+        schema_editor.execute('DROP INDEX IF EXISTS equipment_name_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_equipment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['flowrate'], name='equipment_flowrate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['pressure'], name='equipment_pressure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['temperature'], name='equipment_temperature_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['equipment_name'], name='equipment_name_idx'),
+        ),
+        migrations.RunPython(create_name_prefix_index, drop_name_prefix_index),
+    ]
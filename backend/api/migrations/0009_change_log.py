@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+def start_log_at_current_version(apps, schema_editor):
+    # Earlier changes were never logged; clients behind this version reload
+    DataVersion = apps.get_model('api', 'DataVersion')
+    DataVersion.objects.update(log_start=models.F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_equipment_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='log_start',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SessionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('added', 'Added'), ('deleted', 'Deleted')], max_length=10)),
+                ('session_id', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['version'], name='session_change_version_idx')],
+            },
+        ),
+        migrations.RunPython(start_log_at_current_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionchange',
+            name='equipment_types',
+            field=models.JSONField(default=list),
+        ),
+    ]
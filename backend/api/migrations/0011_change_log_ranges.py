@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_change_log_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionchange',
+            name='first_item',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionchange',
+            name='last_item',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='sessionchange',
+            name='kind',
+            field=models.CharField(choices=[('added', 'Added'), ('appended', 'Appended'), ('deleted', 'Deleted')], max_length=10),
+        ),
+    ]
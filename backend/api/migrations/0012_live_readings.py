@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_change_log_ranges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_name', models.CharField(max_length=255)),
+                ('equipment_type', models.CharField(max_length=100)),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('upload_session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='live_readings', to='api.uploadsession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_live_readings'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='LiveReading',
+        ),
+    ]
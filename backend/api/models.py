@@ -1,3 +1,4 @@
+import uuid
 
 from django.db import models
 
@@ -5,20 +6,142 @@ class UploadSession(models.Model):
     filename = models.CharField(max_length=255)
     upload_date = models.DateTimeField(auto_now_add=True)
     item_count = models.IntegerField(default=0)
+    # SHA-256 of the uploaded bytes; identical re-uploads resolve to this session
+    content_hash = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     class Meta:
         ordering = ['-upload_date']
+        indexes = [
+            # History listing and retention sweeps order by upload date
+            models.Index(fields=['upload_date'], name='upload_session_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.filename} - {self.upload_date}"
 
 class EquipmentItem(models.Model):
-    upload_session = models.ForeignKey(UploadSession, related_name='items', on_delete=models.CASCADE)
+    # Indexed through equipment_session_type_idx, whose leading column serves session lookups
+    upload_session = models.ForeignKey(UploadSession, related_name='items', on_delete=models.CASCADE, db_index=False)
     equipment_name = models.CharField(max_length=255)
     equipment_type = models.CharField(max_length=100)
     flowrate = models.FloatField()
     pressure = models.FloatField()
     temperature = models.FloatField()
 
+    class Meta:
+        indexes = [
+            # Per-session type breakdowns (stats rebuilds, per-type reads) and type filters
+            models.Index(fields=['upload_session', 'equipment_type'], name='equipment_session_type_idx'),
+            models.Index(fields=['equipment_type'], name='equipment_type_idx'),
+            # Range filters and sorting on the metrics
+            models.Index(fields=['flowrate'], name='equipment_flowrate_idx'),
+            models.Index(fields=['pressure'], name='equipment_pressure_idx'),
+            models.Index(fields=['temperature'], name='equipment_temperature_idx'),
+            # Sorting by name; the case-insensitive prefix search index is
+            # vendor-specific and lives in migration 0008 (equipment_name_prefix_idx)
+            models.Index(fields=['equipment_name'], name='equipment_name_idx'),
+        ]
+
     def __str__(self):
         return self.equipment_name
+
+class IngestJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    source_path = models.CharField(max_length=1024)
+    content_hash = models.CharField(max_length=64, blank=True)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=QUEUED)
+    rows_processed = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    upload_session = models.ForeignKey(UploadSession, related_name='jobs', null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers poll queued jobs oldest first
+            models.Index(fields=['state', 'created_at'], name='ingest_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} - {self.state}"
+
+class SessionTypeStats(models.Model):
+    """
+    Per-session, per-equipment-type aggregates written at ingest time.
+    Global summaries are combined from these rows instead of scanning
+    EquipmentItem; they are deleted along with their session.
+    """
+    METRICS = ['flowrate', 'pressure', 'temperature']
+
+    upload_session = models.ForeignKey(UploadSession, related_name='type_stats', on_delete=models.CASCADE)
+    equipment_type = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    flowrate_sum = models.FloatField(default=0)
+    flowrate_sumsq = models.FloatField(default=0)
+    flowrate_min = models.FloatField(null=True)
+    flowrate_max = models.FloatField(null=True)
+    pressure_sum = models.FloatField(default=0)
+    pressure_sumsq = models.FloatField(default=0)
+    pressure_min = models.FloatField(null=True)
+    pressure_max = models.FloatField(null=True)
+    temperature_sum = models.FloatField(default=0)
+    temperature_sumsq = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    # metric -> QuantileSketch.to_dict(), merged across sessions for quantiles/histograms
+    sketches = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload_session', 'equipment_type'], name='unique_session_type_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_session_id} / {self.equipment_type}"
+
+class DataVersion(models.Model):
+    """Single-row counter bumped whenever equipment data changes (ingest, retention)."""
+    version = models.BigIntegerField(default=0)
+    # SessionChange covers every version after this one; older ones were trimmed
+    log_start = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+class SessionChange(models.Model):
+    """Change log entry: a session added, appended to or deleted at a data version."""
+    ADDED = 'added'
+    APPENDED = 'appended'
+    DELETED = 'deleted'
+    KIND_CHOICES = [(ADDED, 'Added'), (APPENDED, 'Appended'), (DELETED, 'Deleted')]
+
+    version = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Not a foreign key: deletions outlive their session
+    session_id = models.IntegerField()
+    # Types a deleted session held, to route the deletion to type subscribers
+    equipment_types = models.JSONField(default=list)
+    # EquipmentItem id range an append wrote (other sessions' rows may interleave)
+    first_item = models.BigIntegerField(null=True)
+    last_item = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version'], name='session_change_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"v{self.version} {self.kind} {self.session_id}"
@@ -0,0 +1,24 @@
+"""
+Keyset pagination for the equipment list.
+
+Pages are positioned on ``-id`` (unique, indexed by the primary key), so each
+page is a ``WHERE id < <cursor> ORDER BY id DESC LIMIT n`` query and costs
+the same at any depth, unlike LIMIT/OFFSET. Cursors are DRF's opaque
+base64-encoded positions.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class EquipmentCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'EQUIPMENT_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'EQUIPMENT_MAX_PAGE_SIZE', 1000)
+
+    def is_requested(self, request):
+        """Pagination is opt-in: plain requests keep the full-list response."""
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
@@ -0,0 +1,397 @@
+"""
+PDF report rendering and the on-disk report cache.
+
+Rendered reports are stored in ``REPORT_CACHE_DIR`` as ``report-v<N>.pdf``,
+keyed on the data version, so a download at an unchanged version is a file
+send. Every ingest and retention sweep bumps the version, which invalidates
+the file; ``prewarm_report`` renders the next one on a background thread once
+the change commits, and older files are removed when a newer one is written.
+ReportLab styles are built once at import rather than per request.
+
+``?include=equipment`` adds the full equipment listing. Its rows are read
+through a DB cursor and turned into small tables on demand while ReportDocTemplate
+lays out pages, so neither the rows nor the flowables are ever held in full;
+the column headers are drawn by the page template on every listing page.
+"""
+import glob
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import (
+    BaseDocTemplate, Frame, NextPageTemplate, PageBreak, PageTemplate, Paragraph, Spacer, Table, TableStyle,
+)
+
+from .caching import get_data_version
+from .export import batches, export_chunk_rows
+from .models import EquipmentItem, UploadSession
+from .stats import combined_stats, mean
+
+_styles = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle('TitleStyle', parent=_styles['Heading1'], alignment=TA_CENTER, fontSize=20, spaceAfter=20, textColor=colors.HexColor("#1e293b"))
+SUBTITLE_STYLE = ParagraphStyle('SubStyle', parent=_styles['Normal'], alignment=TA_CENTER, fontSize=10, spaceAfter=30, textColor=colors.gray)
+SECTION_STYLE = ParagraphStyle('SectionStyle', parent=_styles['Heading2'], fontSize=14, fontName='Helvetica-Bold', spaceBefore=20, spaceAfter=12, textColor=colors.HexColor("#3b82f6"))
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#334155")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#f8fafc")),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor("#1e293b")),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#e2e8f0")),
+    ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+    ('PADDING', (0, 0), (-1, -1), 10),
+])
+
+DISTRIBUTION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#3b82f6")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+])
+
+LISTING_FIELDS = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+LISTING_HEADER = ['Equipment Name', 'Type', 'Flow (m³/h)', 'Pressure (Bar)', 'Temp (°C)']
+LISTING_COL_WIDTHS = [170, 100, 60, 60, 60]
+# Rows per listing Table: small tables keep ReportLab's split cost per page
+# constant (splitting one big table re-measures all remaining rows)
+LISTING_TABLE_ROWS = 100
+LISTING_NAME_CHARS = 40
+LISTING_HEADER_HEIGHT = 18
+# The distribution chart ticks every unit, as it always has, up to this many
+# units; beyond that ReportLab picks the step (a tick per unit at 100k rows
+# takes seconds to draw)
+CHART_UNIT_STEP_MAX = 20
+
+LISTING_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('LEADING', (0, 0), (-1, -1), 10),
+    ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor("#f1f5f9")]),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.HexColor("#e2e8f0")),
+])
+
+_REPORT_FILE = re.compile(r'report-v(\d+)(?:-[\w-]+)?\.pdf$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def report_cache_dir():
+    path = getattr(settings, 'REPORT_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'chemvis-reports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def report_path(version, include_equipment=False, session_id=None):
+    suffix = f'-s{session_id}' if session_id is not None else ''
+    suffix += '-equipment' if include_equipment else ''
+    return os.path.join(report_cache_dir(), f'report-v{version}{suffix}.pdf')
+
+
+def _page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.setFillColor(colors.gray)
+    canvas.drawRightString(doc.leftMargin + doc.width, doc.bottomMargin / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _listing_header(canvas, doc):
+    """Column headers above the listing frame, aligned with the table columns."""
+    canvas.saveState()
+    frame = doc.listing_frame
+    top = doc.bottomMargin + doc.height
+    x = frame._x1 + frame._leftPadding
+    canvas.setFillColor(colors.HexColor("#334155"))
+    canvas.rect(x, top - LISTING_HEADER_HEIGHT, sum(LISTING_COL_WIDTHS), LISTING_HEADER_HEIGHT, stroke=0, fill=1)
+    canvas.setFillColor(colors.whitesmoke)
+    canvas.setFont('Helvetica-Bold', 8)
+    for label, width in zip(LISTING_HEADER, LISTING_COL_WIDTHS):
+        canvas.drawString(x + 6, top - LISTING_HEADER_HEIGHT + 6, label)
+        x += width
+    canvas.restoreState()
+    _page_number(canvas, doc)
+
+
+class ReportDocTemplate(BaseDocTemplate):
+    """
+    Letter pages with a 'summary' template and a 'listing' template whose
+    frame starts below the repeated column headers. ``build`` accepts any
+    iterable of flowables and pulls from it as pages are laid out.
+    """
+    def __init__(self, output, **kwargs):
+        super().__init__(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=36, **kwargs)
+        body = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='body')
+        self.listing_frame = Frame(
+            self.leftMargin, self.bottomMargin, self.width, self.height - LISTING_HEADER_HEIGHT, id='listing',
+            topPadding=0,
+        )
+        self.addPageTemplates([
+            PageTemplate('summary', [body], onPage=_page_number),
+            PageTemplate('listing', [self.listing_frame], onPage=_listing_header),
+        ])
+
+    def build(self, flowables):
+        self._pending = iter(flowables)
+        self._queue = []
+        self._refill()
+        super().build(self._queue)
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        # Also called on the internal list of page-start flowables; only the build queue is refilled
+        if flowables is self._queue:
+            self._refill()
+
+    def _refill(self):
+        # Two queued flowables leave room for keepWithNext's lookahead
+        done = object()
+        while len(self._queue) < 2:
+            flowable = next(self._pending, done)
+            if flowable is done:
+                break
+            self._queue.append(flowable)
+
+
+def _listing_row(row):
+    name, equipment_type, flowrate, pressure, temperature = row
+    if len(name) > LISTING_NAME_CHARS:
+        name = name[:LISTING_NAME_CHARS - 1] + '…'
+    return [name, equipment_type, f"{flowrate:.2f}", f"{pressure:.2f}", f"{temperature:.2f}"]
+
+
+def equipment_listing(session=None):
+    """Listing tables of LISTING_TABLE_ROWS rows, oldest first, read through a server-side cursor."""
+    items = EquipmentItem.objects.all() if session is None else EquipmentItem.objects.filter(upload_session=session)
+    rows = items.order_by('id').values_list(*LISTING_FIELDS).iterator(chunk_size=export_chunk_rows())
+    for batch in batches(rows, LISTING_TABLE_ROWS):
+        yield Table([_listing_row(row) for row in batch], colWidths=LISTING_COL_WIDTHS, style=LISTING_TABLE_STYLE)
+
+
+def _distribution_chart(distribution):
+    chart_drawing = Drawing(400, 200)
+    bc = VerticalBarChart()
+    bc.x = 50
+    bc.y = 50
+    bc.height = 125
+    bc.width = 300
+
+    chart_labels = [d['equipment_type'] for d in distribution]
+    chart_values = [d['count'] for d in distribution]
+
+    bc.data = [tuple(chart_values)]
+    bc.strokeColor = colors.white
+    bc.valueAxis.valueMin = 0
+    bc.valueAxis.valueMax = max(chart_values) + 1
+    if bc.valueAxis.valueMax <= CHART_UNIT_STEP_MAX:
+        bc.valueAxis.valueStep = 1
+    bc.categoryAxis.labels.boxAnchor = 'ne'
+    bc.categoryAxis.labels.dx = 8
+    bc.categoryAxis.labels.dy = -2
+    bc.categoryAxis.labels.angle = 30
+    bc.categoryAxis.categoryNames = chart_labels
+    bc.bars[0].fillColor = colors.HexColor("#3b82f6")
+
+    chart_drawing.add(bc)
+    return chart_drawing
+
+
+def build_report(output, include_equipment=False, session=None):
+    """
+    Renders the summary report, followed by the equipment listing when
+    ``include_equipment``, into ``output`` (a path or binary file); for one
+    UploadSession when ``session`` is given. Returns False, writing nothing,
+    when there is no data.
+    """
+    totals, by_type = combined_stats(None if session is None else [session])
+    if not totals['count']:
+        return False
+    summary = {
+        'flow': mean(totals, 'flowrate'),
+        'press': mean(totals, 'pressure'),
+        'temp': mean(totals, 'temperature'),
+        'count': totals['count'],
+    }
+    distribution = sorted(
+        ({'equipment_type': t, 'count': row['count']} for t, row in by_type.items()),
+        key=lambda d: -d['count']
+    )
+
+    doc = ReportDocTemplate(output, pageCompression=1 if include_equipment else None)
+    doc.build(_report_flowables(summary, distribution, include_equipment, session))
+    return True
+
+
+def _report_flowables(summary, distribution, include_equipment, session):
+    elements = []
+
+    # 1. Title Section
+    generated = datetime.now().strftime('%B %d, %Y at %H:%M')
+    if session is None:
+        elements.append(Paragraph("ChemVis Pro Industrial Report", TITLE_STYLE))
+        elements.append(Paragraph(f"System Analytics Generated on {generated}", SUBTITLE_STYLE))
+    else:
+        elements.append(Paragraph("ChemVis Pro Upload Session Report", TITLE_STYLE))
+        elements.append(Paragraph(
+            f"Session #{session.id}: {escape(session.filename)}, uploaded {session.upload_date.strftime('%B %d, %Y at %H:%M')}"
+            f"<br/>Generated on {generated}", SUBTITLE_STYLE
+        ))
+
+    # 2. Global Metrics Table
+    elements.append(Paragraph("I. Global Summary Metrics" if session is None else "I. Session Summary Metrics", SECTION_STYLE))
+    summary_data = [
+        ['Metric', 'Calculated Average / Total'],
+        ['Total Equipment Units', f"{summary['count']}"],
+        ['Average Flowrate', f"{summary['flow']:.2f} m³/h"],
+        ['Average Pressure', f"{summary['press']:.2f} Bar"],
+        ['Average Temperature', f"{summary['temp']:.2f} °C"]
+    ]
+    summary_table = Table(summary_data, colWidths=[200, 200])
+    summary_table.setStyle(SUMMARY_TABLE_STYLE)
+    elements.append(summary_table)
+    elements.append(Spacer(1, 30))
+
+    # 3. Visual Analytics (Chart)
+    elements.append(Paragraph("II. Equipment Distribution Analytics", SECTION_STYLE))
+    elements.append(_distribution_chart(distribution))
+    elements.append(Spacer(1, 20))
+
+    # 4. Distribution Details Table
+    elements.append(Paragraph("III. Tabular Distribution", SECTION_STYLE))
+    dist_data = [['Equipment Type', 'Unit Count', 'Percentage']]
+    total_count = summary['count']
+    for d in distribution:
+        percentage = (d['count'] / total_count * 100) if total_count > 0 else 0
+        dist_data.append([d['equipment_type'], str(d['count']), f"{percentage:.1f}%"])
+    dist_table = Table(dist_data, colWidths=[150, 125, 125])
+    dist_table.setStyle(DISTRIBUTION_TABLE_STYLE)
+    elements.append(dist_table)
+    yield from elements
+
+    if include_equipment:
+        yield Paragraph(f"IV. Equipment Listing ({summary['count']} units, following pages)", SECTION_STYLE)
+        yield NextPageTemplate('listing')
+        yield PageBreak()
+        yield from equipment_listing(session)
+
+
+def _remove_older_reports(version):
+    for path in glob.glob(os.path.join(report_cache_dir(), 'report-v*.pdf')):
+        match = _REPORT_FILE.search(path)
+        if match and int(match.group(1)) < version:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def cached_report(version=None, include_equipment=False, session=None):
+    """
+    Path of the rendered report for ``version`` (default: current),
+    rendering it first if needed; None when there is no data. The version
+    is read before the data, so a file never holds older data than its name.
+    """
+    version = get_data_version() if version is None else version
+    path = report_path(version, include_equipment, None if session is None else session.id)
+    if os.path.exists(path):
+        return path
+    fd, tmp = tempfile.mkstemp(dir=report_cache_dir(), suffix='.tmp')
+    os.close(fd)
+    try:
+        if not build_report(tmp, include_equipment, session):
+            return None
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _remove_older_reports(version)
+    return path
+
+
+def session_report_name(session):
+    stem = re.sub(r'[^\w.-]+', '_', os.path.splitext(session.filename)[0])[:60]
+    return f'session-{session.id}-{stem}.pdf'
+
+
+def _render_session_report(session_id, directory, include_equipment):
+    """Process pool task: one session's report in ``directory``. Returns its path, None for an empty or deleted session."""
+    session = UploadSession.objects.filter(pk=session_id).first()
+    if session is None:
+        return None
+    path = os.path.join(directory, session_report_name(session))
+    return path if build_report(path, include_equipment, session) else None
+
+
+def render_session_reports(sessions, output, workers=None, include_equipment=False):
+    """
+    Renders one report per session on a process pool (ReportLab layout is
+    CPU-bound Python, so threads would serialize on the GIL) and adds each
+    to the zip file ``output`` as it completes. Returns the number of
+    reports written. The pool forks, so call this from a single-threaded
+    process such as a management command.
+    """
+    # Largest first, so a big session does not start last and run alone
+    sessions = sorted(sessions, key=lambda session: -session.item_count)
+    written = 0
+    with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        # Never share a live DB connection across fork()
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(_render_session_report, session.id, tmp, include_equipment) for session in sessions]
+            for future in as_completed(futures):
+                path = future.result()
+                if path is not None:
+                    archive.write(path, os.path.basename(path))
+                    os.remove(path)
+                    written += 1
+    return written
+
+
+def get_executor():
+    """One render thread: warm-ups queue behind each other instead of competing for the CPU."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-warm')
+        return _executor
+
+
+def warm_report():
+    """Renders the current version's report unless it is already on disk."""
+    close_old_connections()
+    try:
+        cached_report()
+    finally:
+        connection.close()
+
+
+def prewarm_report():
+    """Schedules ``warm_report`` once the current transaction (if any) commits."""
+    if getattr(settings, 'REPORT_PREWARM', True):
+        transaction.on_commit(lambda: get_executor().submit(warm_report))
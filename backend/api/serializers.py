@@ -1,6 +1,6 @@
 
 from rest_framework import serializers
-from .models import UploadSession, EquipmentItem
+from .models import UploadSession, EquipmentItem, IngestJob
 
 class EquipmentItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,3 +11,85 @@ class UploadSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadSession
         fields = '__all__'
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestJob
+        exclude = ['source_path']
+
+# Column layouts send these as {"dictionary": [...], "codes": [...]}
+COLUMN_DICTIONARY_FIELDS = ('equipment_type',)
+
+class ValuesSerializer:
+    """
+    Read-only fast path producing the same data as a ModelSerializer for
+    bulk reads: rows come from ``values()`` (no model instances), and only
+    fields whose representation differs from the database value, such as
+    datetimes, go through the DRF field. ``fields`` selects a sparse subset,
+    kept in the serializer's field order.
+    """
+    PASSTHROUGH_FIELDS = (
+        serializers.CharField, serializers.IntegerField, serializers.FloatField,
+        serializers.BooleanField, serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class, fields=None):
+        declared = serializer_class().get_fields()
+        if fields is not None:
+            unknown = sorted(set(fields) - set(declared))
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        self.fields = [name for name in declared if fields is None or name in fields]
+        self.converters = [
+            (name, field.to_representation) for name, field in declared.items()
+            if name in self.fields and not isinstance(field, self.PASSTHROUGH_FIELDS)
+        ]
+
+    @staticmethod
+    def requested_fields(request):
+        """The ``?fields=a,b`` sparse fieldset, or None for all fields."""
+        value = request.query_params.get('fields')
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def values(self, queryset, extra=()):
+        """``queryset`` as dicts of the selected fields plus any ``extra`` ones (e.g. a cursor key)."""
+        return queryset.values(*self.fields, *[name for name in extra if name not in self.fields])
+
+    def data(self, rows):
+        """Represents ``values()`` rows, dropping keys outside the selected fields."""
+        rows = list(rows)
+        if rows and len(rows[0]) != len(self.fields):
+            rows = [{name: row[name] for name in self.fields} for row in rows]
+        for name, convert in self.converters:
+            for row in rows:
+                if row[name] is not None:
+                    row[name] = convert(row[name])
+        return rows
+
+    def columns(self, rows, dictionary=()):
+        """
+        Column-oriented form of the same data: ``{field: [value per row]}``
+        from ``values_list(*self.fields)`` tuples or ``values()`` dicts. Fields
+        in ``dictionary`` are encoded as ``{"dictionary": [distinct values],
+        "codes": [index per row]}``.
+        """
+        rows = list(rows)
+        if rows and isinstance(rows[0], dict):
+            columns = ([row[name] for row in rows] for name in self.fields)
+        else:
+            columns = zip(*rows) if rows else [()] * len(self.fields)
+        converters = dict(self.converters)
+        out = {}
+        for name, column in zip(self.fields, columns):
+            convert = converters.get(name)
+            if convert is not None:
+                column = [None if value is None else convert(value) for value in column]
+            if name in dictionary:
+                index = {}
+                codes = [index.setdefault(value, len(index)) for value in column]
+                out[name] = {"dictionary": list(index), "codes": codes}
+            else:
+                out[name] = list(column)
+        return out
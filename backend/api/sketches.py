@@ -0,0 +1,111 @@
+"""
+Mergeable quantile sketch (DDSketch-style, relative-error log buckets).
+
+A value v > 0 lands in bucket ``ceil(log(v) / log(gamma))`` with
+``gamma = (1 + a) / (1 - a)``; negatives use a mirrored store and exact zeros
+a counter. Any quantile is then within relative error ``a`` of the true
+value, and two sketches merge by adding bucket counts, so per-session
+sketches combine into the global one without touching raw rows. Pure NumPy,
+no Django, so it can also run in parse workers.
+
+The ``to_dict()`` format is stored in SessionTypeStats.sketches and was
+backfilled by migration 0006 with a frozen copy of this code; change it
+only together with a data migration, and keep ``from_dict()`` reading it.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+
+    @property
+    def count(self):
+        return self.zero + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _add_store(self, store, magnitudes):
+        if not len(magnitudes):
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self._add_store(self.positive, values[values > 0])
+        self._add_store(self.negative, -values[values < 0])
+        self.zero += int(np.count_nonzero(values == 0))
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero += other.zero
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def buckets(self):
+        """``(representative values, counts)`` in ascending value order."""
+        neg = sorted(self.negative.items(), reverse=True)
+        pos = sorted(self.positive.items())
+        values = [-self._value(k) for k, _ in neg] + ([0.0] if self.zero else []) + [self._value(k) for k, _ in pos]
+        counts = [c for _, c in neg] + ([self.zero] if self.zero else []) + [c for _, c in pos]
+        return np.asarray(values, dtype=np.float64), np.asarray(counts, dtype=np.int64)
+
+    def quantiles(self, qs):
+        values, counts = self.buckets()
+        if not len(counts):
+            return [None for _ in qs]
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (cumulative[-1] - 1)
+        return values[np.searchsorted(cumulative, ranks, side='right')].tolist()
+
+    def fraction_between(self, low=None, high=None):
+        """Estimated share of values in [low, high] (either bound may be None)."""
+        values, counts = self.buckets()
+        total = counts.sum()
+        if not total:
+            return 0.0
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return float(counts[mask].sum() / total)
+
+    def histogram(self, edges):
+        """Counts per fixed bin; bucket representatives are clipped into [edges[0], edges[-1]]."""
+        values, counts = self.buckets()
+        if not len(counts):
+            return [0] * (len(edges) - 1)
+        hist, _ = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges, weights=counts)
+        return hist.astype(np.int64).tolist()
+
+    def to_dict(self):
+        return {
+            'a': self.relative_accuracy,
+            'zero': self.zero,
+            'pos': [list(self.positive.keys()), list(self.positive.values())],
+            'neg': [list(self.negative.keys()), list(self.negative.values())],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('a', DEFAULT_RELATIVE_ACCURACY))
+        sketch.zero = data.get('zero', 0)
+        sketch.positive = dict(zip(*data.get('pos', [[], []])))
+        sketch.negative = dict(zip(*data.get('neg', [[], []])))
+        return sketch
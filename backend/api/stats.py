@@ -0,0 +1,236 @@
+"""
+Materialized per-session statistics.
+
+Ingest feeds every parsed chunk to a SessionStatsBuilder, which keeps count,
+sum, sum of squares, min and max of each metric per equipment type and writes
+one SessionTypeStats row per type when the upload commits. Read paths combine
+those rows (O(sessions x types)) instead of aggregating EquipmentItem.
+"""
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.db.models import Max, Min, Sum
+
+from .models import EquipmentItem, SessionTypeStats
+from .sketches import QuantileSketch
+
+METRICS = SessionTypeStats.METRICS
+
+
+class SessionStatsBuilder:
+    def __init__(self):
+        # equipment_type -> {'count': n, 'flowrate_sum': ..., ...}
+        self.by_type = {}
+        # equipment_type -> {metric: QuantileSketch}
+        self.sketches = {}
+
+    def add(self, columns):
+        """Accumulates one ``chunk_columns()`` result."""
+        types = columns[1]
+        if not len(types):
+            return
+        codes, uniques = pd.factorize(np.asarray(types, dtype=object))
+        k = len(uniques)
+        counts = np.bincount(codes, minlength=k)
+        # Row order grouped by type, so each type's values are one contiguous slice
+        order = np.argsort(codes, kind='stable')
+        splits = np.cumsum(counts)[:-1]
+        per_metric = {}
+        for metric, values in zip(METRICS, columns[2:]):
+            values = np.asarray(values, dtype=np.float64)
+            for equipment_type, part in zip(uniques, np.split(values[order], splits)):
+                sketches = self.sketches.setdefault(equipment_type, {m: QuantileSketch() for m in METRICS})
+                sketches[metric].add(part)
+            mins = np.full(k, np.inf)
+            maxs = np.full(k, -np.inf)
+            np.minimum.at(mins, codes, values)
+            np.maximum.at(maxs, codes, values)
+            per_metric[metric] = (
+                np.bincount(codes, weights=values, minlength=k),
+                np.bincount(codes, weights=values * values, minlength=k),
+                mins,
+                maxs,
+            )
+        for i, equipment_type in enumerate(uniques):
+            acc = self.by_type.setdefault(equipment_type, _empty_accumulator())
+            acc['count'] += int(counts[i])
+            for metric, (sums, sumsqs, mins, maxs) in per_metric.items():
+                acc[f'{metric}_sum'] += float(sums[i])
+                acc[f'{metric}_sumsq'] += float(sumsqs[i])
+                acc[f'{metric}_min'] = _fmin(acc[f'{metric}_min'], float(mins[i]))
+                acc[f'{metric}_max'] = _fmax(acc[f'{metric}_max'], float(maxs[i]))
+
+    def save(self, session):
+        SessionTypeStats.objects.bulk_create([
+            SessionTypeStats(
+                upload_session=session,
+                equipment_type=equipment_type,
+                sketches={m: sketch.to_dict() for m, sketch in self.sketches[equipment_type].items()},
+                **acc
+            )
+            for equipment_type, acc in self.by_type.items()
+        ])
+
+
+def _empty_accumulator():
+    acc = {'count': 0}
+    for metric in METRICS:
+        acc.update({f'{metric}_sum': 0.0, f'{metric}_sumsq': 0.0, f'{metric}_min': None, f'{metric}_max': None})
+    return acc
+
+
+def _fmin(a, b):
+    return b if a is None else min(a, b)
+
+
+def _fmax(a, b):
+    return b if a is None else max(a, b)
+
+
+def rebuild_session_stats(session, chunk_size=50000):
+    """Recomputes a session's stats from its stored items (for rows written outside ingest)."""
+    builder = SessionStatsBuilder()
+    rows = EquipmentItem.objects.filter(upload_session=session).values_list(
+        'equipment_name', 'equipment_type', *METRICS
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        builder.add([list(column) for column in zip(*chunk)])
+    SessionTypeStats.objects.filter(upload_session=session).delete()
+    builder.save(session)
+
+
+def session_types(session_ids):
+    """``{session_id: [equipment types]}`` of the given sessions."""
+    types = {}
+    rows = SessionTypeStats.objects.filter(upload_session_id__in=session_ids).order_by('equipment_type')
+    for session_id, equipment_type in rows.values_list('upload_session_id', 'equipment_type'):
+        types.setdefault(session_id, []).append(equipment_type)
+    return types
+
+
+def type_stats_queryset(sessions=None):
+    """Per-type rows of stored stats combined across ``sessions`` (all by default)."""
+    qs = SessionTypeStats.objects.all()
+    if sessions is not None:
+        qs = qs.filter(upload_session__in=sessions)
+    annotations = {'count': Sum('count')}
+    for metric in METRICS:
+        annotations.update({
+            f'{metric}_sum': Sum(f'{metric}_sum'),
+            f'{metric}_sumsq': Sum(f'{metric}_sumsq'),
+            f'{metric}_min': Min(f'{metric}_min'),
+            f'{metric}_max': Max(f'{metric}_max'),
+        })
+    return qs.values('equipment_type').annotate(**annotations)
+
+
+def combined_stats(sessions=None):
+    """
+    Combines stored per-session rows into ``(totals, by_type)``.
+    ``totals`` holds ``count`` and, per metric, ``sum``/``sumsq``/``min``/``max``;
+    ``by_type`` maps equipment_type to the same keys. ``sessions`` optionally
+    restricts the combination to a queryset or list of sessions.
+    """
+    by_type = {row.pop('equipment_type'): row for row in type_stats_queryset(sessions)}
+    totals = _empty_accumulator()
+    for row in by_type.values():
+        totals['count'] += row['count']
+        for metric in METRICS:
+            totals[f'{metric}_sum'] += row[f'{metric}_sum']
+            totals[f'{metric}_sumsq'] += row[f'{metric}_sumsq']
+            totals[f'{metric}_min'] = _fmin(totals[f'{metric}_min'], row[f'{metric}_min'])
+            totals[f'{metric}_max'] = _fmax(totals[f'{metric}_max'], row[f'{metric}_max'])
+    return totals, by_type
+
+
+def combined_sketches(sessions=None):
+    """Merges stored sketches into ``{equipment_type: {metric: QuantileSketch}}``."""
+    qs = SessionTypeStats.objects.all()
+    if sessions is not None:
+        qs = qs.filter(upload_session__in=sessions)
+    merged = {}
+    for equipment_type, sketches in qs.values_list('equipment_type', 'sketches'):
+        target = merged.setdefault(equipment_type, {})
+        for metric, data in sketches.items():
+            sketch = QuantileSketch.from_dict(data)
+            if metric in target:
+                target[metric].merge(sketch)
+            else:
+                target[metric] = sketch
+    return merged
+
+
+def summary_data(totals, by_type):
+    """The /api/summary/ body (without ``distribution``) for ``combined_stats()`` output."""
+    if not totals['count']:
+        return {
+            "total_equipment": 0, "avg_flowrate": 0, "avg_pressure": 0,
+            "avg_temperature": 0, "type_distribution": {}
+        }
+    return {
+        "total_equipment": totals['count'],
+        "avg_flowrate": round(mean(totals, 'flowrate'), 2),
+        "avg_pressure": round(mean(totals, 'pressure'), 2),
+        "avg_temperature": round(mean(totals, 'temperature'), 2),
+        "type_distribution": {t: row['count'] for t, row in by_type.items()}
+    }
+
+
+def overall_sketches(sketches):
+    """Merges ``combined_sketches()`` output across types into ``{metric: QuantileSketch}``."""
+    overall = {}
+    for per_type in sketches.values():
+        for metric, sketch in per_type.items():
+            overall.setdefault(metric, QuantileSketch(sketch.relative_accuracy)).merge(sketch)
+    return overall
+
+
+def distribution(totals, by_type, sketches, bins=10, quantiles=(0.5, 0.95, 0.99)):
+    """
+    ``{'overall': ..., 'by_type': {type: ...}}`` where each value maps a
+    metric to its mean, std, min, max, the requested quantiles and a
+    fixed-bin histogram spanning [min, max], all derived from stored stats
+    and merged sketches rather than raw rows.
+    """
+    overall = overall_sketches(sketches)
+
+    def describe(stats, metric_sketches):
+        out = {}
+        for metric in METRICS:
+            sketch = metric_sketches.get(metric)
+            lo, hi = stats[f'{metric}_min'], stats[f'{metric}_max']
+            entry = {
+                'mean': round(mean(stats, metric), 4),
+                'std': round(std(stats, metric), 4),
+                'min': lo,
+                'max': hi,
+            }
+            if sketch is not None and sketch.count and lo is not None:
+                for q, value in zip(quantiles, sketch.quantiles(quantiles)):
+                    entry[f'p{round(q * 100):g}'] = round(min(max(value, lo), hi), 4)
+                edges = np.linspace(lo, hi if hi > lo else lo + 1, bins + 1)
+                entry['histogram'] = {'edges': [round(e, 4) for e in edges.tolist()], 'counts': sketch.histogram(edges)}
+            out[metric] = entry
+        return out
+
+    return {
+        'overall': describe(totals, overall),
+        'by_type': {t: describe(row, sketches.get(t, {})) for t, row in by_type.items()},
+    }
+
+
+def mean(stats, metric):
+    return stats[f'{metric}_sum'] / stats['count'] if stats['count'] else 0
+
+
+def std(stats, metric):
+    """Population standard deviation from count, sum and sum of squares."""
+    n = stats['count']
+    if not n:
+        return 0
+    m = stats[f'{metric}_sum'] / n
+    return max(stats[f'{metric}_sumsq'] / n - m * m, 0.0) ** 0.5
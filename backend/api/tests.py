@@ -1,3 +1,1110 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import warnings
+import zipfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db.models import Avg, Count, F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import notifications, reports
+from .caching import get_data_version
+from .filters import filter_equipment
+from .changes import trim_change_log
+from .consumers import DataUpdateConsumer, TelemetryConsumer
+from .ingest import prune_sessions
+from .jobs import run_job
+from .middleware import CODECS, choose_encoding
+from .notifications import (
+    PACKED_PROTOCOL, UPDATE_GROUP, UpdateCoalescer, encode_update, notify_data_update, refetch_message, update_message,
+)
+from .models import DataVersion, UploadSession, EquipmentItem, IngestJob, SessionChange, SessionTypeStats
+from .renderers import FastJSONRenderer
+from .serializers import EquipmentItemSerializer, UploadSessionSerializer
+from .sketches import QuantileSketch
+from .stats import SessionStatsBuilder, combined_stats, mean, rebuild_session_stats, std
+from .telemetry import TelemetryWriter, reading_columns
+
+SAMPLE_CSV = (
+    "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+    "Pump A,Pump,45.5,3.2,42.0\n"
+    "Boiler B,Boiler,0,8.5,185.2\n"
+    "Tank C,Tank,12.0,1.1,22.5\n"
+)
+
+
+def csv_upload(content=SAMPLE_CSV, name='sample.csv'):
+    return SimpleUploadedFile(name, content.encode(), content_type='text/csv')
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('admin', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=SAMPLE_CSV, name='sample.csv', **extra):
+        return self.client.post('/api/upload/', {'file': csv_upload(content, name)}, format='multipart', **extra)
+
+
+class CSVUploadTests(APITestCase):
+    def test_upload_creates_session_and_items(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        session = UploadSession.objects.get()
+        self.assertEqual(session.item_count, 3)
+        self.assertEqual(EquipmentItem.objects.count(), 3)
+        self.assertEqual(EquipmentItem.objects.get(equipment_name='Boiler B').temperature, 185.2)
+
+    def test_missing_columns_rejected(self):
+        response = self.upload("Equipment Name,Type\nPump A,Pump\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    @override_settings(INGEST_CHUNK_ROWS=2, INGEST_BATCH_SIZE=1)
+    def test_chunked_ingest_is_atomic(self):
+        self.assertEqual(self.upload().status_code, 201)
+        self.assertEqual(EquipmentItem.objects.count(), 3)
+
+        bad = SAMPLE_CSV + "Mixer D,Mixer,fast,1.5,35.0\n"
+        self.assertEqual(self.upload(bad).status_code, 400)
+        self.assertEqual(UploadSession.objects.count(), 1)
+        self.assertEqual(EquipmentItem.objects.count(), 3)
+
+    @override_settings(INGEST_DEFER_INDEXES_MIN_ROWS=1)
+    def test_large_upload_defers_indexes(self):
+        def indexes():
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, EquipmentItem._meta.db_table)
+            return sorted(name for name, info in constraints.items() if info['index'])
+        before = indexes()
+        self.assertIn('equipment_name_prefix_idx', before)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.upload().status_code, 201)
+        self.assertEqual(sum('DROP INDEX' in q['sql'] for q in queries), len(before))
+        self.assertEqual(indexes(), before)
+        self.assertEqual(EquipmentItem.objects.filter(equipment_type='Pump').count(), 1)
+
+        # A failed upload rolls the drop back; one smaller than the stored rows keeps the indexes
+        self.assertEqual(self.upload(SAMPLE_CSV + "Mixer D,Mixer,fast,1.5,35.0\n", 'bad.csv').status_code, 400)
+        self.assertEqual(indexes(), before)
+        with CaptureQueriesContext(connection) as queries:
+            self.upload("Equipment Name,Type,Flowrate,Pressure,Temperature\nP,Pump,1,2,3\n", 'one.csv')
+        self.assertFalse(any('DROP INDEX' in q['sql'] for q in queries))
+
+    def test_retention_keeps_last_five(self):
+        for i in range(7):
+            self.upload(SAMPLE_CSV.replace('Pump A', f'Pump {i}'), name=f'upload_{i}.csv')
+        self.assertEqual(UploadSession.objects.count(), 5)
+        self.assertEqual(EquipmentItem.objects.count(), 15)
+
+
+@override_settings(INGEST_JOB_BACKEND='queue')
+class IngestJobTests(APITestCase):
+    def test_async_upload_returns_job_and_runs_later(self):
+        response = self.upload(QUERY_STRING='async=1')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], response.data['status_url'])
+        self.assertFalse(UploadSession.objects.exists())
+
+        status_url = response.data['status_url']
+        self.assertEqual(self.client.get(status_url).data['state'], IngestJob.QUEUED)
+
+        run_job(response.data['job_id'])
+        job = self.client.get(status_url).data
+        self.assertEqual(job['state'], IngestJob.SUCCEEDED)
+        self.assertEqual(job['rows_processed'], 3)
+        self.assertEqual(job['upload_session'], UploadSession.objects.get().id)
+        self.assertNotIn('source_path', job)
+
+    def test_failed_job_records_error(self):
+        response = self.upload("Equipment Name,Type\nPump A,Pump\n", QUERY_STRING='async=1')
+        job = run_job(response.data['job_id'])
+        self.assertEqual(job.state, IngestJob.FAILED)
+        self.assertIn('Missing required columns', job.error)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class UploadDeduplicationTests(APITestCase):
+    def test_identical_reupload_resolves_to_existing_session(self):
+        first = self.upload()
+        self.assertEqual(first.status_code, 201)
+        self.assertFalse(first.data['deduplicated'])
+
+        again = self.upload(name='renamed.csv')
+        self.assertEqual(again.status_code, 200)
+        self.assertTrue(again.data['deduplicated'])
+        self.assertEqual(again.data['session_id'], first.data['session_id'])
+        self.assertEqual(UploadSession.objects.count(), 1)
+        self.assertEqual(EquipmentItem.objects.count(), 3)
+
+    def test_different_content_is_ingested(self):
+        self.upload()
+        response = self.upload(SAMPLE_CSV + "Mixer D,Mixer,8.2,1.5,35.0\n")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(UploadSession.objects.count(), 2)
+
+    @override_settings(INGEST_JOB_BACKEND='queue')
+    def test_async_reupload_skips_job(self):
+        self.upload()
+        response = self.upload(QUERY_STRING='async=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['deduplicated'])
+        self.assertFalse(IngestJob.objects.exists())
+
+
+class BatchUploadTests(APITestCase):
+    def batch(self, files):
+        return self.client.post('/api/upload/batch/', {'files': files}, format='multipart')
+
+    def test_multiple_files_become_one_session(self):
+        files = [csv_upload(SAMPLE_CSV.replace('Pump A', f'Pump {i}'), f'unit_{i}.csv') for i in range(3)]
+        response = self.batch(files)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['files'], 3)
+        session = UploadSession.objects.get()
+        self.assertEqual(session.item_count, 9)
+        self.assertEqual(session.filename, 'unit_0.csv (+2 more)')
+        self.assertEqual(EquipmentItem.objects.filter(equipment_name='Pump 2').count(), 1)
+
+    def test_zip_archive(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('plant/unit_a.csv', SAMPLE_CSV)
+            archive.writestr('plant/unit_b.csv', SAMPLE_CSV.replace('Tank C', 'Tank D'))
+            archive.writestr('plant/readme.txt', 'ignored')
+        archive_file = SimpleUploadedFile('plant.zip', buffer.getvalue(), content_type='application/zip')
+        response = self.batch([archive_file])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(UploadSession.objects.get().filename, 'plant.zip')
+        self.assertEqual(EquipmentItem.objects.count(), 6)
+
+        # Same files, different packaging: deduplicated
+        again = self.batch([csv_upload(SAMPLE_CSV.replace('Tank C', 'Tank D'), 'b.csv'), csv_upload(SAMPLE_CSV, 'a.csv')])
+        self.assertTrue(again.data['deduplicated'])
+
+    def test_one_bad_file_rolls_back_batch(self):
+        files = [csv_upload(), csv_upload("Equipment Name,Type\nPump A,Pump\n", 'bad.csv')]
+        response = self.batch(files)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bad.csv', response.data['error'])
+        self.assertFalse(UploadSession.objects.exists())
+
+
+def sample_frame():
+    return pd.read_csv(io.StringIO(SAMPLE_CSV))
+
+
+class ColumnarUploadTests(APITestCase):
+    def upload_bytes(self, data, name):
+        upload = SimpleUploadedFile(name, data, content_type='application/octet-stream')
+        return self.client.post('/api/upload/', {'file': upload}, format='multipart')
+
+    def assertIngested(self, response):
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(UploadSession.objects.get().item_count, 3)
+        self.assertEqual(EquipmentItem.objects.get(equipment_name='Boiler B').temperature, 185.2)
+
+    @skipUnless(pyarrow, 'pyarrow not installed')
+    def test_parquet(self):
+        buffer = io.BytesIO()
+        sample_frame().to_parquet(buffer, index=False)
+        self.assertIngested(self.upload_bytes(buffer.getvalue(), 'plant.parquet'))
+
+    @skipUnless(pyarrow, 'pyarrow not installed')
+    def test_arrow_ipc_file_and_stream(self):
+        table = pyarrow.Table.from_pandas(sample_frame(), preserve_index=False)
+        buffer = io.BytesIO()
+        with pyarrow.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+        self.assertIngested(self.upload_bytes(buffer.getvalue(), 'plant.arrow'))
+
+        UploadSession.objects.all().delete()
+        buffer = io.BytesIO()
+        with pyarrow.ipc.new_stream(buffer, table.schema) as writer:
+            writer.write_table(table, max_chunksize=2)
+        self.assertIngested(self.upload_bytes(buffer.getvalue(), 'plant.ipc'))
+
+    def test_npz(self):
+        df = sample_frame()
+        buffer = io.BytesIO()
+        np.savez(buffer, **{col: df[col].to_numpy(dtype=str if col in ('Equipment Name', 'Type') else float) for col in df.columns})
+        self.assertIngested(self.upload_bytes(buffer.getvalue(), 'plant.npz'))
+
+    def test_npz_missing_columns_rejected(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, Flowrate=np.array([1.0]))
+        self.assertEqual(self.upload_bytes(buffer.getvalue(), 'plant.npz').status_code, 400)
+
+
+class SessionStatsTests(APITestCase):
+    def test_summary_matches_raw_aggregates(self):
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank', 'Pump D,Pump'))
+        raw = EquipmentItem.objects.aggregate(
+            count=Count('id'), flow=Avg('flowrate'), press=Avg('pressure'), temp=Avg('temperature')
+        )
+        summary = self.client.get('/api/summary/').data
+        self.assertEqual(summary['total_equipment'], raw['count'])
+        self.assertEqual(summary['avg_flowrate'], round(raw['flow'], 2))
+        self.assertEqual(summary['avg_pressure'], round(raw['press'], 2))
+        self.assertEqual(summary['avg_temperature'], round(raw['temp'], 2))
+        self.assertEqual(summary['type_distribution'], {'Pump': 3, 'Boiler': 2, 'Tank': 1})
+
+    @override_settings(INGEST_CHUNK_ROWS=2)
+    def test_stats_merge_across_chunks(self):
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank,12.0', 'Pump D,Pump,99.5'))
+        totals, by_type = combined_stats()
+        pump = by_type['Pump']
+        self.assertEqual(pump['count'], 3)
+        self.assertEqual(pump['flowrate_min'], 45.5)
+        self.assertEqual(pump['flowrate_max'], 99.5)
+        self.assertAlmostEqual(mean(pump, 'flowrate'), (45.5 * 2 + 99.5) / 3)
+        self.assertAlmostEqual(std(pump, 'pressure'), 0.98 ** 0.5)
+        self.assertEqual(totals['temperature_max'], 185.2)
+
+    def test_retention_drops_stats_with_session(self):
+        for i in range(6):
+            self.upload(SAMPLE_CSV.replace('Pump A', f'Pump {i}'))
+        self.assertEqual(SessionTypeStats.objects.values('upload_session').distinct().count(), 5)
+        self.assertEqual(self.client.get('/api/summary/').data['total_equipment'], 15)
+
+    def test_empty_summary(self):
+        self.assertEqual(self.client.get('/api/summary/').data['total_equipment'], 0)
+        self.assertEqual(self.client.get('/api/report/').status_code, 404)
+
+
+class DistributionTests(APITestCase):
+    def test_sketch_quantiles_within_relative_accuracy(self):
+        values = np.random.default_rng(0).lognormal(3, 1, 20000)
+        sketch = QuantileSketch()
+        sketch.add(values)
+        for q, estimate in zip((0.5, 0.95, 0.99), sketch.quantiles((0.5, 0.95, 0.99))):
+            exact = np.quantile(values, q, method='lower')
+            self.assertLessEqual(abs(estimate - exact) / exact, 0.011)
+
+    def test_merged_sketches_equal_global_sketch(self):
+        values = np.random.default_rng(1).normal(0, 50, 5000)
+        whole = QuantileSketch()
+        whole.add(values)
+        merged = QuantileSketch()
+        for part in np.array_split(values, 7):
+            piece = QuantileSketch()
+            piece.add(part)
+            merged.merge(QuantileSketch.from_dict(piece.to_dict()))
+        self.assertEqual(merged.buckets()[1].tolist(), whole.buckets()[1].tolist())
+        self.assertEqual(merged.quantiles((0.01, 0.5, 0.99)), whole.quantiles((0.01, 0.5, 0.99)))
+
+    @override_settings(INGEST_CHUNK_ROWS=2)
+    def test_summary_distribution(self):
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank,12.0', 'Pump D,Pump,99.5'))
+        plain = self.client.get('/api/summary/').json()
+        self.assertNotIn('distribution', plain)
+
+        summary = self.client.get('/api/summary/', {'include': 'distribution', 'bins': 4}).json()
+        pump = summary['distribution']['by_type']['Pump']['flowrate']
+        self.assertEqual((pump['min'], pump['max']), (45.5, 99.5))
+        self.assertAlmostEqual(pump['p50'], 45.5, delta=45.5 * 0.01)
+        # Lower-rank quantiles: p99 of three values is the second smallest
+        self.assertAlmostEqual(pump['p99'], 45.5, delta=45.5 * 0.01)
+        self.assertEqual(len(pump['histogram']['edges']), 5)
+        self.assertEqual(pump['histogram']['counts'], [2, 0, 0, 1])
+        overall = summary['distribution']['overall']['temperature']
+        self.assertEqual(sum(overall['histogram']['counts']), 6)
+        self.assertEqual(overall['max'], 185.2)
+
+        self.assertEqual(self.client.get('/api/summary/', {'bins': 0}).status_code, 400)
+
+    def test_rebuild_fills_sketches(self):
+        self.upload()
+        session = UploadSession.objects.get()
+        SessionTypeStats.objects.update(sketches={})
+        rebuild_session_stats(session)
+        sketches = SessionTypeStats.objects.get(equipment_type='Boiler').sketches
+        self.assertEqual(QuantileSketch.from_dict(sketches['flowrate']).zero, 1)
+        self.assertEqual(QuantileSketch.from_dict(sketches['pressure']).count, 1)
+
+
+class EquipmentPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        rows = ''.join(f"Unit {i},Pump,{i},1.0,20.0\n" for i in range(25))
+        self.upload("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + rows)
+        self.ids = list(EquipmentItem.objects.order_by('-id').values_list('id', flat=True))
+
+    def test_unpaginated_by_default(self):
+        data = self.client.get('/api/equipment/').json()
+        self.assertEqual([item['id'] for item in data], self.ids)
+
+    def test_cursor_walks_all_rows_in_id_order(self):
+        seen, url = [], '/api/equipment/?page_size=10'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 10)
+            seen += [item['id'] for item in page['results']]
+            url = page['next']
+        self.assertEqual(seen, self.ids)
+
+        back = self.client.get(page['previous']).json()
+        self.assertEqual([item['id'] for item in back['results']], self.ids[10:20])
+
+    def test_pages_use_keyset_not_offset(self):
+        first = self.client.get('/api/equipment/', {'page_size': 5}).json()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        sql = queries.captured_queries[-1]['sql'].upper()
+        self.assertIn('"ID" <', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    @override_settings(EQUIPMENT_MAX_PAGE_SIZE=7)
+    def test_page_size_is_capped(self):
+        page = self.client.get('/api/equipment/', {'page_size': 1000}).json()
+        self.assertEqual(len(page['results']), 7)
+        self.assertIsNone(page['previous'])
+
+
+class EquipmentFilterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank,12.0', 'pump D,Pump,99.5'))
+        self.latest = UploadSession.objects.order_by('-upload_date').first()
+
+    def names(self, **params):
+        response = self.client.get('/api/equipment/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['equipment_name'] for item in response.json()]
+
+    def test_type_and_session(self):
+        self.assertEqual(self.names(equipment_type='Pump'), ['pump D', 'Pump A', 'Pump A'])
+        self.assertEqual(self.names(equipment_type='Pump', session=self.latest.id), ['pump D', 'Pump A'])
+
+    def test_ranges_and_ordering(self):
+        self.assertEqual(self.names(flowrate_min=40, flowrate_max=50), ['Pump A', 'Pump A'])
+        self.assertEqual(self.names(temperature_min=100), ['Boiler B', 'Boiler B'])
+        self.assertEqual(self.names(ordering='flowrate', flowrate_min=1)[:3], ['Tank C', 'Pump A', 'Pump A'])
+        self.assertEqual(self.names(ordering='-flowrate')[0], 'pump D')
+
+    def test_name_prefix_is_case_insensitive(self):
+        self.assertEqual(self.names(search='PUMP'), ['pump D', 'Pump A', 'Pump A'])
+        self.assertEqual(self.names(search='pump d'), ['pump D'])
+        self.assertEqual(self.names(search='%'), [])
+
+    def test_unindexed_ranges_return_the_same_rows(self):
+        params = {'flowrate_min': '10', 'pressure_max': '5'}
+        expected = list(filter_equipment(EquipmentItem.objects.order_by('-id'), params).values_list('id', flat=True))
+        hinted = filter_equipment(EquipmentItem.objects.order_by('-id'), params, unindexed={'flowrate', 'pressure'})
+        self.assertIn('+', str(hinted.query))
+        self.assertEqual(list(hinted.values_list('id', flat=True)), expected)
+
+    def test_filters_combine_with_pagination(self):
+        page = self.client.get('/api/equipment/', {'equipment_type': 'Pump', 'page_size': 2}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertIn('equipment_type=Pump', page['next'])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([item['equipment_name'] for item in rest['results']], ['Pump A'])
+
+    def test_invalid_parameters(self):
+        for params in ({'flowrate_min': 'abc'}, {'ordering': 'filename'}, {'session': 'x'}):
+            response = self.client.get('/api/equipment/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+
+class FastSerializationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            "Pump \u00e9\u2028A,Pump,45.5,0.00001,1e16\n"
+            "Boiler B,Boiler,0,8.5,-185.25\n"
+        )
+        self.upload()
+
+    def assertMatchesModelSerializer(self, url, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.content, expected)
+
+    def test_output_is_byte_compatible(self):
+        self.assertMatchesModelSerializer('/api/equipment/', EquipmentItemSerializer, EquipmentItem.objects.order_by('-id'))
+        self.assertMatchesModelSerializer('/api/history/', UploadSessionSerializer, UploadSession.objects.order_by('-upload_date'))
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = [{'a': 1e-05, 'b': 1e16, 'c': 'x\u2029y', 'd': None, 'e': 0.1 + 0.2}, {'a': 123456.789}]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_sparse_fieldsets(self):
+        data = self.client.get('/api/equipment/', {'fields': 'flowrate,equipment_name'}).json()
+        self.assertEqual(list(data[0]), ['equipment_name', 'flowrate'])
+        page = self.client.get('/api/equipment/', {'fields': 'equipment_name', 'page_size': 2}).json()
+        self.assertEqual(page['results'], [{'equipment_name': 'Tank C'}, {'equipment_name': 'Boiler B'}])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 2)
+        history = self.client.get('/api/history/', {'fields': 'filename,upload_date'}).json()
+        self.assertEqual(list(history[0]), ['filename', 'upload_date'])
+        self.assertTrue(history[0]['upload_date'].endswith('Z'))
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get('/api/equipment/', {'fields': 'equipment_name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+
+class EquipmentExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Pump A', 'Pump Z'))
+        self.latest = UploadSession.objects.order_by('-upload_date').first()
+
+    def export(self, **extra):
+        response = self.client.get('/api/export/', **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    @override_settings(EXPORT_CHUNK_ROWS=2)
+    def test_ndjson_streams_every_row(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(EquipmentItem.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(list(rows[0]), ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature', 'upload_session'])
+
+    def test_csv_with_session_filter_and_fields(self):
+        response, body = self.export(
+            QUERY_STRING=f'format=csv&session={self.latest.id}&fields=equipment_name,flowrate'
+        )
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(body.decode().splitlines(), ['equipment_name,flowrate', 'Pump Z,45.5', 'Boiler B,0.0', 'Tank C,12.0'])
+
+    def test_accept_header_and_gzip(self):
+        response, body = self.export(HTTP_ACCEPT='text/csv', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(body).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+
+        for header in ('gzip;q=0, identity', 'x-gzip-nope', 'br'):
+            response, body = self.export(HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+            self.assertEqual(len(body.splitlines()), 6)
+        response, body = self.export(HTTP_ACCEPT_ENCODING='*')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    async def test_streams_asynchronously_under_asgi(self):
+        auth = 'Basic ' + base64.b64encode(b'admin:password123').decode()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # Django warns when it has to buffer a sync iterator
+            response = await AsyncClient().get('/api/export/', headers={'Authorization': auth})
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 6)
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/export/', {'session': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'session', response.content)
+
+
+class ColumnarLayoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank', 'Pump D,Pump'))
+
+    def test_columns_match_rows(self):
+        rows = self.client.get('/api/equipment/').json()
+        data = self.client.get('/api/equipment/', {'layout': 'columns'}).json()
+        self.assertEqual(data['count'], len(rows))
+        columns = data['columns']
+        self.assertEqual(columns['flowrate'], [row['flowrate'] for row in rows])
+        types = columns['equipment_type']
+        self.assertEqual(types['dictionary'], ['Pump', 'Boiler', 'Tank'])
+        self.assertEqual([types['dictionary'][code] for code in types['codes']], [row['equipment_type'] for row in rows])
+
+    def test_columns_with_fields_and_pages(self):
+        page = self.client.get('/api/equipment/', {'layout': 'columns', 'fields': 'equipment_name', 'page_size': 4}).json()
+        self.assertEqual(page['results'], {'equipment_name': ['Pump D', 'Boiler B', 'Pump A', 'Tank C']})
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(rest['results']['equipment_name'], ['Boiler B', 'Pump A'])
+        self.assertEqual(self.client.get('/api/equipment/', {'layout': 'wide'}).status_code, 400)
+
+
+@override_settings(COMPRESSION_MIN_BYTES=0)
+class CompressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+
+    def test_negotiates_preferred_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br, zstd'), CODECS[0][0])
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(choose_encoding('identity'), None)
+        self.assertEqual(choose_encoding('*;q=0.1'), CODECS[0][0])
+        self.assertEqual(choose_encoding(''), None)
+
+    def test_gzip_response_and_weak_etag_revalidation(self):
+        plain = self.client.get('/api/equipment/')
+        response = self.client.get('/api/equipment/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        again = self.client.get('/api/equipment/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_errors_and_streams_are_untouched(self):
+        response = self.client.get('/api/equipment/', {'layout': 'x'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/export/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ChangeLogTests(APITestCase):
+    def changes(self, since, **params):
+        return self.client.get('/api/changes/', {'since': since, **params})
+
+    def test_changes_since_version(self):
+        start = self.client.get('/api/changes/').json()['version']
+        self.upload()
+        first = UploadSession.objects.get()
+        data = self.changes(start).json()
+        self.assertEqual(data['version'], start + 1)
+        self.assertEqual([s['id'] for s in data['sessions']], [first.id])
+        self.assertEqual(data['deleted'], [])
+        self.assertEqual(len(data['items']), 3)
+        self.assertEqual({item['upload_session'] for item in data['items']}, {first.id})
+
+        self.upload(SAMPLE_CSV.replace('Tank C,Tank', 'Pump D,Pump'))
+        prune_sessions(keep=1)
+        data = self.changes(start + 1, fields='equipment_name').json()
+        self.assertEqual(data['version'], start + 3)
+        self.assertEqual(data['deleted'], [first.id])
+        self.assertEqual([item['equipment_name'] for item in data['items']], ['Pump D', 'Boiler B', 'Pump A'])
+
+        # A session added and deleted within the window only shows as deleted
+        data = self.changes(start).json()
+        self.assertEqual(len(data['sessions']), 1)
+        self.assertEqual(data['deleted'], [first.id])
+        self.assertEqual(self.changes(start + 3).json()['items'], [])
+
+    def test_appends_carry_only_new_rows(self):
+        writer = TelemetryWriter('north (live)')
+        writer.write(reading_columns(READINGS))
+        writer.publish()
+        start = get_data_version()
+        for _ in range(2):
+            # Another upload's rows interleave with the live session's
+            self.upload(SAMPLE_CSV.replace('Pump A', f'Pump {start + _}'), f'{_}.csv')
+            writer.write(reading_columns(READINGS))
+            writer.publish()
+        data = self.changes(start).json()
+        self.assertEqual(data['appended'], [writer.session.id])
+        self.assertEqual(len(data['sessions']), 3)
+        live = [item for item in data['items'] if item['upload_session'] == writer.session.id]
+        self.assertEqual([item['equipment_name'] for item in live], ['Tank L2', 'Pump L1'] * 2)
+        self.assertEqual(len(data['items']), 10)
+
+        message = update_message(start + 3)
+        self.assertEqual((message['appended'], message['sessions'][0]['item_count']), ([writer.session.id], 6))
+        self.assertEqual(len(message['items']), 2)
+        # Once the session itself is in the window it is sent whole, as added
+        self.assertEqual(self.changes(start - 1).json()['appended'], [])
+        self.assertEqual(len(self.changes(start - 1).json()['items']), 12)
+
+    def test_bad_and_expired_versions(self):
+        self.assertEqual(self.changes('x').status_code, 400)
+        self.assertEqual(self.changes(5).status_code, 410)
+        for _ in range(3):
+            self.upload(SAMPLE_CSV + f"Mixer {_},Mixer,1,2,3\n")
+        trim_change_log(keep=1)
+        self.assertEqual(self.changes(1).status_code, 410)
+        self.assertEqual(self.changes(2).status_code, 200)
+        self.assertEqual(SessionChange.objects.count(), 1)
+
+
+class ReportCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(REPORT_CACHE_DIR=tmp.name))
+        self.cache_dir = tmp.name
+
+    def report_files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_report_rendered_once_per_version(self):
+        self.upload()
+        response = self.client.get('/api/report/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(self.report_files(), [f'report-v{get_data_version()}.pdf'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/report/')
+            response.close()
+
+    def test_retention_invalidates_report(self):
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Pump A', 'Pump Z'))
+        self.client.get('/api/report/').close()
+        stale = self.report_files()
+        prune_sessions(keep=1)
+        self.client.get('/api/report/').close()
+        self.assertEqual(self.report_files(), [f'report-v{get_data_version()}.pdf'])
+        self.assertNotEqual(self.report_files(), stale)
+
+    def test_chart_ticks_every_unit_on_small_axes(self):
+        small = reports._distribution_chart([{'equipment_type': 'Pump', 'count': 3}]).contents[0]
+        self.assertEqual(small.valueAxis.valueStep, 1)
+        large = reports._distribution_chart([{'equipment_type': 'Pump', 'count': 100000}]).contents[0]
+        self.assertIsNone(large.valueAxis.valueStep)
+
+    def test_equipment_listing_report(self):
+        rows = ''.join(f"Unit {i},Pump,{i}.5,1.0,20.0\n" for i in range(150))
+        self.upload("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + rows)
+        response = self.client.get('/api/report/', {'include': 'equipment'})
+        self.assertEqual(response.status_code, 200)
+        pdf = b''.join(response.streaming_content)
+        # Summary page(s) plus 150 rows at under 50 rows per listing page
+        pages = int(re.search(rb'/Count (\d+)', pdf).group(1))
+        self.assertGreaterEqual(pages, 4)
+        self.assertEqual(self.report_files(), [f'report-v{get_data_version()}-equipment.pdf'])
+        self.client.get('/api/report/').close()
+        self.assertEqual(len(self.report_files()), 2)
+
+    def test_session_report(self):
+        self.upload()
+        self.upload(SAMPLE_CSV.replace('Pump A', 'Pump Z'))
+        session = UploadSession.objects.order_by('id').first()
+        response = self.client.get('/api/report/', {'session': session.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'session-{session.id}-sample.pdf', response['Content-Disposition'])
+        response.close()
+        self.assertEqual(self.report_files(), [f'report-v{get_data_version()}-s{session.id}.pdf'])
+        self.assertEqual(self.client.get('/api/report/', {'session': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/report/', {'session': 999}).status_code, 404)
+
+    def test_render_session_report_task(self):
+        self.upload()
+        session = UploadSession.objects.get()
+        path = reports._render_session_report(session.id, self.cache_dir, True)
+        self.assertEqual(os.path.basename(path), f'session-{session.id}-sample.pdf')
+        with open(path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+        self.assertIsNone(reports._render_session_report(session.id + 1, self.cache_dir, False))
+
+    def test_ingest_schedules_warmup_after_commit(self):
+        with mock.patch.object(reports, 'get_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload()
+        executor.return_value.submit.assert_called_once_with(reports.warm_report)
+        with override_settings(REPORT_PREWARM=False), self.captureOnCommitCallbacks() as callbacks:
+            reports.prewarm_report()
+        self.assertEqual(callbacks, [])
+
+
+CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=0)
+class UpdateNotificationTests(APITestCase):
+    def test_message_carries_delta(self):
+        since = get_data_version()
+        self.upload()
+        message = update_message(since)
+        self.assertEqual(message['summary']['total_equipment'], 3)
+        self.assertEqual([s['filename'] for s in message['sessions']], ['sample.csv'])
+        self.assertEqual(len(message['items']), 3)
+        self.assertEqual((message['since'], message['version'], message['deleted']), (since, since + 1, []))
+        self.assertEqual(json.loads(encode_update(message)), json.loads(json.dumps(message)))
+
+    def test_oversized_delta_falls_back_to_refetch(self):
+        since = get_data_version()
+        self.upload()
+        with override_settings(WS_UPDATE_MAX_BYTES=200):
+            text = json.loads(encode_update(update_message(since)))
+            self.assertEqual(text, {'message': 'data_updated', 'refetch': True, 'version': since + 1, 'since': since})
+            self.assertTrue(update_message(since).get('refetch'))
+
+    async def test_socket_receives_delta(self):
+        communicator = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/')
+        self.assertTrue((await communicator.connect())[0])
+        since = await sync_to_async(get_data_version)()
+        await sync_to_async(self.upload)()
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['since'], message['version']), (since, since + 1))
+        self.assertEqual(message['summary']['total_equipment'], 3)
+        self.assertEqual(len(message['items']), 3)
+
+        await sync_to_async(prune_sessions)(keep=0)
+        await sync_to_async(notify_data_update)(since + 1)
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['sessions'], message['items']), ([], []))
+        self.assertEqual(len(message['deleted']), 1)
+        self.assertEqual(message['summary']['total_equipment'], 0)
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=0)
+class UpdateSubscriptionTests(APITestCase):
+    async def subscribe(self, filters=None):
+        communicator = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/')
+        await communicator.connect()
+        if filters is not None:
+            await communicator.send_json_to({'action': 'subscribe', 'filters': filters})
+            self.assertEqual(await communicator.receive_json_from(), {'message': 'subscribed', 'filters': filters})
+        return communicator
+
+    async def test_updates_are_routed_to_matching_topics(self):
+        everything = await self.subscribe()
+        pumps = await self.subscribe({'equipment_type': 'Pump'})
+        hot = await self.subscribe({'temperature_min': 100})
+        other_session = await self.subscribe({'session': 999})
+        await sync_to_async(self.upload)()
+
+        self.assertEqual(len((await everything.receive_json_from())['items']), 3)
+        message = await pumps.receive_json_from()
+        self.assertEqual([item['equipment_name'] for item in message['items']], ['Pump A'])
+        self.assertEqual(len(message['sessions']), 1)
+        self.assertEqual(message['summary']['total_equipment'], 3)
+        message = await hot.receive_json_from()
+        self.assertEqual([item['equipment_name'] for item in message['items']], ['Boiler B'])
+        self.assertTrue(await other_session.receive_nothing())
+
+        session_id = message['sessions'][0]['id']
+        await sync_to_async(prune_sessions)(keep=0)
+        await sync_to_async(notify_data_update)(message['version'])
+        self.assertEqual((await pumps.receive_json_from())['deleted'], [session_id])
+        self.assertTrue(await other_session.receive_nothing())
+        for communicator in (everything, pumps, hot, other_session):
+            await communicator.disconnect()
+
+    async def test_unsubscribe_and_invalid_filters(self):
+        communicator = await self.subscribe()
+        await communicator.send_json_to({'action': 'subscribe', 'filters': {'colour': 'red'}})
+        self.assertEqual((await communicator.receive_json_from())['message'], 'error')
+        await communicator.send_json_to({'action': 'subscribe', 'filters': {'pressure_max': 'high'}})
+        self.assertEqual(await communicator.receive_json_from(), {'message': 'error', 'error': 'pressure_max must be a number'})
+        await communicator.send_json_to({'action': 'unsubscribe'})
+        self.assertEqual(await communicator.receive_json_from(), {'message': 'unsubscribed'})
+        await sync_to_async(self.upload)()
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=0)
+class PackedUpdateTests(APITestCase):
+    @skipUnless(msgpack, 'msgpack not installed')
+    async def test_msgpack_subprotocol_gets_packed_columns(self):
+        packed = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/', subprotocols=[PACKED_PROTOCOL])
+        self.assertEqual(await packed.connect(), (True, PACKED_PROTOCOL))
+        plain = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/')
+        self.assertEqual(await plain.connect(), (True, None))
+        await sync_to_async(self.upload)()
+
+        message = msgpack.unpackb(await packed.receive_from())
+        columns = message['items']['columns']
+        self.assertEqual(message['items']['count'], 3)
+        self.assertEqual(np.frombuffer(columns['pressure'], '<f8').tolist(), [1.1, 8.5, 3.2])
+        self.assertEqual(columns['equipment_type']['dictionary'], ['Tank', 'Boiler', 'Pump'])
+        self.assertEqual(message['summary']['total_equipment'], 3)
+        self.assertEqual(json.loads(await plain.receive_from())['items'][0]['pressure'], 1.1)
+
+        await packed.send_to(bytes_data=msgpack.packb({'action': 'subscribe', 'filters': {'pressure_min': 5}}))
+        self.assertEqual(msgpack.unpackb(await packed.receive_from())['message'], 'subscribed')
+        await sync_to_async(self.upload)(SAMPLE_CSV.replace('Pump A', 'Pump Z'), 'other.csv')
+        columns = msgpack.unpackb(await packed.receive_from())['items']['columns']
+        self.assertEqual(np.frombuffer(columns['pressure'], '<f8').tolist(), [8.5])
+        await packed.disconnect()
+        await plain.disconnect()
+
+
+READINGS = [
+    {'equipment_name': 'Pump L1', 'equipment_type': 'Pump', 'flowrate': 40.0, 'pressure': 3.0, 'temperature': 50.0},
+    {'equipment_name': 'Tank L2', 'equipment_type': 'Tank', 'flowrate': 10.0, 'pressure': 1.0, 'temperature': 20.0},
+]
+
+
+@override_settings(TELEMETRY_BATCH_ROWS=3, TELEMETRY_FLUSH_SECONDS=0.2)
+class TelemetryTests(APITestCase):
+    def gateway(self, credentials=b'admin:password123', name='north'):
+        headers = [(b'authorization', b'Basic ' + base64.b64encode(credentials))] if credentials else []
+        return WebsocketCommunicator(TelemetryConsumer.as_asgi(), f'/ws/telemetry/?name={name}', headers=headers)
+
+    async def test_readings_are_written_in_batches(self):
+        gateway = self.gateway()
+        self.assertTrue((await gateway.connect())[0])
+        await gateway.send_json_to(READINGS[0])
+        await gateway.send_json_to({'columns': {name: [reading[name] for reading in READINGS] for name in READINGS[0]}})
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'ack', 'rows': 3, 'total': 3})
+        await gateway.send_json_to(READINGS)
+        # Below a full batch: written when the flush interval is up
+        self.assertEqual(await gateway.receive_json_from(timeout=5), {'message': 'ack', 'rows': 2, 'total': 5})
+        await gateway.disconnect()
+
+        session = await sync_to_async(UploadSession.objects.get)()
+        self.assertEqual((session.filename, session.item_count), ('north (live)', 5))
+        self.assertEqual(await sync_to_async(EquipmentItem.objects.count)(), 5)
+        summary = (await sync_to_async(self.client.get)('/api/summary/')).json()
+        self.assertEqual(summary['total_equipment'], 5)
+        self.assertEqual(summary['type_distribution'], {'Pump': 3, 'Tank': 2})
+
+    @override_settings(TELEMETRY_BATCH_ROWS=10, TELEMETRY_FLUSH_SECONDS=60, TELEMETRY_MAX_BUFFER_ROWS=4)
+    async def test_full_buffer_pauses_gateway(self):
+        gateway = self.gateway()
+        await gateway.connect()
+        await gateway.send_json_to(READINGS * 2)
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'pause', 'buffered': 4})
+        await gateway.send_json_to(READINGS)
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'rejected', 'rows': 2})
+        await gateway.disconnect()
+        self.assertEqual(await sync_to_async(EquipmentItem.objects.count)(), 4)
+
+    def test_batches_are_published_together(self):
+        writer = TelemetryWriter('north (live)')
+        writer.write(reading_columns(READINGS))
+        writer.publish()
+        version = get_data_version()
+        for _ in range(2):
+            writer.write(reading_columns(READINGS))
+        # Written, but cached responses stay valid until the publish
+        self.assertEqual(get_data_version(), version)
+        self.assertEqual(EquipmentItem.objects.count(), 6)
+
+        writer.publish()
+        self.assertEqual(get_data_version(), version + 1)
+        changes = self.client.get('/api/changes/', {'since': version}).json()
+        self.assertEqual((changes['appended'], len(changes['items'])), ([writer.session.id], 4))
+        writer.publish()
+        self.assertEqual(get_data_version(), version + 1)
+
+    @override_settings(TELEMETRY_PUBLISH_SECONDS=0.2)
+    async def test_idle_stream_is_published(self):
+        gateway = self.gateway()
+        await gateway.connect()
+        version = await sync_to_async(get_data_version)()
+        await gateway.send_json_to(READINGS * 2)
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'ack', 'rows': 4, 'total': 4})
+        # Nothing more arrives; the publish timer still fires
+        for _ in range(50):
+            if await sync_to_async(get_data_version)() > version:
+                break
+            await asyncio.sleep(0.1)
+        changes = (await sync_to_async(self.client.get)('/api/changes/', {'since': version})).json()
+        self.assertEqual(len(changes['items']), 4)
+        await gateway.disconnect()
+
+    async def test_failed_publish_is_logged(self):
+        gateway = self.gateway()
+        await gateway.connect()
+        await gateway.send_json_to(READINGS * 2)
+        await gateway.receive_json_from()
+        with mock.patch.object(TelemetryWriter, 'publish', side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('api.consumers', 'ERROR'):
+                await gateway.disconnect()
+        # The rows themselves are committed
+        self.assertEqual(await sync_to_async(EquipmentItem.objects.count)(), 4)
+
+    async def test_failed_write_is_reported_and_logged(self):
+        gateway = self.gateway()
+        await gateway.connect()
+        with mock.patch.object(TelemetryWriter, 'write', side_effect=RuntimeError('boom')):
+            with self.assertLogs('api.consumers', 'ERROR'):
+                await gateway.send_json_to(READINGS * 2)
+                self.assertEqual(await gateway.receive_json_from(), {
+                    'message': 'error', 'error': '4 readings were not written: internal error', 'rows': 4,
+                })
+        # The consumer survives and keeps writing
+        await gateway.send_json_to(READINGS * 2)
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'ack', 'rows': 4, 'total': 4})
+        await gateway.disconnect()
+
+    def test_failed_batch_leaves_no_stats_behind(self):
+        writer = TelemetryWriter('north (live)')
+        writer.write(reading_columns(READINGS))
+        with mock.patch.object(SessionStatsBuilder, 'save', side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError):
+                writer.write(reading_columns(READINGS))
+        writer.write(reading_columns(READINGS[:1]))
+        self.assertEqual(writer.total, 3)
+        stats = dict(SessionTypeStats.objects.values_list('equipment_type', 'count'))
+        self.assertEqual(stats, {'Pump': 2, 'Tank': 1})
+        sketch = QuantileSketch.from_dict(SessionTypeStats.objects.get(equipment_type='Pump').sketches['flowrate'])
+        self.assertEqual(sketch.count, 2)
+
+    async def test_rejects_bad_frames_and_anonymous_gateways(self):
+        self.assertFalse((await self.gateway(credentials=None).connect())[0])
+        self.assertFalse((await self.gateway(credentials=b'admin:wrong').connect())[0])
+        gateway = self.gateway()
+        await gateway.connect()
+        await gateway.send_json_to([{**READINGS[0], 'pressure': 'high'}])
+        self.assertEqual(await gateway.receive_json_from(), {'message': 'error', 'error': 'pressure must be numbers'})
+        await gateway.send_json_to([{'equipment_name': 'Pump L1'}])
+        self.assertEqual((await gateway.receive_json_from())['error'], 'every reading needs equipment_type')
+        self.assertTrue(await gateway.receive_nothing())
+        await gateway.disconnect()
+
+
+class UpdateCoalescerTests(APITestCase):
+    def test_burst_is_sent_once_from_oldest_version(self):
+        sent = []
+        coalescer = UpdateCoalescer(sent.append)
+        for since in (5, 3, 7):
+            coalescer.add(since, window=60)
+        self.assertTrue(coalescer.flush())
+        self.assertFalse(coalescer.flush())
+        self.assertEqual(sent, [3])
+
+        coalescer.add(8, window=60)
+        coalescer.add(None, window=60)
+        coalescer.flush()
+        self.assertEqual(sent, [3, None])
+
+    def test_window_closes_on_timer(self):
+        sent, done = [], threading.Event()
+        coalescer = UpdateCoalescer(lambda since: (sent.append(since), done.set()))
+        coalescer.add(4, window=0.01)
+        coalescer.add(2, window=0.01)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(sent, [2])
+
+    @override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=60)
+    def test_uploads_within_window_are_coalesced(self):
+        since = get_data_version()
+        with mock.patch.object(notifications.coalescer, 'send') as broadcast:
+            for name in ('a.csv', 'b.csv'):
+                self.upload(SAMPLE_CSV.replace('Pump A', name), name)
+            broadcast.assert_not_called()
+            self.assertTrue(notifications.coalescer.flush())
+        broadcast.assert_called_once_with(since)
+
+    @override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=0.1)
+    async def test_coalesced_update_reaches_sockets(self):
+        communicator = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/')
+        self.assertTrue((await communicator.connect())[0])
+        since = await sync_to_async(get_data_version)()
+        for name in ('a.csv', 'b.csv'):
+            await sync_to_async(self.upload)(SAMPLE_CSV.replace('Pump A', name), name)
+        message = await communicator.receive_json_from(timeout=5)
+        self.assertEqual((message['since'], message['version']), (since, since + 2))
+        self.assertEqual(len(message['sessions']), 2)
+        self.assertTrue(await communicator.receive_nothing(0.3))
+        await communicator.disconnect()
+
+    @override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS, WS_UPDATE_WINDOW=0)
+    async def test_update_from_a_plain_thread_reaches_sockets(self):
+        # As ingest jobs on the thread pool notify: no event loop of their own
+        communicator = WebsocketCommunicator(DataUpdateConsumer.as_asgi(), '/ws/updates/')
+        self.assertTrue((await communicator.connect())[0])
+        thread = threading.Thread(target=notify_data_update, args=(6,))
+        # Built here: the test transaction keeps other threads' connections out of the database
+        with mock.patch.object(notifications, 'topic_messages', return_value=[(UPDATE_GROUP, refetch_message(7, 6))]):
+            thread.start()
+            message = await communicator.receive_json_from(timeout=5)
+        await sync_to_async(thread.join)()
+        self.assertEqual((message['since'], message['version'], message['refetch']), (6, 7, True))
+        await communicator.disconnect()
+
+
+class VersionedCacheTests(APITestCase):
+    def test_etag_and_not_modified(self):
+        self.upload()
+        first = self.client.get('/api/summary/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+
+        with self.assertNumQueries(0):
+            hit = self.client.get('/api/summary/')
+        self.assertEqual(hit.status_code, 200)
+        self.assertEqual(hit.content, first.content)
+
+    def test_upload_and_retention_change_version(self):
+        self.upload()
+        etags = {url: self.client.get(url)['ETag'] for url in ('/api/summary/', '/api/equipment/', '/api/history/')}
+        self.upload(SAMPLE_CSV.replace('Pump A', 'Pump Z'))
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/summary/').json()['total_equipment'], 6)
+
+        version = get_data_version()
+        UploadSession.objects.create(filename='old.csv')
+        prune_sessions(keep=1)
+        self.assertGreater(get_data_version(), version)
+
+    @override_settings(DATA_VERSION_CACHE_SECONDS=1)
+    def test_version_bumped_by_another_process_expires(self):
+        self.upload()
+        etag = self.client.get('/api/summary/')['ETag']
+        # As run_ingest_worker would: the row changes, this process's cache does not
+        DataVersion.objects.filter(pk=1).update(version=F('version') + 1)
+        self.assertEqual(self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        time.sleep(1.1)
+        self.assertEqual(self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.upload()
+        self.assertNotEqual(
+            self.client.get('/api/equipment/')['ETag'],
+            self.client.get('/api/equipment/?page=1')['ETag'],
+        )
+
+    def test_query_string_is_hashed_into_the_key(self):
+        self.upload()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for query in ('search=pump d', 'search=' + 'x' * 1000):
+                self.assertEqual(self.client.get(f'/api/equipment/?{query}').status_code, 200)
+
+
+class QueryPlanTests(APITestCase):
+    def test_hot_paths_use_indexes(self):
+        self.upload()
+        out = io.StringIO()
+        call_command('explain_queries', '--check', stdout=out)
+        self.assertIn('history list', out.getvalue())
+        self.assertIn('upload_session_date_idx', out.getvalue())
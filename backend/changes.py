@@ -0,0 +1,87 @@
+"""
+Session change log for delta sync.
+
+Every data version bump records which upload sessions it added and which
+retention deleted (SessionChange rows, written by ``bump_data_version``).
+Sessions that grow after they were added (live telemetry) log the id range
+of each append instead, so deltas carry only the new rows.
+``changes_since`` folds the entries after a client's version into the
+sessions to fetch and the session ids to drop, so a client can patch its
+copy of the equipment list instead of reloading it. The log is trimmed to
+``CHANGE_LOG_MAX_ENTRIES``; clients older than what is left must reload.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import DataVersion, EquipmentItem, SessionChange
+
+
+class ChangeLogExpired(Exception):
+    """The requested version is no longer (or not yet) covered by the log."""
+
+
+def change_log_max_entries():
+    return getattr(settings, 'CHANGE_LOG_MAX_ENTRIES', 10000)
+
+
+def _version_row():
+    return DataVersion.objects.filter(pk=1).values_list('version', 'log_start').first() or (0, 0)
+
+
+def changes_since(since):
+    """
+    ``{'version', 'added', 'appended', 'deleted'}`` for the changes after
+    ``since``: ids of sessions added since then that still exist,
+    ``{session_id: (first_item, last_item)}`` spanning the rows appended
+    since then to the other existing sessions, and ids of sessions deleted
+    since then. Raises ChangeLogExpired when ``since`` is older than the log
+    or newer than the current version.
+    """
+    with transaction.atomic():
+        version, log_start = _version_row()
+        if since < log_start or since > version:
+            raise ChangeLogExpired(
+                f"version {since} is outside the change log (v{log_start} to v{version}); reload the full data"
+            )
+        entries = SessionChange.objects.filter(version__gt=since, version__lte=version).values_list(
+            'kind', 'session_id', 'first_item', 'last_item'
+        )
+        added, deleted, appended = set(), set(), {}
+        for kind, session_id, first, last in entries:
+            if kind == SessionChange.APPENDED:
+                low, high = appended.get(session_id, (first, last))
+                appended[session_id] = (min(low, first), max(high, last))
+            else:
+                (added if kind == SessionChange.ADDED else deleted).add(session_id)
+    return {
+        'version': version,
+        'added': sorted(added - deleted),
+        'appended': {pk: span for pk, span in sorted(appended.items()) if pk not in added | deleted},
+        'deleted': sorted(deleted),
+    }
+
+
+def changed_items(changes):
+    """The EquipmentItem rows a ``changes_since()`` delta carries: all of each added session, the appended ranges of the rest."""
+    rows = Q(upload_session_id__in=changes['added'])
+    for session_id, (first, last) in changes['appended'].items():
+        rows |= Q(upload_session_id=session_id, id__gte=first, id__lte=last)
+    return EquipmentItem.objects.filter(rows)
+
+
+def deleted_session_types(session_ids):
+    """``{session_id: [equipment types]}`` recorded when the given sessions were deleted."""
+    entries = SessionChange.objects.filter(kind=SessionChange.DELETED, session_id__in=session_ids)
+    return dict(entries.values_list('session_id', 'equipment_types'))
+
+
+def trim_change_log(keep=None):
+    """Drops all but roughly the newest ``keep`` entries, whole versions at a time, advancing log_start."""
+    keep = change_log_max_entries() if keep is None else keep
+    cutoff = SessionChange.objects.order_by('-version').values_list('version', flat=True)[keep:keep + 1].first()
+    if cutoff is None:
+        return 0
+    deleted, _ = SessionChange.objects.filter(version__lte=cutoff).delete()
+    DataVersion.objects.filter(pk=1, log_start__lt=cutoff).update(log_start=cutoff)
+    return deleted
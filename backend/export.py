@@ -0,0 +1,91 @@
+"""
+Streaming export of the equipment table.
+
+Rows are read with a server-side cursor (``iterator(chunk_size=...)``),
+encoded a batch at a time as NDJSON or CSV and optionally gzipped on the
+fly, so a worker holds one batch regardless of how many rows are exported.
+"""
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_chunk_rows():
+    return getattr(settings, 'EXPORT_CHUNK_ROWS', 2000)
+
+
+def batches(rows, size):
+    """Lists of up to ``size`` items from ``rows``."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(queryset, fields, chunk_size):
+    """One JSON object per line, keys in ``fields`` order."""
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    if orjson is not None:
+        dumps = orjson.dumps
+    else:
+        def dumps(obj):
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+    for batch in batches(rows, chunk_size):
+        yield b''.join(dumps(dict(zip(fields, row))) + b'\n' for row in batch)
+
+
+def csv_chunks(queryset, fields, chunk_size):
+    """A header row of ``fields`` followed by the rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    for batch in batches(rows, chunk_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def as_async(chunks):
+    """
+    Serves a sync chunk iterator under ASGI without Django buffering it:
+    each chunk is produced on the thread-sensitive executor, the thread
+    that owns this request's database connection.
+    """
+    iterator = iter(chunks)
+    done = object()
+    while True:
+        chunk = await sync_to_async(next, thread_sensitive=True)(iterator, done)
+        if chunk is done:
+            break
+        yield chunk
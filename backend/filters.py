@@ -0,0 +1,120 @@
+"""
+Query-string filters for the equipment list.
+
+``filter_equipment`` maps ``/api/equipment/`` parameters onto indexed
+lookups: ``equipment_type`` and ``session`` use the (upload_session,
+equipment_type) and equipment_type indexes, ``<metric>_min``/``<metric>_max``
+the per-metric indexes, and ``search`` is a case-insensitive prefix match on
+``equipment_name`` served by ``equipment_name_prefix_idx`` (a NOCASE index
+on SQLite, an ``UPPER(...) text_pattern_ops`` index on PostgreSQL).
+"""
+from django.db import connection
+from django.db.models import F, Func
+
+from .models import EquipmentItem
+from .stats import combined_sketches, overall_sketches
+
+METRICS = ['flowrate', 'pressure', 'temperature']
+SORTABLE_FIELDS = ['id', 'equipment_name', 'equipment_type', *METRICS]
+DEFAULT_ORDERING = '-id'
+
+# SQLite has no range statistics (no STAT4), so it reads every range filter
+# through its metric index and then sorts the matches, which is slow for
+# broad ranges. When the stored sketches estimate that the ranges keep more
+# than this share of rows, walking the requested order and stopping at the
+# page limit is cheaper, so those ranges are written as ``+column`` (SQLite's
+# documented way to keep a term off an index).
+RANGE_INDEX_MAX_SELECTIVITY = 0.01
+
+
+class _Unindexed(Func):
+    template = '+%(expressions)s'
+
+
+def _number(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+
+
+def ordering(params):
+    """Validated ``ordering`` parameter (a sortable field, optionally prefixed with '-')."""
+    value = params.get('ordering') or DEFAULT_ORDERING
+    if value.lstrip('-') not in SORTABLE_FIELDS:
+        raise ValueError(f"ordering must be one of {', '.join(SORTABLE_FIELDS)} (prefix '-' for descending)")
+    return value
+
+
+def metric_ranges(params):
+    """``{metric: (low, high)}`` for the metrics ``params`` restricts."""
+    ranges = {}
+    for metric in METRICS:
+        low, high = _number(params, f'{metric}_min'), _number(params, f'{metric}_max')
+        if low is not None or high is not None:
+            ranges[metric] = (low, high)
+    return ranges
+
+
+def unindexed_ranges(params, ranges):
+    """
+    Metrics whose range filter should not drive an index scan on SQLite.
+    Equality/prefix filters are the better access path when present;
+    otherwise only the most selective range keeps its index, and none does
+    when together they are too broad to be worth one.
+    """
+    if connection.vendor != 'sqlite' or not ranges:
+        return set()
+    if any(params.get(name) for name in ('equipment_type', 'session', 'search')):
+        return set(ranges)
+    sketches = overall_sketches(combined_sketches())
+    selectivity = {
+        metric: sketches[metric].fraction_between(low, high) if metric in sketches else 1.0
+        for metric, (low, high) in ranges.items()
+    }
+    combined = 1.0
+    for value in selectivity.values():
+        combined *= value
+    if combined > RANGE_INDEX_MAX_SELECTIVITY:
+        return set(ranges)
+    best = min(selectivity, key=selectivity.get)
+    return set(ranges) - {best}
+
+
+def filter_equipment(queryset, params, unindexed=()):
+    """
+    Applies the equipment filters in ``params``; raises ValueError on bad
+    input. Range filters on metrics in ``unindexed`` are kept off their index.
+    """
+    equipment_type = params.get('equipment_type')
+    if equipment_type:
+        queryset = queryset.filter(equipment_type=equipment_type)
+    session = params.get('session')
+    if session:
+        if not session.isdigit():
+            raise ValueError("session must be an upload session id")
+        queryset = queryset.filter(upload_session_id=int(session))
+    for metric, (low, high) in metric_ranges(params).items():
+        column = metric
+        if metric in unindexed:
+            column = f'{metric}_unindexed'
+            queryset = queryset.alias(**{column: _Unindexed(F(metric))})
+        if low is not None:
+            queryset = queryset.filter(**{f'{column}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{column}__lte': high})
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(equipment_name__istartswith=search)
+    return queryset
+
+
+def equipment_queryset(params):
+    """``EquipmentItem`` rows matching ``params``, in the requested order (ties broken by -id)."""
+    order = ordering(params)
+    fields = [order] if order.lstrip('-') == 'id' else [order, '-id']
+    unindexed = unindexed_ranges(params, metric_ranges(params))
+    return filter_equipment(EquipmentItem.objects.all(), params, unindexed).order_by(*fields)
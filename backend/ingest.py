@@ -0,0 +1,202 @@
+import csv
+import hashlib
+import io
+import os
+from contextlib import contextmanager
+from itertools import repeat
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+
+from .caching import bump_data_version
+from .changes import trim_change_log
+from .models import UploadSession, EquipmentItem
+from .parsing import chunk_columns, read_chunks
+from .stats import SessionStatsBuilder, session_types
+
+SESSIONS_TO_KEEP = 5
+# EquipmentItem columns in the order insert_columns() writes them
+INSERT_FIELDS = ['upload_session', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+# Upload bytes per row, to guess an upload's size before parsing it (a CSV
+# row is about this long; larger guesses only make index deferral rarer)
+UPLOAD_ROW_BYTES = 40
+
+
+def chunk_rows():
+    return getattr(settings, 'INGEST_CHUNK_ROWS', 50000)
+
+
+def insert_batch_size():
+    return getattr(settings, 'INGEST_BATCH_SIZE', 5000)
+
+
+def defer_indexes_min_rows():
+    return getattr(settings, 'INGEST_DEFER_INDEXES_MIN_ROWS', 200000)
+
+
+def upload_rows(*sources):
+    """Estimated rows in uploads given as paths or file objects (0 when their size is unknown)."""
+    size = 0
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            size += os.path.getsize(source)
+        else:
+            size += getattr(source, 'size', None) or 0
+    return size // UPLOAD_ROW_BYTES
+
+
+@contextmanager
+def deferred_indexes(rows):
+    """
+    On SQLite, drops EquipmentItem's secondary indexes for an insert of about
+    ``rows`` rows and rebuilds them afterwards, if ``rows`` is at least
+    ``INGEST_DEFER_INDEXES_MIN_ROWS`` and the rows already stored. Building
+    an index in one sort is several times cheaper than inserting into it row
+    by row, but it covers the whole table. Use it inside the writing
+    transaction: a failure rolls the drop back.
+    """
+    stored = UploadSession.objects.aggregate(rows=Sum('item_count'))['rows'] or 0
+    if connection.vendor != 'sqlite' or rows < max(defer_indexes_min_rows(), stored):
+        yield
+        return
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+            [EquipmentItem._meta.db_table],
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {qn(name)}")
+    yield
+    with connection.cursor() as cursor:
+        for _, sql in indexes:
+            cursor.execute(sql)
+
+
+def _copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def insert_chunk(session, df):
+    """Validates one chunk and writes it. Returns the number of rows written."""
+    return insert_columns(session, chunk_columns(df))
+
+
+def insert_columns(session, columns):
+    """
+    Writes parsed ``chunk_columns()`` output without instantiating model
+    objects: COPY on PostgreSQL, batched ``executemany`` elsewhere.
+    Returns the number of rows written.
+    """
+    rows = list(zip(repeat(session.pk), *columns))
+    if not rows:
+        return 0
+
+    opts = EquipmentItem._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name).column for name in INSERT_FIELDS]
+    table = qn(opts.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            _copy_rows(cursor, table, [qn(f) for f in fields], rows)
+        else:
+            sql = f"INSERT INTO {table} ({', '.join(qn(f) for f in fields)}) VALUES ({', '.join(['%s'] * len(fields))})"
+            batch = insert_batch_size()
+            for start in range(0, len(rows), batch):
+                cursor.executemany(sql, rows[start:start + batch])
+    return len(rows)
+
+
+def hash_upload(uploaded_file):
+    """SHA-256 of an upload, read in the upload's own chunks; rewinds the file afterwards."""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate(content_hash):
+    """Returns the stored session for identical bytes, if it is still retained."""
+    if not content_hash:
+        return None
+    return UploadSession.objects.filter(content_hash=content_hash).first()
+
+
+def upload_source(uploaded_file):
+    """The on-disk path of a large upload (lets columnar readers memory-map it), else the file itself."""
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        return uploaded_file.temporary_file_path()
+    return uploaded_file
+
+
+def ingest_file(source, filename, rows=None, progress=None, content_hash=None):
+    """
+    Streams a CSV, Parquet, Arrow or .npz upload (chosen by ``filename``) into
+    a new UploadSession chunk by chunk inside a single transaction, so peak
+    memory is bounded by the chunk size rather than the file size. A failure
+    on any chunk rolls back the whole upload. Large uploads are written with
+    ``deferred_indexes()``.
+    ``progress`` is called with the running row count after each chunk.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.create(filename=filename, item_count=0, content_hash=content_hash or None)
+        stats = SessionStatsBuilder()
+        total = 0
+        with deferred_indexes(upload_rows(source)):
+            for df in read_chunks(source, filename, rows or chunk_rows()):
+                columns = chunk_columns(df)
+                total += insert_columns(session, columns)
+                stats.add(columns)
+                if progress:
+                    progress(total)
+        stats.save(session)
+        session.item_count = total
+        session.save(update_fields=['item_count'])
+        bump_data_version(added=[session.id])
+    return session
+
+
+def ingest_unique(source, filename, content_hash, ingest=ingest_file, **kwargs):
+    """
+    Runs ``ingest(source, filename, content_hash=..., **kwargs)`` unless
+    identical bytes are already stored. Returns ``(session, created)``; an
+    upload that loses a race with an identical one resolves to the winner's
+    session.
+    """
+    session = find_duplicate(content_hash)
+    if session:
+        return session, False
+    try:
+        return ingest(source, filename, content_hash=content_hash, **kwargs), True
+    except IntegrityError:
+        session = find_duplicate(content_hash)
+        if session is None:
+            raise
+        return session, False
+
+
+def prune_sessions(keep=SESSIONS_TO_KEEP):
+    """Maintenance: keep only the last ``keep`` uploads."""
+    all_sessions = UploadSession.objects.all().order_by('-upload_date')
+    if all_sessions.count() > keep:
+        ids_to_keep = list(all_sessions.values_list('id', flat=True)[:keep])
+        with transaction.atomic():
+            stale = UploadSession.objects.exclude(id__in=ids_to_keep)
+            deleted = list(stale.values_list('id', flat=True))
+            types = session_types(deleted)
+            stale.delete()
+            bump_data_version(deleted=deleted, deleted_types=types)
+            trim_change_log()
+
@@ -0,0 +1,143 @@
+"""
+Background ingest jobs.
+
+``POST /api/upload/?async=1`` spools the upload to disk, records an IngestJob
+and returns immediately. The job then runs either on an in-process thread pool
+(``INGEST_JOB_BACKEND = 'thread'``, the default) or is left queued for the
+``run_ingest_worker`` management command (``'queue'``).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .caching import get_data_version
+from .ingest import find_duplicate, ingest_unique, prune_sessions
+from .models import IngestJob
+from .notifications import notify_data_update
+from .reports import prewarm_report
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Live row counts for jobs running in this process. The ingest transaction
+# keeps progress writes invisible to other connections until commit, so the
+# status view overlays these on the stored value.
+_progress = {}
+
+
+def job_backend():
+    return getattr(settings, 'INGEST_JOB_BACKEND', 'thread')
+
+
+def spool_dir():
+    path = getattr(settings, 'INGEST_SPOOL_DIR', None) or os.path.join(tempfile.gettempdir(), 'chemvis-ingest')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(uploaded_file):
+    """
+    Copies an upload to the spool directory so it outlives the request,
+    hashing it on the way. Returns ``(path, sha256 hex digest)``.
+    """
+    path = os.path.join(spool_dir(), f"{uuid.uuid4().hex}.upload")
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'INGEST_JOB_WORKERS', 2),
+                thread_name_prefix='ingest-job',
+            )
+        return _executor
+
+
+def submit_upload(uploaded_file):
+    """
+    Spools an upload, records a queued IngestJob and schedules it.
+    Returns ``(job, None)``, or ``(None, session)`` when identical bytes were
+    already ingested.
+    """
+    path, content_hash = spool_upload(uploaded_file)
+    duplicate = find_duplicate(content_hash)
+    if duplicate:
+        _discard(path)
+        return None, duplicate
+    job = IngestJob.objects.create(filename=uploaded_file.name, source_path=path, content_hash=content_hash)
+    if job_backend() == 'thread':
+        get_executor().submit(_run_in_thread, job.pk)
+    return job, None
+
+
+def live_rows_processed(job):
+    return _progress.get(job.pk, job.rows_processed)
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        connection.close()
+
+
+def claim_job(job_id):
+    """Moves a queued job to running; returns False if someone else got it first."""
+    return IngestJob.objects.filter(pk=job_id, state=IngestJob.QUEUED).update(state=IngestJob.RUNNING) == 1
+
+
+def run_job(job_id):
+    """Ingests, prunes and notifies for one job, recording the outcome on the job row."""
+    if not claim_job(job_id):
+        return
+    job = IngestJob.objects.get(pk=job_id)
+    _progress[job.pk] = 0
+
+    def progress(rows):
+        _progress[job.pk] = rows
+
+    created = False
+    since = get_data_version()
+    try:
+        # An identical upload may have finished while this job was queued
+        session, created = ingest_unique(job.source_path, job.filename, job.content_hash, progress=progress)
+        job.upload_session = session
+        job.rows_processed = session.item_count
+        job.state = IngestJob.SUCCEEDED
+    except Exception as e:
+        job.rows_processed = 0
+        job.error = str(e)
+        job.state = IngestJob.FAILED
+    finally:
+        _progress.pop(job.pk, None)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['upload_session', 'rows_processed', 'error', 'state', 'finished_at'])
+        _discard(job.source_path)
+
+    if created:
+        prune_sessions()
+        notify_data_update(since)
+        prewarm_report()
+    return job
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
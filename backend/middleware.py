@@ -0,0 +1,113 @@
+"""
+Negotiated response compression (zstd, brotli, gzip).
+
+The best encoding the client accepts and the server has a codec for is
+applied to compressible bodies. Versioned responses (those with an ETag)
+have their compressed bytes cached per ETag and encoding, so a cache hit on
+/api/equipment/ is not recompressed on every request. Like Django's
+GZipMiddleware, the ETag is weakened because the bytes now differ from the
+identity representation.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional codec
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def _codecs():
+    """Available encoders, most preferred first."""
+    codecs = []
+    if zstandard is not None:
+        codecs.append(('zstd', lambda data: zstandard.ZstdCompressor(level=3).compress(data)))
+    if brotli is not None:
+        codecs.append(('br', lambda data: brotli.compress(data, quality=5)))
+    codecs.append(('gzip', lambda data: gzip.compress(data, compresslevel=6, mtime=0)))
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, codings=None):
+    """The preferred available coding (of ``codings``, if given) the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    candidates = [
+        (accepted.get(name, wildcard), -i, name) for i, (name, _) in enumerate(CODECS)
+        if codings is None or name in codings
+    ]
+    if not candidates:
+        return None
+    q, _, name = max(candidates)
+    return name if q > 0 else None
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming or response.status_code != 200 or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_BYTES', 1024):
+            return response
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        etag = response.get('ETag')
+        key = None
+        if etag:
+            key = f'chemvis:compressed:{encoding}:{hashlib.sha1(etag.encode()).hexdigest()}'
+            body = cache.get(key)
+        if key is None or body is None:
+            body = dict(CODECS)[encoding](response.content)
+            if key is not None and len(body) <= getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', 8 * 2**20):
+                cache.set(key, body)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        return response
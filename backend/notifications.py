@@ -0,0 +1,393 @@
+"""
+Real-time update broadcasts to connected dashboards (DataUpdateConsumer).
+
+A ``data_update`` message carries the delta since the version the writer
+started from: the new summary, the added sessions with their rows, the
+sessions appended to (listed in ``appended``) with only their new rows, and
+the deleted session ids, in the same shape as ``/api/changes/``. Clients at or
+after ``since`` patch their state with no HTTP request. A delta encoding to
+more than ``WS_UPDATE_MAX_BYTES`` is replaced by a plain refetch signal.
+Each message is encoded once here and sent to every socket of its group as is.
+
+Sockets see everything unless they subscribe with filters (the
+``/api/equipment/`` ones: ``equipment_type``, ``session``,
+``<metric>_min``/``<metric>_max``). A subscription to a session or a type
+joins that topic's group, and each update is sent only to the groups of
+the sessions and types it touches, with the part of the delta they hold.
+Metric ranges, and a type within a session, are applied by the consumer
+to the messages its group receives.
+
+Clients that open the socket with the ``chemvis.msgpack`` subprotocol get
+MessagePack binary frames instead of JSON text: the same messages, with
+``items`` in the column layout of ``/api/equipment/?layout=columns`` and
+each metric column packed as little-endian float64 bytes.
+
+Updates are coalesced: the first one notified opens a ``WS_UPDATE_WINDOW``
+second window, and a single message with the delta since the oldest
+pending version is sent when it closes, so a burst of uploads costs each
+client one update. Coalescing is per process; with the Redis channel layer
+each worker sends at most one message per window.
+
+Sends happen on the event loop the consumers run on (recorded by
+``bind_loop()`` when a socket connects), and so does the window's timer:
+InMemoryChannelLayer only wakes receivers for sends made on their own
+loop, and writers notify from request threads, ingest job threads and
+telemetry flushes. A process with no consumers (``run_ingest_worker``)
+falls back to a thread timer and a loop of its own, which reaches the
+sockets only through a shared layer such as Redis.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from collections import defaultdict
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection
+
+from .caching import get_data_version
+from .changes import ChangeLogExpired, changed_items, changes_since, deleted_session_types
+from .filters import METRICS, metric_ranges
+from .models import SessionTypeStats, UploadSession
+from .renderers import FastJSONRenderer
+from .serializers import COLUMN_DICTIONARY_FIELDS, EquipmentItemSerializer, UploadSessionSerializer, ValuesSerializer
+from .stats import combined_stats, summary_data
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary protocol
+    msgpack = None
+
+UPDATE_GROUP = 'equipment_updates'
+# Joined by every socket in a topic group, for refetch signals
+FILTERED_GROUP = f'{UPDATE_GROUP}.filtered'
+RANGE_FILTERS = [f'{metric}_{bound}' for metric in METRICS for bound in ('min', 'max')]
+PACKED_PROTOCOL = 'chemvis.msgpack'
+# Lower bound of an item's encoded size, to skip building deltas that cannot fit
+MIN_ITEM_BYTES = 80
+
+
+def update_max_bytes():
+    return getattr(settings, 'WS_UPDATE_MAX_BYTES', 256 * 1024)
+
+
+def update_window():
+    return getattr(settings, 'WS_UPDATE_WINDOW', 1.0)
+
+
+def refetch_message(version=None, since=None):
+    return {
+        'message': 'data_updated', 'refetch': True,
+        'version': get_data_version() if version is None else version, 'since': since,
+    }
+
+
+def type_group(equipment_type):
+    # Group names allow only ASCII letters, digits, '-', '_' and '.'
+    return f"{UPDATE_GROUP}.type.{hashlib.sha1(equipment_type.encode()).hexdigest()[:16]}"
+
+
+def session_group(session_id):
+    return f'{UPDATE_GROUP}.session.{session_id}'
+
+
+def subscription_filters(data):
+    """Validated filters of a subscribe message; raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(data) - {'equipment_type', 'session', *RANGE_FILTERS}
+    if unknown:
+        raise ValueError(f"unknown filters: {', '.join(sorted(unknown))}")
+    filters = {}
+    if data.get('equipment_type') not in (None, ''):
+        filters['equipment_type'] = str(data['equipment_type'])
+    if data.get('session') not in (None, ''):
+        try:
+            filters['session'] = int(data['session'])
+        except (TypeError, ValueError):
+            raise ValueError("session must be an integer") from None
+    for metric, (low, high) in metric_ranges(data).items():
+        for bound, value in (('min', low), ('max', high)):
+            if value is not None:
+                filters[f'{metric}_{bound}'] = value
+    return filters
+
+
+def subscription_groups(filters):
+    """
+    ``(groups, residual)``: the groups a socket with ``filters`` joins, and
+    the filters its consumer still applies to what those groups receive.
+    """
+    residual = dict(filters)
+    if 'session' in residual:
+        return [session_group(residual.pop('session')), FILTERED_GROUP], residual
+    if 'equipment_type' in residual:
+        return [type_group(residual.pop('equipment_type')), FILTERED_GROUP], residual
+    return [UPDATE_GROUP], residual
+
+
+def _matches(item, filters):
+    for name, value in filters.items():
+        if name == 'equipment_type':
+            if item.get('equipment_type') != value:
+                return False
+        else:
+            metric, bound = name.rsplit('_', 1)
+            if metric not in item or (item[metric] < value if bound == 'min' else item[metric] > value):
+                return False
+    return True
+
+
+def filter_update(text, filters):
+    """The data_update message encoded in ``text``, with only the items matching ``filters``."""
+    message = json.loads(text)
+    if 'items' in message:
+        message['items'] = [item for item in message['items'] if _matches(item, filters)]
+    return message
+
+
+def _delta_message(since, version, summary, sessions, items, deleted, rows, appended=()):
+    # Skip building deltas that cannot fit
+    if rows * MIN_ITEM_BYTES > update_max_bytes():
+        return refetch_message(version, since)
+    session_values = ValuesSerializer(UploadSessionSerializer)
+    item_values = ValuesSerializer(EquipmentItemSerializer)
+    return {
+        'message': 'data_updated',
+        'version': version,
+        'since': since,
+        'summary': summary,
+        'sessions': session_values.data(session_values.values(sessions.order_by('-upload_date'))),
+        'appended': sorted(appended),
+        'deleted': deleted,
+        'items': item_values.data(item_values.values(items.order_by('-id'))),
+    }
+
+
+def _changed_sessions(changes):
+    """``(sessions, rows)``: the added and appended sessions, and ``{session_id: upper bound of its rows in the delta}``."""
+    sessions = UploadSession.objects.filter(id__in=[*changes['added'], *changes['appended']])
+    rows = dict(sessions.values_list('id', 'item_count'))
+    for session_id, (first, last) in changes['appended'].items():
+        rows[session_id] = min(rows.get(session_id, 0), last - first + 1)
+    return sessions, rows
+
+
+def _whole_delta(since, changes, summary):
+    sessions, rows = _changed_sessions(changes)
+    return _delta_message(
+        since, changes['version'], summary, sessions, changed_items(changes),
+        changes['deleted'], sum(rows.values()), changes['appended'],
+    )
+
+
+def update_message(since):
+    """The ``data_update`` message for every change after data version ``since``."""
+    try:
+        changes = changes_since(since)
+    except ChangeLogExpired:
+        return refetch_message(since=since)
+    return _whole_delta(since, changes, summary_data(*combined_stats()))
+
+
+def topic_messages(since):
+    """
+    ``(group, message)`` pairs for the changes after ``since``: the whole
+    delta for unfiltered sockets, and for each session and equipment type
+    it touches, the part of it that topic's subscribers hold.
+    """
+    if since is None:
+        message = refetch_message()
+        return [(UPDATE_GROUP, message), (FILTERED_GROUP, message)]
+    try:
+        changes = changes_since(since)
+    except ChangeLogExpired:
+        message = refetch_message(since=since)
+        return [(UPDATE_GROUP, message), (FILTERED_GROUP, message)]
+    summary = summary_data(*combined_stats())
+    version, appended, deleted = changes['version'], changes['appended'], changes['deleted']
+    sessions, session_rows = _changed_sessions(changes)
+    items = changed_items(changes)
+    messages = [(UPDATE_GROUP, _whole_delta(since, changes, summary))]
+
+    for session_id, rows in session_rows.items():
+        messages.append((session_group(session_id), _delta_message(
+            since, version, summary, sessions.filter(id=session_id),
+            items.filter(upload_session_id=session_id), [], rows, appended.keys() & {session_id},
+        )))
+    for session_id in deleted:
+        messages.append((session_group(session_id), _delta_message(
+            since, version, summary, sessions.none(), items.none(), [session_id], 0,
+        )))
+
+    type_rows = defaultdict(dict)
+    stats = SessionTypeStats.objects.filter(upload_session_id__in=session_rows)
+    for session_id, equipment_type, rows in stats.values_list('upload_session_id', 'equipment_type', 'count'):
+        type_rows[equipment_type][session_id] = min(rows, session_rows[session_id])
+    type_deleted = defaultdict(list)
+    for session_id, types in deleted_session_types(deleted).items():
+        for equipment_type in types:
+            type_deleted[equipment_type].append(session_id)
+    for equipment_type in sorted(type_rows.keys() | type_deleted.keys()):
+        rows = type_rows.get(equipment_type, {})
+        messages.append((type_group(equipment_type), _delta_message(
+            since, version, summary, sessions.filter(id__in=rows),
+            items.filter(upload_session_id__in=rows, equipment_type=equipment_type),
+            sorted(type_deleted.get(equipment_type, [])), sum(rows.values()), appended.keys() & rows.keys(),
+        )))
+    return messages
+
+
+def _within_cap(message):
+    """``(message, text)``: ``message`` and its JSON text, or its refetch fallback when over the size cap."""
+    text = FastJSONRenderer().render(message).decode()
+    if len(text) > update_max_bytes():
+        message = refetch_message(message['version'], message['since'])
+        text = json.dumps(message)
+    return message, text
+
+
+def encode_update(message):
+    """JSON text of ``message``, or of its refetch fallback when over the size cap."""
+    return _within_cap(message)[1]
+
+
+def pack_update(message):
+    """MessagePack frame of ``message``, with ``items`` as columns and packed float64 metrics."""
+    if 'items' in message:
+        columns = ValuesSerializer(EquipmentItemSerializer).columns(message['items'], COLUMN_DICTIONARY_FIELDS)
+        for metric in METRICS:
+            columns[metric] = np.asarray(columns[metric], dtype='<f8').tobytes()
+        message = {**message, 'items': {'count': len(message['items']), 'columns': columns}}
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def update_event(message):
+    """The channel layer event for ``message``: its JSON text and, with msgpack installed, its binary frame."""
+    message, text = _within_cap(message)
+    event = {'type': 'data_update', 'text': text}
+    if msgpack is not None:
+        event['bytes'] = pack_update(message)
+    return event
+
+
+# The event loop this process's consumers run on, once one has connected
+_consumer_loop = None
+
+
+def bind_loop(loop):
+    """Records ``loop`` as the one consumers run on; updates are sent from it."""
+    global _consumer_loop
+    _consumer_loop = loop
+
+
+def consumer_loop():
+    """The bound consumer loop while it runs, else None."""
+    loop = _consumer_loop
+    return loop if loop is not None and loop.is_running() else None
+
+
+async def _group_send_all(channel_layer, events):
+    for group, event in events:
+        await channel_layer.group_send(group, event)
+
+
+def broadcast_update(since=None):
+    """Sends the ``data_update`` messages for the changes after ``since`` to the subscribed dashboards now."""
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    events = [(group, update_event(message)) for group, message in topic_messages(since)]
+    loop = consumer_loop()
+    if loop is None:
+        async_to_sync(_group_send_all)(channel_layer, events)
+    else:
+        # Called from a thread: hand the sends to the consumers' loop and wait for them
+        asyncio.run_coroutine_threadsafe(_group_send_all(channel_layer, events), loop).result()
+
+
+class UpdateCoalescer:
+    """
+    Merges the updates notified within ``window`` seconds of the first one
+    into one ``send(since)`` call with the oldest pending version (None if
+    any of them had no version, meaning refetch).
+    """
+
+    def __init__(self, send=None):
+        self.send = send or broadcast_update
+        self._lock = threading.Lock()
+        self._timer = None
+        self._since = None
+        self._refetch = False
+
+    def add(self, since, window):
+        with self._lock:
+            if since is None:
+                self._refetch = True
+            elif self._since is None or since < self._since:
+                self._since = since
+            if self._timer is None:
+                self._timer = self._start_timer(window)
+
+    def _start_timer(self, window):
+        """Closes the window in ``window`` seconds, on the consumer loop when there is one."""
+        loop = consumer_loop()
+        if loop is not None:
+            return asyncio.run_coroutine_threadsafe(self._flush_later(window), loop)
+        timer = threading.Timer(window, self._flush_on_timer)
+        timer.start()
+        return timer
+
+    def _take(self):
+        """``(timer, since)`` of the open window, closing it; timer is None if none was open."""
+        with self._lock:
+            timer, since = self._timer, None if self._refetch else self._since
+            self._timer, self._since, self._refetch = None, None, False
+        return timer, since
+
+    def _send_pending(self):
+        timer, since = self._take()
+        if timer is not None:
+            self.send(since)
+
+    def flush(self):
+        """Sends what is pending now; returns whether anything was."""
+        timer, since = self._take()
+        if timer is None:
+            return False
+        timer.cancel()
+        self.send(since)
+        return True
+
+    async def _flush_later(self, window):
+        await asyncio.sleep(window)
+        # The delta is built with the ORM, on the thread the consumers use for it
+        await database_sync_to_async(self._send_pending)()
+
+    def _flush_on_timer(self):
+        try:
+            self._send_pending()
+        finally:
+            connection.close()
+
+
+coalescer = UpdateCoalescer()
+
+
+def notify_data_update(since=None):
+    """
+    Tells every connected dashboard that the equipment data changed, with
+    the delta since data version ``since`` (a plain refetch signal without
+    it), coalesced with the other updates of the current window.
+    """
+    if get_channel_layer() is None:
+        return
+    window = update_window()
+    if window > 0:
+        coalescer.add(since, window)
+    else:
+        broadcast_update(since)
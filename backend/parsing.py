@@ -0,0 +1,140 @@
+"""
+File parsing for uploads: CSV, Parquet, Arrow IPC and NumPy ``.npz``.
+Deliberately free of Django imports so the functions here can run in a
+spawned process pool without settings.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+DEFAULT_CHUNK_ROWS = 50000
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+NPZ_EXTENSIONS = ('.npz',)
+SUPPORTED_EXTENSIONS = ('.csv',) + PARQUET_EXTENSIONS + ARROW_EXTENSIONS + NPZ_EXTENSIONS
+
+
+class IngestError(ValueError):
+    """Raised when an uploaded file cannot be ingested (bad header, bad values)."""
+
+
+def _check_columns(columns):
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise IngestError(f"Missing required columns. Needed: {REQUIRED_COLUMNS}")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise IngestError("Parquet and Arrow uploads require the pyarrow package")
+    return pyarrow
+
+
+def file_format(name):
+    ext = os.path.splitext(str(name))[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if ext in ARROW_EXTENSIONS:
+        return 'arrow'
+    if ext in NPZ_EXTENSIONS:
+        return 'npz'
+    return 'csv'
+
+
+def read_chunks(source, name, rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yields DataFrames of at most ``rows`` rows holding REQUIRED_COLUMNS, for
+    any supported format. ``source`` is a path or a binary file object and
+    ``name`` (the upload's filename) picks the reader. Columnar formats are
+    read column-by-column without a text round trip, memory-mapped when
+    ``source`` is a path.
+    """
+    fmt = file_format(name)
+    if fmt == 'parquet':
+        return read_parquet_chunks(source, rows)
+    if fmt == 'arrow':
+        return read_arrow_chunks(source, rows)
+    if fmt == 'npz':
+        return read_npz_chunks(source, rows)
+    return read_csv_chunks(source, rows)
+
+
+def read_parquet_chunks(source, rows=DEFAULT_CHUNK_ROWS):
+    pa = _pyarrow()
+    with pa.parquet.ParquetFile(source, memory_map=isinstance(source, (str, os.PathLike))) as parquet:
+        _check_columns(parquet.schema_arrow.names)
+        for batch in parquet.iter_batches(batch_size=rows, columns=REQUIRED_COLUMNS):
+            yield batch.to_pandas()
+
+
+def read_arrow_chunks(source, rows=DEFAULT_CHUNK_ROWS):
+    """Arrow IPC file format (Feather v2) or, failing that, the streaming format."""
+    pa = _pyarrow()
+    stream = pa.memory_map(os.fspath(source)) if isinstance(source, (str, os.PathLike)) else pa.PythonFile(source, mode='r')
+    with stream:
+        try:
+            reader = pa.ipc.open_file(stream)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            stream.seek(0)
+            reader = pa.ipc.open_stream(stream)
+            batches = iter(reader)
+        _check_columns(reader.schema.names)
+        for batch in batches:
+            batch = batch.select(REQUIRED_COLUMNS)
+            for offset in range(0, batch.num_rows, rows):
+                yield batch.slice(offset, rows).to_pandas()
+
+
+def read_npz_chunks(source, rows=DEFAULT_CHUNK_ROWS):
+    """A NumPy ``.npz`` with one array per required column (string arrays, no pickles)."""
+    with np.load(source, allow_pickle=False) as archive:
+        _check_columns(archive.files)
+        arrays = {col: archive[col] for col in REQUIRED_COLUMNS}
+        length = len(arrays[REQUIRED_COLUMNS[0]])
+        if any(len(a) != length for a in arrays.values()):
+            raise IngestError("All columns in an .npz upload must have the same length")
+        for offset in range(0, length, rows):
+            yield pd.DataFrame({col: a[offset:offset + rows] for col, a in arrays.items()}, columns=REQUIRED_COLUMNS)
+
+
+def read_csv_chunks(source, rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yields DataFrames of at most ``rows`` rows from a CSV file object or path.
+    The header is validated on the first chunk so a bad file fails before
+    anything is written.
+    """
+    reader = pd.read_csv(source, chunksize=rows)
+    with reader:
+        for i, df in enumerate(reader):
+            if i == 0:
+                _check_columns(df.columns)
+            yield df[REQUIRED_COLUMNS]
+
+
+def chunk_columns(df):
+    """
+    Casts a chunk column-wise in one pass per column and returns
+    ``(names, types, flowrate, pressure, temperature)`` as Python lists.
+    Non-numeric metric values raise ValueError just like ``float()`` did.
+    """
+    names = df['Equipment Name'].astype(str).tolist()
+    types = df['Type'].astype(str).tolist()
+    metrics = [df[col].to_numpy(dtype=np.float64).tolist() for col in REQUIRED_COLUMNS[2:]]
+    return [names, types, *metrics]
+
+
+def parse_file(path, rows=DEFAULT_CHUNK_ROWS):
+    """Parses a whole file into insert-ready columns (process pool entry point)."""
+    columns = [[] for _ in REQUIRED_COLUMNS]
+    for df in read_chunks(path, path, rows):
+        for column, values in zip(columns, chunk_columns(df)):
+            column.extend(values)
+    return columns
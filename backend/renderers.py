@@ -0,0 +1,75 @@
+"""
+JSON rendering for the bulk read endpoints.
+
+FastJSONRenderer encodes with orjson when it is installed and falls back to
+DRF's JSONRenderer otherwise. Output is byte-for-byte what JSONRenderer
+produces (compact separators, UTF-8, U+2028/U+2029 escaped): orjson only
+formats floats differently when they need an exponent, so any output that
+might contain one is re-rendered with the standard encoder. The one
+difference: non-finite floats, which JSONRenderer refuses, become null.
+"""
+import csv
+import io
+import json
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# orjson writes 1e16 / 0.00001 where json writes 1e+16 / 1e-05. Strings that
+# merely look like this only cost a fallback. (A literal-led pattern plus a
+# plain substring test keeps the scan cheap on multi-megabyte bodies.)
+_EXPONENT = re.compile(rb'e[-\d]')
+_SMALL_DECIMAL = b'0.0000'
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _SMALL_DECIMAL in ret or _EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping JSONRenderer applies for embedding in <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Negotiates ``application/x-ndjson`` (or ``?format=ndjson``) for the
+    export endpoint, which streams rows itself; only small bodies such as
+    errors are rendered here, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """``text/csv`` counterpart of NDJSONRenderer; a dict body becomes a header and one row."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue().encode()
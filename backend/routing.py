@@ -5,4 +5,5 @@ from . import consumers
 websocket_urlpatterns = [
     # Fixed: Changed from .as_remote_wrapper() to .as_asgi()
     re_path(r'ws/updates/$', consumers.DataUpdateConsumer.as_asgi()),
+    re_path(r'ws/telemetry/$', consumers.TelemetryConsumer.as_asgi()),
 ]
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,4 +131,67 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-}
\ No newline at end of file
+}
+
+# Upload ingest: rows parsed per chunk and rows per INSERT batch
+INGEST_CHUNK_ROWS = 50000
+INGEST_BATCH_SIZE = 5000
+# SQLite: uploads of at least this many rows (guessed from their size) and of
+# the rows already stored drop the equipment indexes and rebuild them afterwards
+INGEST_DEFER_INDEXES_MIN_ROWS = 200000
+
+# Background ingest jobs (POST /api/upload/?async=1): 'thread' runs them on an
+# in-process pool, 'queue' leaves them for `manage.py run_ingest_worker`. The
+# worker is another process: without a shared cache the server sees its uploads
+# once the cached data version expires (DATA_VERSION_CACHE_SECONDS)
+INGEST_JOB_BACKEND = 'thread'
+INGEST_JOB_WORKERS = 2
+INGEST_SPOOL_DIR = None
+
+# Processes used to parse batch uploads (None: one per CPU core)
+INGEST_PARSE_WORKERS = None
+
+# Response cache for the read endpoints (keyed on the data version). Use a
+# shared backend such as Redis when running more than one server process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Seconds the data version is cached. A per-process cache (LocMemCache) picks up
+# versions bumped by other processes (run_ingest_worker, load_sample_data) only
+# when it expires, so keep this short unless the cache is shared
+DATA_VERSION_CACHE_SECONDS = 1
+
+# /api/equipment/?cursor=...&page_size=N (keyset pagination, opt-in)
+EQUIPMENT_PAGE_SIZE = 100
+EQUIPMENT_MAX_PAGE_SIZE = 1000
+
+# /api/export/: rows fetched per server-side cursor round trip and per streamed chunk
+EXPORT_CHUNK_ROWS = 2000
+
+# Responses smaller than this are sent uncompressed (zstd/br/gzip negotiated per request)
+COMPRESSION_MIN_BYTES = 1024
+
+# /api/changes/: session change log entries kept; clients further behind reload
+CHANGE_LOG_MAX_ENTRIES = 10000
+
+# /api/report/: rendered PDFs cached per data version (None: a temp directory),
+# re-rendered in the background after each ingest
+REPORT_CACHE_DIR = None
+REPORT_PREWARM = True
+
+# WebSocket data_update messages carry the delta up to this size, else a refetch signal
+WS_UPDATE_MAX_BYTES = 256 * 1024
+# Updates within this many seconds of the first are sent as one message (0: send each)
+WS_UPDATE_WINDOW = 1.0
+
+# ws/telemetry/: readings per write (or after this many seconds), and readings
+# buffered before gateways are told to pause
+TELEMETRY_BATCH_ROWS = 20000
+TELEMETRY_FLUSH_SECONDS = 0.5
+TELEMETRY_MAX_BUFFER_ROWS = 100000
+# Written batches are published (data version bumped, caches invalidated,
+# dashboards notified) at most this often and when the stream closes
+TELEMETRY_PUBLISH_SECONDS = 2.0
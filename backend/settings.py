@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.common.CommonMiddleware',
 ]
@@ -113,8 +114,79 @@ CORS_ALLOWED_ORIGINS = [origin.strip() for origin in cors_origins.split(',')]
 CORS_ALLOW_CREDENTIALS = True
 CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS
 
-# Channels Configuration
+# Upload ingest: rows parsed per chunk and rows per INSERT batch
+INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', '50000'))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '5000'))
+# SQLite: uploads of at least this many rows (guessed from their size) and of
+# the rows already stored drop the equipment indexes and rebuild them afterwards
+INGEST_DEFER_INDEXES_MIN_ROWS = int(os.getenv('INGEST_DEFER_INDEXES_MIN_ROWS', '200000'))
+
+# Background ingest jobs (POST /upload/?async=1): 'thread' runs them on an
+# in-process pool, 'queue' leaves them for `manage.py run_ingest_worker`. The
+# worker is another process: without a shared cache the server sees its uploads
+# once the cached data version expires (DATA_VERSION_CACHE_SECONDS)
+INGEST_JOB_BACKEND = os.getenv('INGEST_JOB_BACKEND', 'thread')
+INGEST_JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', '2'))
+INGEST_SPOOL_DIR = os.getenv('INGEST_SPOOL_DIR')
+
+# Processes used to parse batch uploads (unset: one per CPU core)
+INGEST_PARSE_WORKERS = int(os.getenv('INGEST_PARSE_WORKERS', '0')) or None
+
+# Response cache for the read endpoints (keyed on the data version). With
+# more than one server process the cache must be shared, e.g. Redis.
 redis_url = os.getenv('REDIS_URL')
+if redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+# Seconds the data version is cached. A per-process cache (LocMemCache) picks up
+# versions bumped by other processes (run_ingest_worker, load_sample_data) only
+# when it expires, so keep this short unless the cache is shared
+DATA_VERSION_CACHE_SECONDS = int(os.getenv('DATA_VERSION_CACHE_SECONDS', '1'))
+
+# /api/equipment/?cursor=...&page_size=N (keyset pagination, opt-in)
+EQUIPMENT_PAGE_SIZE = int(os.getenv('EQUIPMENT_PAGE_SIZE', '100'))
+EQUIPMENT_MAX_PAGE_SIZE = int(os.getenv('EQUIPMENT_MAX_PAGE_SIZE', '1000'))
+
+# /api/export/: rows fetched per server-side cursor round trip and per streamed chunk
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '2000'))
+
+# Responses smaller than this are sent uncompressed (zstd/br/gzip negotiated per request)
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+
+# /api/changes/: session change log entries kept; clients further behind reload
+CHANGE_LOG_MAX_ENTRIES = int(os.getenv('CHANGE_LOG_MAX_ENTRIES', '10000'))
+
+# /api/report/: rendered PDFs cached per data version (None: a temp directory),
+# re-rendered in the background after each ingest
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR') or None
+REPORT_PREWARM = os.getenv('REPORT_PREWARM', 'True') == 'True'
+
+# WebSocket data_update messages carry the delta up to this size, else a refetch signal
+WS_UPDATE_MAX_BYTES = int(os.getenv('WS_UPDATE_MAX_BYTES', 256 * 1024))
+# Updates within this many seconds of the first are sent as one message (0: send each)
+WS_UPDATE_WINDOW = float(os.getenv('WS_UPDATE_WINDOW', 1.0))
+
+# ws/telemetry/: readings per write (or after this many seconds), and readings
+# buffered before gateways are told to pause
+TELEMETRY_BATCH_ROWS = int(os.getenv('TELEMETRY_BATCH_ROWS', '20000'))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv('TELEMETRY_FLUSH_SECONDS', '0.5'))
+TELEMETRY_MAX_BUFFER_ROWS = int(os.getenv('TELEMETRY_MAX_BUFFER_ROWS', '100000'))
+# Written batches are published (data version bumped, caches invalidated,
+# dashboards notified) at most this often and when the stream closes
+TELEMETRY_PUBLISH_SECONDS = float(os.getenv('TELEMETRY_PUBLISH_SECONDS', '2'))
+
+# Channels Configuration
 if redis_url and not DEBUG:
     CHANNEL_LAYERS = {
         'default': {
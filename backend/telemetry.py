@@ -0,0 +1,178 @@
+"""
+Live telemetry ingest (TelemetryConsumer on ``ws/telemetry/``).
+
+Gateways stream equipment readings; each connection's readings go to one
+UploadSession. They are buffered in memory and written in micro-batches,
+when ``TELEMETRY_BATCH_ROWS`` are buffered or ``TELEMETRY_FLUSH_SECONDS``
+after the first unwritten reading, through the same column insert and
+SessionStatsBuilder as file uploads, one transaction per batch. The data
+version is bumped, invalidating the response and report caches, once per
+``TELEMETRY_PUBLISH_SECONDS`` for all batches written meanwhile, and when
+the stream closes; dashboards then get the rows appended through the
+coalesced ``data_update`` broadcast. Once ``TELEMETRY_MAX_BUFFER_ROWS``
+are waiting the consumer tells the gateway to pause and rejects readings
+until the buffer has drained to half of that.
+"""
+import copy
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .caching import bump_data_version, get_data_version
+from .ingest import insert_columns, prune_sessions
+from .models import EquipmentItem, SessionTypeStats, UploadSession
+from .notifications import notify_data_update
+from .stats import SessionStatsBuilder
+
+READING_FIELDS = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+
+
+def batch_rows():
+    return getattr(settings, 'TELEMETRY_BATCH_ROWS', 20000)
+
+
+def flush_seconds():
+    return getattr(settings, 'TELEMETRY_FLUSH_SECONDS', 0.5)
+
+
+def max_buffer_rows():
+    return getattr(settings, 'TELEMETRY_MAX_BUFFER_ROWS', 100000)
+
+
+def publish_seconds():
+    return getattr(settings, 'TELEMETRY_PUBLISH_SECONDS', 2.0)
+
+
+def _metric(name, values):
+    if isinstance(values, bytes):
+        # Packed little-endian float64, as in MessagePack update frames
+        values = np.frombuffer(values, '<f8')
+    try:
+        values = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be numbers") from None
+    if values.ndim != 1 or not np.isfinite(values).all():
+        raise ValueError(f"{name} must be finite numbers")
+    return values.tolist()
+
+
+def reading_columns(data):
+    """
+    ``(names, types, flowrate, pressure, temperature)`` lists, the
+    ``chunk_columns()`` layout, from a frame holding one reading, a list of
+    readings or ``{"columns": {field: [value per reading]}}``. Raises
+    ValueError on a malformed frame.
+    """
+    if isinstance(data, dict) and 'columns' in data:
+        columns = data['columns']
+        if not isinstance(columns, dict):
+            raise ValueError("columns must be an object")
+    else:
+        readings = data if isinstance(data, list) else [data]
+        if not all(isinstance(reading, dict) for reading in readings):
+            raise ValueError("readings must be objects")
+        try:
+            columns = {name: [reading[name] for reading in readings] for name in READING_FIELDS}
+        except KeyError as e:
+            raise ValueError(f"every reading needs {e.args[0]}") from None
+    missing = [name for name in READING_FIELDS if name not in columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+
+    names, types = (columns[name] for name in READING_FIELDS[:2])
+    if not isinstance(names, list) or not isinstance(types, list):
+        raise ValueError("equipment_name and equipment_type must be lists")
+    if not all(isinstance(value, str) and value for value in names + types):
+        raise ValueError("equipment_name and equipment_type must be non-empty strings")
+    metrics = [_metric(name, columns[name]) for name in READING_FIELDS[2:]]
+    if any(len(values) != len(names) for values in [types, *metrics]):
+        raise ValueError("columns must have the same length")
+    return [names, types, *metrics]
+
+
+class TelemetryBuffer:
+    """Readings received but not yet handed to a writer, as ``reading_columns()`` lists."""
+
+    def __init__(self):
+        self.columns = [[] for _ in READING_FIELDS]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def extend(self, columns):
+        for column, values in zip(self.columns, columns):
+            column.extend(values)
+
+    def take(self):
+        """Removes and returns every buffered reading."""
+        taken, self.columns = self.columns, [[] for _ in READING_FIELDS]
+        return taken
+
+
+class TelemetryWriter:
+    """
+    Writes one stream's micro-batches into its UploadSession (a new one if
+    retention removed it), each committed as it comes. ``publish()`` then
+    bumps the data version once for everything written since the last
+    publish: the first adds the session to the change log, later ones log
+    the id range appended, so deltas carry only the new rows.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.session = None
+        self.stats = None
+        self.total = 0
+        # Not yet published: whether the session itself is new, and the
+        # (first_item, last_item) id range written to it since
+        self.added = False
+        self.appended = None
+        self.published_at = time.monotonic()
+
+    @property
+    def unpublished(self):
+        return self.added or self.appended is not None
+
+    def write(self, columns):
+        """Writes one batch in one transaction; returns the rows written."""
+        session, stats, total = self.session, self.stats, self.total
+        with transaction.atomic():
+            started = session is None or not UploadSession.objects.filter(pk=session.pk).exists()
+            if started:
+                session = UploadSession.objects.create(filename=self.name, item_count=0)
+                stats, total = SessionStatsBuilder(), 0
+            # Accumulated on a copy, kept only once the batch commits
+            stats = copy.deepcopy(stats)
+            first = (EquipmentItem.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            rows = insert_columns(session, columns)
+            last = EquipmentItem.objects.aggregate(last=Max('id'))['last']
+            stats.add(columns)
+            SessionTypeStats.objects.filter(upload_session=session).delete()
+            stats.save(session)
+            total += rows
+            UploadSession.objects.filter(pk=session.pk).update(item_count=total)
+        self.session, self.stats, self.total = session, stats, total
+        if started:
+            # A new session is announced whole
+            self.added, self.appended = True, None
+            prune_sessions()
+        elif not self.added:
+            self.appended = (self.appended or (first, last))[0], last
+        return rows
+
+    def publish(self):
+        """Bumps the data version for the batches written since the last publish and notifies dashboards."""
+        if not self.unpublished:
+            return
+        since = get_data_version()
+        with transaction.atomic():
+            if self.added:
+                bump_data_version(added=[self.session.id])
+            else:
+                bump_data_version(appended={self.session.id: self.appended})
+        self.added, self.appended = False, None
+        self.published_at = time.monotonic()
+        notify_data_update(since)
@@ -2,13 +2,18 @@
 from django.urls import path
 from .views import (
     CSVUploadView, SummaryStatsView, EquipmentListView, 
-    HistoryListView, PDFReportView
+    HistoryListView, PDFReportView, IngestJobView, BatchUploadView, EquipmentExportView,
+    ChangesView
 )
 
 urlpatterns = [
     path('upload/', CSVUploadView.as_view(), name='csv-upload'),
+    path('upload/batch/', BatchUploadView.as_view(), name='batch-upload'),
     path('summary/', SummaryStatsView.as_view(), name='summary-stats'),
     path('equipment/', EquipmentListView.as_view(), name='equipment-list'),
+    path('export/', EquipmentExportView.as_view(), name='equipment-export'),
     path('history/', HistoryListView.as_view(), name='history-list'),
+    path('changes/', ChangesView.as_view(), name='changes'),
     path('report/', PDFReportView.as_view(), name='pdf-report'),
+    path('jobs/<uuid:job_id>/', IngestJobView.as_view(), name='ingest-job'),
 ]
@@ -1,31 +1,42 @@
 
-import io
-import pandas as pd
+import tempfile
 from datetime import datetime
-from django.db.models import Avg, Count
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 
-# ReportLab Core Imports
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
+from .models import UploadSession, EquipmentItem, IngestJob
+from .ingest import hash_upload, upload_source, ingest_unique, prune_sessions
+from .batch import spool_batch, batch_filename, ingest_batch, discard_spool
+from .jobs import submit_upload, live_rows_processed
+from .notifications import notify_data_update
+from .caching import get_data_version, versioned_cache
+from .changes import ChangeLogExpired, changed_items, changes_since
+from .export import CONTENT_TYPES, as_async, csv_chunks, export_chunk_rows, gzip_chunks, ndjson_chunks
+from .filters import equipment_queryset, filter_equipment
+from .middleware import choose_encoding
+from .pagination import EquipmentCursorPagination
+from .reports import cached_report, prewarm_report, session_report_name
+from .stats import combined_stats, combined_sketches, distribution, summary_data
+from .renderers import FastJSONRenderer, NDJSONRenderer, CSVRenderer
+from .serializers import (
+    COLUMN_DICTIONARY_FIELDS, EquipmentItemSerializer, UploadSessionSerializer, IngestJobSerializer, ValuesSerializer,
+)
 
-# ReportLab Graphics Imports for Charts
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from reportlab.graphics.charts.legends import Legend
-
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from .models import UploadSession, EquipmentItem
-from .serializers import EquipmentItemSerializer, UploadSessionSerializer
+def deduplicated_response(session):
+    return Response({
+        "success": True,
+        "deduplicated": True,
+        "session_id": session.id,
+        "message": f"Identical file already uploaded as {session.filename} ({session.item_count} items)"
+    }, status=status.HTTP_200_OK)
 
 class CSVUploadView(APIView):
     authentication_classes = [BasicAuthentication]
@@ -36,220 +47,255 @@ class CSVUploadView(APIView):
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
         
         csv_file = request.FILES['file']
-        try:
-            df = pd.read_csv(csv_file)
-            
-            # Validate columns
-            required_cols = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-            if not all(col in df.columns for col in required_cols):
-                return Response({"error": f"Missing required columns. Needed: {required_cols}"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Create session
-            session = UploadSession.objects.create(
-                filename=csv_file.name,
-                item_count=len(df)
-            )
 
-            # Store items
-            items = []
-            for _, row in df.iterrows():
-                items.append(EquipmentItem(
-                    upload_session=session,
-                    equipment_name=row['Equipment Name'],
-                    equipment_type=row['Type'],
-                    flowrate=float(row['Flowrate']),
-                    pressure=float(row['Pressure']),
-                    temperature=float(row['Temperature'])
-                ))
-            EquipmentItem.objects.bulk_create(items)
+        # ?async=1: hand the file to a background job and answer right away
+        if request.query_params.get('async') in ('1', 'true'):
+            job, duplicate = submit_upload(csv_file)
+            if duplicate:
+                return deduplicated_response(duplicate)
+            response = Response({
+                "success": True,
+                "deduplicated": False,
+                "job_id": str(job.id),
+                "state": job.state,
+                "status_url": reverse('ingest-job', kwargs={'job_id': job.id}),
+            }, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = response.data['status_url']
+            return response
+
+        try:
+            # Broadcast the delta from here (a superset if other writers commit meanwhile)
+            since = get_data_version()
+            # Identical bytes resolve to the stored session without re-parsing
+            session, created = ingest_unique(upload_source(csv_file), csv_file.name, hash_upload(csv_file))
+            if not created:
+                return deduplicated_response(session)
 
             # Maintenance: keep only last 5 uploads
-            all_sessions = UploadSession.objects.all().order_by('-upload_date')
-            if all_sessions.count() > 5:
-                ids_to_keep = list(all_sessions.values_list('id', flat=True)[:5])
-                UploadSession.objects.exclude(id__in=ids_to_keep).delete()
+            prune_sessions()
 
             # --- Real-time Notification ---
-            channel_layer = get_channel_layer()
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    'equipment_updates',
-                    {
-                        'type': 'data_update',
-                    }
-                )
-
-            return Response({"success": True, "message": f"Processed {len(items)} items"}, status=status.HTTP_201_CREATED)
+            notify_data_update(since)
+            prewarm_report()
+
+            return Response({
+                "success": True,
+                "deduplicated": False,
+                "session_id": session.id,
+                "message": f"Processed {session.item_count} items"
+            }, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class SummaryStatsView(APIView):
+class BatchUploadView(APIView):
+    """Several CSVs (``files``) or one zip: one session, one transaction, one broadcast."""
     authentication_classes = [BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        items = EquipmentItem.objects.all()
-        if not items.exists():
+    def post(self, request):
+        files = request.FILES.getlist('files') or request.FILES.getlist('file')
+        if not files:
+            return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+
+        spool = tempfile.mkdtemp(prefix='chemvis-batch-')
+        since = get_data_version()
+        try:
+            entries, content_hash = spool_batch(files, spool)
+            session, created = ingest_unique(
+                entries, batch_filename(files, entries), content_hash, ingest=ingest_batch
+            )
+            if not created:
+                return deduplicated_response(session)
+
+            prune_sessions()
+            notify_data_update(since)
+            prewarm_report()
+
             return Response({
-                "total_equipment": 0, "avg_flowrate": 0, "avg_pressure": 0, 
-                "avg_temperature": 0, "type_distribution": {}
-            })
+                "success": True,
+                "deduplicated": False,
+                "session_id": session.id,
+                "files": len(entries),
+                "message": f"Processed {session.item_count} items from {len(entries)} files"
+            }, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            discard_spool(spool)
 
-        summary = items.aggregate(
-            avg_flowrate=Avg('flowrate'),
-            avg_pressure=Avg('pressure'),
-            avg_temperature=Avg('temperature'),
-            count=Count('id')
-        )
+class IngestJobView(APIView):
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
 
-        dist = items.values('equipment_type').annotate(count=Count('id'))
-        type_distribution = {d['equipment_type']: d['count'] for d in dist}
+    def get(self, request, job_id):
+        job = get_object_or_404(IngestJob, pk=job_id)
+        data = IngestJobSerializer(job).data
+        data['rows_processed'] = live_rows_processed(job)
+        return Response(data)
 
-        return Response({
-            "total_equipment": summary['count'],
-            "avg_flowrate": round(summary['avg_flowrate'] or 0, 2),
-            "avg_pressure": round(summary['avg_pressure'] or 0, 2),
-            "avg_temperature": round(summary['avg_temperature'] or 0, 2),
-            "type_distribution": type_distribution
-        })
+DISTRIBUTION_BINS = 10
+MAX_DISTRIBUTION_BINS = 100
+
+class SummaryStatsView(APIView):
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @versioned_cache
+    def get(self, request):
+        include_distribution = request.query_params.get('include') == 'distribution'
+        try:
+            bins = int(request.query_params.get('bins', DISTRIBUTION_BINS))
+            if not 1 <= bins <= MAX_DISTRIBUTION_BINS:
+                raise ValueError(f"bins must be between 1 and {MAX_DISTRIBUTION_BINS}")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Combined from the per-session stats rows written at ingest time
+        totals, by_type = combined_stats()
+        data = summary_data(totals, by_type)
+        if include_distribution:
+            # Quantiles/histograms from merged per-session sketches; never sorts raw rows
+            data["distribution"] = distribution(totals, by_type, combined_sketches(), bins=bins)
+        return Response(data)
 
 class EquipmentListView(APIView):
     authentication_classes = [BasicAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
+    @versioned_cache
     def get(self, request):
-        items = EquipmentItem.objects.all().order_by('-id')
-        serializer = EquipmentItemSerializer(items, many=True)
-        return Response(serializer.data)
+        try:
+            items = equipment_queryset(request.query_params)
+            serializer = ValuesSerializer(EquipmentItemSerializer, ValuesSerializer.requested_fields(request))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        layout = request.query_params.get('layout', 'rows')
+        if layout not in ('rows', 'columns'):
+            return Response({"error": "layout must be 'rows' or 'columns'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = EquipmentCursorPagination()
+        if paginator.is_requested(request):
+            paginator.ordering = items.query.order_by
+            # The cursor is read from the ordering field, so fetch it even if not requested
+            cursor_field = paginator.ordering[0].lstrip('-')
+            page = paginator.paginate_queryset(serializer.values(items, extra=[cursor_field]), request, view=self)
+            if layout == 'columns':
+                return paginator.get_paginated_response(serializer.columns(page, COLUMN_DICTIONARY_FIELDS))
+            return paginator.get_paginated_response(serializer.data(page))
+        if layout == 'columns':
+            rows = list(items.values_list(*serializer.fields))
+            return Response({"count": len(rows), "columns": serializer.columns(rows, COLUMN_DICTIONARY_FIELDS)})
+        return Response(serializer.data(serializer.values(items)))
 
 class HistoryListView(APIView):
     authentication_classes = [BasicAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
+    @versioned_cache
     def get(self, request):
+        try:
+            serializer = ValuesSerializer(UploadSessionSerializer, ValuesSerializer.requested_fields(request))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         history = UploadSession.objects.all().order_by('-upload_date')
-        serializer = UploadSessionSerializer(history, many=True)
-        return Response(serializer.data)
+        return Response(serializer.data(serializer.values(history)))
+
+class ChangesView(APIView):
+    """
+    Delta sync: ``?since=<version>`` returns the sessions added since then
+    (with their equipment rows), the sessions appended to since then (listed
+    in ``appended``, with only the new rows) and the ids of sessions deleted
+    since then.
+    Without ``since`` it returns the current version to start from.
+    """
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    @versioned_cache
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({"version": get_data_version()})
+        if not since.isdigit():
+            return Response({"error": "since must be a data version (a non-negative integer)"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            serializer = ValuesSerializer(EquipmentItemSerializer, ValuesSerializer.requested_fields(request))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            changes = changes_since(int(since))
+        except ChangeLogExpired as e:
+            return Response({"error": str(e), "version": get_data_version()}, status=status.HTTP_410_GONE)
+
+        sessions = ValuesSerializer(UploadSessionSerializer)
+        changed = UploadSession.objects.filter(id__in=[*changes['added'], *changes['appended']]).order_by('-upload_date')
+        items = changed_items(changes).order_by('-id')
+        return Response({
+            "version": changes['version'],
+            "since": int(since),
+            "sessions": sessions.data(sessions.values(changed)),
+            "appended": sorted(changes['appended']),
+            "deleted": changes['deleted'],
+            "items": serializer.data(serializer.values(items)),
+        })
+
+class EquipmentExportView(APIView):
+    """Streams every (filtered) equipment row as NDJSON or CSV, gzipped when the client accepts it."""
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get(self, request):
+        try:
+            fields = ValuesSerializer(EquipmentItemSerializer, ValuesSerializer.requested_fields(request)).fields
+            items = filter_equipment(EquipmentItem.objects.order_by('id'), request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        export_format = request.accepted_renderer.format
+        encode = ndjson_chunks if export_format == 'ndjson' else csv_chunks
+        chunks = encode(items, fields, export_chunk_rows())
+        # Only gzip is streamed; negotiated like CompressionMiddleware (q-values, '*')
+        gzipped = choose_encoding(request.headers.get('Accept-Encoding', ''), ['gzip']) == 'gzip'
+        if gzipped:
+            chunks = gzip_chunks(chunks)
+        if isinstance(request._request, ASGIRequest):
+            # Django buffers sync iterators under ASGI; hand it an async one
+            chunks = as_async(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="equipment.{export_format}"'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        return response
 
 class PDFReportView(APIView):
+    """
+    The summary report as a PDF (``?include=equipment`` appends the full
+    equipment listing, ``?session=<id>`` limits it to one upload session),
+    served from the per-version report cache (see reports.py).
+    """
     authentication_classes = [BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        items = EquipmentItem.objects.all()
-        if not items.exists():
+        include_equipment = request.query_params.get('include') == 'equipment'
+        session = request.query_params.get('session')
+        if session is not None:
+            if not session.isdigit():
+                return Response({"error": "session must be an upload session id"}, status=status.HTTP_400_BAD_REQUEST)
+            session = get_object_or_404(UploadSession, pk=int(session))
+        path = cached_report(include_equipment=include_equipment, session=session)
+        if path is None:
             return Response({"error": "No data available for report generation."}, status=status.HTTP_404_NOT_FOUND)
 
-        summary = items.aggregate(
-            flow=Avg('flowrate'), 
-            press=Avg('pressure'), 
-            temp=Avg('temperature'), 
-            count=Count('id')
-        )
-        dist_queryset = items.values('equipment_type').annotate(count=Count('id')).order_by('-count')
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=36)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Styles
-        title_style = ParagraphStyle('TitleStyle', parent=styles['Heading1'], alignment=TA_CENTER, fontSize=20, spaceAfter=20, textColor=colors.HexColor("#1e293b"))
-        subtitle_style = ParagraphStyle('SubStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=10, spaceAfter=30, textColor=colors.gray)
-        section_style = ParagraphStyle('SectionStyle', parent=styles['Heading2'], fontSize=14, fontName='Helvetica-Bold', spaceBefore=20, spaceAfter=12, textColor=colors.HexColor("#3b82f6"))
-
-        # 1. Title Section
-        elements.append(Paragraph("ChemVis Pro Industrial Report", title_style))
-        elements.append(Paragraph(f"System Analytics Generated on {datetime.now().strftime('%B %d, %Y at %H:%M')}", subtitle_style))
-        
-        # 2. Global Metrics Table
-        elements.append(Paragraph("I. Global Summary Metrics", section_style))
-        summary_data = [
-            ['Metric', 'Calculated Average / Total'],
-            ['Total Equipment Units', f"{summary['count']}"],
-            ['Average Flowrate', f"{summary['flow']:.2f} m³/h"],
-            ['Average Pressure', f"{summary['press']:.2f} Bar"],
-            ['Average Temperature', f"{summary['temp']:.2f} °C"]
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[200, 200])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#334155")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#f8fafc")),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor("#1e293b")),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#e2e8f0")),
-            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-            ('PADDING', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(summary_table)
-        elements.append(Spacer(1, 30))
-
-        # 3. Visual Analytics (Chart)
-        elements.append(Paragraph("II. Equipment Distribution Analytics", section_style))
-        
-        chart_drawing = Drawing(400, 200)
-        bc = VerticalBarChart()
-        bc.x = 50
-        bc.y = 50
-        bc.height = 125
-        bc.width = 300
-        
-        chart_labels = [d['equipment_type'] for d in dist_queryset]
-        chart_values = [d['count'] for d in dist_queryset]
-        
-        bc.data = [tuple(chart_values)]
-        bc.strokeColor = colors.white
-        bc.valueAxis.valueMin = 0
-        bc.valueAxis.valueMax = max(chart_values) + 1
-        bc.valueAxis.valueStep = 1
-        bc.categoryAxis.labels.boxAnchor = 'ne'
-        bc.categoryAxis.labels.dx = 8
-        bc.categoryAxis.labels.dy = -2
-        bc.categoryAxis.labels.angle = 30
-        bc.categoryAxis.categoryNames = chart_labels
-        bc.bars[0].fillColor = colors.HexColor("#3b82f6")
-        bc.bars.roundedLabels = 1
-        
-        chart_drawing.add(bc)
-        elements.append(chart_drawing)
-        elements.append(Spacer(1, 20))
-
-        # 4. Distribution Details Table
-        elements.append(Paragraph("III. Tabular Distribution", section_style))
-        dist_data = [['Equipment Type', 'Unit Count', 'Percentage']]
-        total_count = summary['count']
-        
-        for d in dist_queryset:
-            percentage = (d['count'] / total_count * 100) if total_count > 0 else 0
-            dist_data.append([d['equipment_type'], str(d['count']), f"{percentage:.1f}%"])
-
-        dist_table = Table(dist_data, colWidths=[150, 125, 125])
-        dist_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#3b82f6")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(dist_table)
-
-        doc.build(elements)
-        
-        pdf_content = buffer.getvalue()
-        buffer.close()
-        
-        response = HttpResponse(pdf_content, content_type='application/pdf')
         filename = f"Industrial_Report_{datetime.now().strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if session is not None:
+            filename = session_report_name(session)
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
         response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-        
         return response
@@ -1,6 +1,7 @@
 
 import React from 'react';
 import { HistoryEntry } from '../types';
+import { downloadReport } from '../services/api';
 
 interface HistoryListProps {
   history: HistoryEntry[];
@@ -36,6 +37,13 @@ export const HistoryList: React.FC<HistoryListProps> = ({ history, loading }) =>
                 <div className="flex items-center justify-between text-[10px] text-slate-400 mt-1">
                   <span>{new Date(entry.upload_date).toLocaleString()}</span>
                   <span className="bg-slate-100 px-1 rounded font-bold">{entry.item_count} items</span>
+                  <button
+                    onClick={() => downloadReport(entry.id)}
+                    title="Download this session's PDF report"
+                    className="text-slate-400 hover:text-blue-500"
+                  >
+                    <i className="fas fa-file-pdf"></i>
+                  </button>
                 </div>
               </div>
             </div>
@@ -1,4 +1,5 @@
 
+import os
 import sys
 import json
 import requests
@@ -20,28 +21,104 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
 from reportlab.pdfgen import canvas
 
+try:
+    import msgpack
+    import numpy as np
+except ImportError:  # JSON updates only
+    msgpack = None
+
 # --- Configuration ---
 API_BASE_URL = "http://localhost:8000/api"
 WS_URL = "ws://localhost:8000/ws/updates/"
 AUTH_CREDENTIALS = ('admin', 'password123')
+# Binary update frames, used when msgpack is installed
+PACKED_PROTOCOL = 'chemvis.msgpack'
+
+def columns_to_rows(columns):
+    """Rows from a ``?layout=columns`` body, decoding dictionary-encoded fields."""
+    decoded = {}
+    for field, values in columns.items():
+        if isinstance(values, dict):
+            dictionary = values['dictionary']
+            values = [dictionary[code] for code in values['codes']]
+        decoded[field] = values
+    fields = list(decoded)
+    return [dict(zip(fields, row)) for row in zip(*decoded.values())]
+
+def unpack_update(frame):
+    """An update message from a MessagePack frame: metric columns unpacked, items back to rows."""
+    message = msgpack.unpackb(frame)
+    if 'items' in message:
+        columns = message['items']['columns']
+        for metric in ('flowrate', 'pressure', 'temperature'):
+            columns[metric] = np.frombuffer(columns[metric], '<f8').tolist()
+        message['items'] = columns_to_rows(columns)
+    return message
+
+def apply_changes(equipment, changes):
+    """
+    Patches newest-first rows with a /changes/ response; rows of deleted and
+    re-sent sessions are replaced, sessions in ``appended`` gain the new rows.
+    """
+    appended = set(changes.get('appended', []))
+    replaced = set(changes['deleted']) | {session['id'] for session in changes['sessions']} - appended
+    fresh = {item['id'] for item in changes['items']}
+    kept = [item for item in equipment if item.get('upload_session') not in replaced and item['id'] not in fresh]
+    return sorted(changes['items'] + kept, key=lambda item: item['id'], reverse=True)
 
 class DataFetchThread(QThread):
     """
     Background worker for fetching data without blocking the UI.
     """
     data_ready = pyqtSignal(dict)
+    # url -> (ETag, parsed body) of the last 200, reused when the server answers 304
+    etag_cache = {}
+
+    def __init__(self, equipment=None, since=None):
+        """``equipment`` rows known to be current as of data version ``since`` are patched rather than refetched."""
+        super().__init__()
+        self.equipment = equipment
+        self.since = since
+
+    def get_json(self, url):
+        """GET with If-None-Match; returns the parsed body or None on failure."""
+        cached = self.etag_cache.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        # Quick timeout for responsive UI
+        res = requests.get(url, auth=AUTH_CREDENTIALS, headers=headers, timeout=2)
+        if res.status_code == 304 and cached:
+            return cached[1]
+        if res.status_code != 200:
+            return None
+        body = res.json()
+        if res.headers.get('ETag'):
+            self.etag_cache[url] = (res.headers['ETag'], body)
+        return body
     
     def run(self):
         try:
-            # Quick timeout for responsive UI
-            summary_res = requests.get(f"{API_BASE_URL}/summary/", auth=AUTH_CREDENTIALS, timeout=2)
-            list_res = requests.get(f"{API_BASE_URL}/equipment/", auth=AUTH_CREDENTIALS, timeout=2)
-            
-            if summary_res.status_code == 200 and list_res.status_code == 200:
+            summary = self.get_json(f"{API_BASE_URL}/summary/")
+            equipment = version = None
+            if self.equipment is not None and self.since is not None:
+                # None when the server's change log no longer covers our version (410)
+                changes = self.get_json(f"{API_BASE_URL}/changes/?since={self.since}")
+                if changes is not None:
+                    equipment, version = apply_changes(self.equipment, changes), changes['version']
+            if equipment is None:
+                # Version first: changes committed during the load are replayed harmlessly
+                current = self.get_json(f"{API_BASE_URL}/changes/")
+                version = current['version'] if current is not None else None
+                # Columnar layout: smaller to transfer and parse; requests negotiates
+                # compression (gzip, plus br/zstd when those packages are installed)
+                columns = self.get_json(f"{API_BASE_URL}/equipment/?layout=columns")
+                equipment = columns_to_rows(columns['columns']) if columns is not None else None
+            
+            if summary is not None and equipment is not None:
                 self.data_ready.emit({
                     'success': True,
-                    'summary': summary_res.json(),
-                    'equipment': list_res.json()
+                    'summary': summary,
+                    'equipment': equipment,
+                    'version': version
                 })
             else:
                 self.data_ready.emit({'success': False})
@@ -52,25 +129,26 @@ class DataFetchThread(QThread):
 class WebSocketThread(QThread):
     """
     Background worker that listens for WebSocket broadcast events from Django Channels.
-    Emits a signal to the main thread to trigger data refreshes.
-    Gracefully handles connection failures.
+    Emits a signal to the main thread with the update message (which carries
+    the delta when it was small enough). Gracefully handles connection failures.
     """
-    data_changed_signal = pyqtSignal()
+    data_changed_signal = pyqtSignal(dict)
 
     def run(self):
         try:
             import websocket
             def on_message(ws, message):
                 try:
-                    msg_data = json.loads(message)
+                    msg_data = unpack_update(message) if isinstance(message, bytes) else json.loads(message)
                     if msg_data.get('message') == 'data_updated':
-                        self.data_changed_signal.emit()
+                        self.data_changed_signal.emit(msg_data)
                 except:
                     pass
 
             # Attempt persistent connection with timeout
             ws = websocket.WebSocketApp(
                 WS_URL,
+                subprotocols=[PACKED_PROTOCOL] if msgpack else None,
                 on_message=on_message,
                 on_error=lambda ws, err: None,
                 on_close=lambda ws, code, msg: None
@@ -86,6 +164,9 @@ class ChemVisDesktop(QMainWindow):
         self.setWindowTitle("ChemVis Pro | Industrial Dashboard")
         self.setMinimumSize(1100, 750)
         self.data_fetch_thread = None
+        # Rows in the table and the data version they are current as of (None: unknown)
+        self.equipment = None
+        self.data_version = None
         self.setup_ui()
         
         # Load demo data immediately for instant display
@@ -93,7 +174,7 @@ class ChemVisDesktop(QMainWindow):
         
         # Start the real-time update listener
         self.ws_worker = WebSocketThread()
-        self.ws_worker.data_changed_signal.connect(self.fetch_system_data)
+        self.ws_worker.data_changed_signal.connect(self.apply_update)
         self.ws_worker.start()
 
         # Try to fetch real data in background
@@ -241,10 +322,24 @@ class ChemVisDesktop(QMainWindow):
             self.data_fetch_thread.wait()
         
         # Start new fetch in background
-        self.data_fetch_thread = DataFetchThread()
+        self.data_fetch_thread = DataFetchThread(self.equipment, self.data_version)
         self.data_fetch_thread.data_ready.connect(self.handle_data_response)
         self.data_fetch_thread.start()
     
+    def apply_update(self, update):
+        """Applies a pushed delta that starts at or before our version; fetches otherwise."""
+        version, since = update.get('version'), update.get('since')
+        if self.data_version is not None and version is not None and version <= self.data_version:
+            return
+        if (update.get('refetch') or 'summary' not in update or self.equipment is None
+                or self.data_version is None or since is None or since > self.data_version):
+            self.fetch_system_data()
+            return
+        self.handle_data_response({
+            'success': True, 'summary': update['summary'],
+            'equipment': apply_changes(self.equipment, update), 'version': version,
+        })
+
     def handle_data_response(self, data):
         """Handle data from background thread."""
         if data.get('success'):
@@ -257,7 +352,8 @@ class ChemVisDesktop(QMainWindow):
             self.update_distribution_chart(s.get('type_distribution', {}))
             
             # Update table
-            items = data['equipment']
+            items = self.equipment = data['equipment']
+            self.data_version = data.get('version')
             self.data_table.setRowCount(len(items))
             for i, item in enumerate(items):
                 self.data_table.setItem(i, 0, QTableWidgetItem(str(item.get('equipment_name', ''))))
@@ -328,11 +424,32 @@ class ChemVisDesktop(QMainWindow):
         
         self.canvas.draw()
 
+    def read_data_file(self, file_path):
+        """Load a CSV, Parquet, Arrow IPC or NumPy .npz parameters file into a DataFrame."""
+        import pandas as pd
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in ('.parquet', '.pq'):
+            return pd.read_parquet(file_path)
+        if ext in ('.arrow', '.feather', '.ipc'):
+            import pyarrow as pa
+            import pyarrow.ipc
+            with pa.memory_map(file_path) as source:
+                try:
+                    return pa.ipc.open_file(source).read_pandas()
+                except pa.ArrowInvalid:
+                    source.seek(0)
+                    return pa.ipc.open_stream(source).read_pandas()
+        if ext == '.npz':
+            import numpy as np
+            with np.load(file_path, allow_pickle=False) as archive:
+                return pd.DataFrame({key: archive[key] for key in archive.files})
+        return pd.read_csv(file_path)
+
     def validate_csv(self, file_path):
-        """Validate CSV file format and content."""
+        """Validate data file format and content."""
         try:
             import pandas as pd
-            df = pd.read_csv(file_path)
+            df = self.read_data_file(file_path)
             
             # Check required columns
             required_cols = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
@@ -355,7 +472,7 @@ class ChemVisDesktop(QMainWindow):
             
             return True, df
         except Exception as e:
-            return False, f"Error reading CSV file: {str(e)}"
+            return False, f"Error reading data file: {str(e)}"
     
     def process_csv_locally(self, df):
         """Process CSV data and display it locally when server is unavailable."""
@@ -392,7 +509,9 @@ class ChemVisDesktop(QMainWindow):
     def handle_upload(self):
         """Enhanced file upload with validation and local processing fallback."""
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select Parameters CSV", "", "CSV Files (*.csv);;All Files (*.*)"
+            self, "Select Parameters File", "",
+            "Data Files (*.csv *.parquet *.pq *.arrow *.feather *.ipc *.npz);;CSV Files (*.csv);;"
+            "Columnar Files (*.parquet *.pq *.arrow *.feather *.ipc *.npz);;All Files (*.*)"
         )
         if not file_path:
             return
@@ -418,9 +537,9 @@ class ChemVisDesktop(QMainWindow):
         
         try:
             with open(file_path, 'rb') as f:
-                import os
                 filename = os.path.basename(file_path)
-                files = {'file': (filename, f, 'text/csv')}
+                content_type = 'text/csv' if filename.lower().endswith('.csv') else 'application/octet-stream'
+                files = {'file': (filename, f, content_type)}
                 
                 response = requests.post(
                     f"{API_BASE_URL}/upload/", 
@@ -429,13 +548,21 @@ class ChemVisDesktop(QMainWindow):
                     timeout=8
                 )
                 
-                if response.status_code == 201:
-                    msg = response.json().get('message', 'Upload successful')
-                    QMessageBox.information(
-                        self, 
-                        "✓ Upload Successful", 
-                        f"Data uploaded to server successfully!\n\n{msg}\n\nRecords: {len(df)}"
-                    )
+                if response.status_code in (200, 201):
+                    result = response.json()
+                    msg = result.get('message', 'Upload successful')
+                    if result.get('deduplicated'):
+                        QMessageBox.information(
+                            self,
+                            "Already Uploaded",
+                            f"This file was already uploaded; no new data was stored.\n\n{msg}"
+                        )
+                    else:
+                        QMessageBox.information(
+                            self, 
+                            "✓ Upload Successful", 
+                            f"Data uploaded to server successfully!\n\n{msg}\n\nRecords: {len(df)}"
+                        )
                     self.fetch_system_data()
                     return
                 else:
@@ -507,6 +634,22 @@ class ChemVisDesktop(QMainWindow):
                 self.status_label.setText("● DEMO MODE")
                 self.status_label.setStyleSheet("color: #f59e0b; font-weight: bold; font-size: 11px; margin-right: 15px;")
 
+    def download_server_report(self, save_path):
+        """Streams the server's report with the full equipment listing to ``save_path``; False on failure."""
+        try:
+            with requests.get(
+                f"{API_BASE_URL}/report/", params={'include': 'equipment'},
+                auth=AUTH_CREDENTIALS, stream=True, timeout=(2, 120)
+            ) as res:
+                if res.status_code != 200:
+                    return False
+                with open(save_path, 'wb') as f:
+                    for chunk in res.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            return True
+        except requests.RequestException:
+            return False
+
     def generate_pdf_report(self):
         """Generate a comprehensive PDF report with charts and equipment data."""
         try:
@@ -515,6 +658,11 @@ class ChemVisDesktop(QMainWindow):
             )
             if not save_path:
                 return
+
+            # Online: the server renders the full listing page by page from the database
+            if self.data_version is not None and self.download_server_report(save_path):
+                QMessageBox.information(self, "Success", f"PDF Report Downloaded Successfully!\n\nSaved to: {save_path}")
+                return
             
             # Create PDF document
             doc = SimpleDocTemplate(save_path, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
@@ -600,17 +748,18 @@ class ChemVisDesktop(QMainWindow):
             # 4. Detailed Equipment List
             elements.append(Paragraph("DETAILED EQUIPMENT LOG", heading_style))
             
-            # Build table data from current table
-            table_data = [["Equipment Name", "Type", "Flow (m³/h)", "Pressure (Bar)", "Temp (°C)"]]
+            # Build table data from current table, a chunk of rows per Table: splitting
+            # one huge Table across pages re-measures every remaining row on each page
+            header = ["Equipment Name", "Type", "Flow (m³/h)", "Pressure (Bar)", "Temp (°C)"]
+            rows = []
             for row in range(self.data_table.rowCount()):
                 row_data = []
                 for col in range(self.data_table.columnCount()):
                     item = self.data_table.item(row, col)
                     row_data.append(item.text() if item else "")
-                table_data.append(row_data)
+                rows.append(row_data)
             
-            equipment_table = Table(table_data, colWidths=[2.2*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.2*inch])
-            equipment_table.setStyle(TableStyle([
+            equipment_style = TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#334155')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -623,8 +772,14 @@ class ChemVisDesktop(QMainWindow):
                 ('FONTSIZE', (0, 1), (-1, -1), 8),
                 ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
                 ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
-            ]))
-            elements.append(equipment_table)
+            ])
+            for start in range(0, max(len(rows), 1), 500):
+                equipment_table = Table(
+                    [header] + rows[start:start + 500], repeatRows=1,
+                    colWidths=[2.2*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.2*inch]
+                )
+                equipment_table.setStyle(equipment_style)
+                elements.append(equipment_table)
             elements.append(Spacer(1, 0.2*inch))
             
             # 5. Footer
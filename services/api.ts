@@ -1,5 +1,5 @@
 
-import { EquipmentItem, SummaryStats, HistoryEntry } from '../types';
+import { EquipmentItem, SummaryStats, HistoryEntry, CursorPage, EquipmentFilters, EquipmentColumns, ChangeSet } from '../types';
 
 const AUTH_HEADER = 'Basic ' + btoa('admin:password123');
 const BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
@@ -73,10 +73,98 @@ export const getEquipment = async (): Promise<EquipmentItem[]> => {
   return fetchWithFallback(`${BASE_URL}/equipment/`, { headers: getHeaders() }, MOCK_EQUIPMENT);
 };
 
+const equipmentQuery = (filters: EquipmentFilters = {}) => {
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.set(key, String(value));
+  });
+  return params;
+};
+
+/**
+ * One keyset page of the equipment list, filtered and sorted server-side
+ * (newest first by default). Pass the `next` or `previous` URL of a page to
+ * move; cursors are opaque and keep the filters.
+ */
+export const getEquipmentPage = async (
+  pageUrl?: string | null, pageSize = 100, filters: EquipmentFilters = {}
+): Promise<CursorPage<EquipmentItem>> => {
+  const params = equipmentQuery(filters);
+  params.set('page_size', String(pageSize));
+  const url = pageUrl || `${BASE_URL}/equipment/?${params}`;
+  return fetchWithFallback(url, { headers: getHeaders() }, { next: null, previous: null, results: MOCK_EQUIPMENT });
+};
+
+/**
+ * The filtered equipment list as columns (`?layout=columns`): one array per
+ * field, index i of every array being row i. `equipment_type` is
+ * dictionary-encoded as `{dictionary, codes}` with
+ * `type[i] = dictionary[codes[i]]`. Large responses are compressed with the
+ * best of zstd/br/gzip the browser advertises in Accept-Encoding, which
+ * fetch() sends and decodes transparently.
+ */
+export const getEquipmentColumns = async (filters: EquipmentFilters = {}): Promise<EquipmentColumns> => {
+  const params = equipmentQuery(filters);
+  params.set('layout', 'columns');
+  const dictionary = [...new Set(MOCK_EQUIPMENT.map(item => item.equipment_type))];
+  const fallback: EquipmentColumns = {
+    count: MOCK_EQUIPMENT.length,
+    columns: {
+      id: MOCK_EQUIPMENT.map(item => item.id),
+      equipment_name: MOCK_EQUIPMENT.map(item => item.equipment_name),
+      equipment_type: { dictionary, codes: MOCK_EQUIPMENT.map(item => dictionary.indexOf(item.equipment_type)) },
+      flowrate: MOCK_EQUIPMENT.map(item => item.flowrate),
+      pressure: MOCK_EQUIPMENT.map(item => item.pressure),
+      temperature: MOCK_EQUIPMENT.map(item => item.temperature),
+    },
+  };
+  return fetchWithFallback(`${BASE_URL}/equipment/?${params}`, { headers: getHeaders() }, fallback);
+};
+
 export const getHistory = async (): Promise<HistoryEntry[]> => {
   return fetchWithFallback(`${BASE_URL}/history/`, { headers: getHeaders() }, MOCK_HISTORY);
 };
 
+/** Current data version, to pass as `since` to getChanges(); read it before a full load. */
+export const getDataVersion = async (): Promise<number | null> => {
+  try {
+    const res = await fetch(`${BASE_URL}/changes/`, { headers: getHeaders() });
+    return res.ok ? (await res.json()).version : null;
+  } catch {
+    return null;
+  }
+};
+
+/**
+ * Sessions added (with their rows) and session ids deleted since `since`.
+ * Returns null when the server no longer has that version in its change
+ * log (410) or cannot be reached: reload everything instead.
+ */
+export const getChanges = async (since: number): Promise<ChangeSet | null> => {
+  try {
+    const res = await fetch(`${BASE_URL}/changes/?since=${since}`, { headers: getHeaders() });
+    return res.ok ? await res.json() : null;
+  } catch {
+    return null;
+  }
+};
+
+/**
+ * Patches a newest-first list with a change set. Rows of deleted and
+ * re-sent sessions are dropped first; sessions listed in `appended` keep
+ * their rows and gain the new ones. Rows are matched by id, so applying a
+ * change set twice (or one overlapping a full load) is harmless.
+ */
+export const applyChanges = <T extends { id: number }>(
+  current: T[], changes: ChangeSet, added: T[], sessionOf: (row: T) => number | undefined
+): T[] => {
+  const appended = new Set(changes.appended ?? []);
+  const replaced = new Set([...changes.deleted, ...changes.sessions.map(s => s.id).filter(id => !appended.has(id))]);
+  const fresh = new Set(added.map(row => row.id));
+  const kept = current.filter(row => !replaced.has(sessionOf(row) ?? -1) && !fresh.has(row.id));
+  return [...added, ...kept].sort((a, b) => b.id - a.id);
+};
+
 /**
  * Enhanced Upload Logic:
  * In Demo Mode, we parse the CSV locally to update the dashboard charts.
@@ -157,7 +245,8 @@ export const uploadCsv = async (file: File): Promise<any> => {
 
 };
 
-export const downloadReport = async (): Promise<void> => {
+/** Downloads the PDF report: the global one, or one upload session's (`sessionId`) for audit. */
+export const downloadReport = async (sessionId?: number): Promise<void> => {
   if (isDemoMode) {
     const reportContent = `
       CHEMVIS PRO - INDUSTRIAL ANALYTICS REPORT
@@ -192,7 +281,8 @@ export const downloadReport = async (): Promise<void> => {
   }
 
   try {
-    const response = await fetch(`${BASE_URL}/report/`, { 
+    const query = sessionId === undefined ? '' : `?session=${sessionId}`;
+    const response = await fetch(`${BASE_URL}/report/${query}`, { 
       headers: { 'Authorization': AUTH_HEADER } 
     });
     
@@ -204,7 +294,8 @@ export const downloadReport = async (): Promise<void> => {
     const url = window.URL.createObjectURL(blob);
     const link = document.createElement('a');
     link.href = url;
-    link.setAttribute('download', `Industrial_Report_${new Date().toISOString().split('T')[0]}.pdf`);
+    const prefix = sessionId === undefined ? 'Industrial_Report' : `Session_${sessionId}_Report`;
+    link.setAttribute('download', `${prefix}_${new Date().toISOString().split('T')[0]}.pdf`);
     document.body.appendChild(link);
     link.click();
     
@@ -212,6 +303,6 @@ export const downloadReport = async (): Promise<void> => {
     window.URL.revokeObjectURL(url);
   } catch (err: any) {
     isDemoMode = true;
-    await downloadReport(); 
+    await downloadReport(sessionId); 
   }
 };
@@ -6,6 +6,43 @@ export interface EquipmentItem {
   flowrate: number;
   pressure: number;
   temperature: number;
+  upload_session?: number;
+}
+
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface DictionaryColumn {
+  dictionary: string[];
+  codes: number[];
+}
+
+export interface EquipmentColumns {
+  count: number;
+  columns: {
+    id: number[];
+    equipment_name: string[];
+    equipment_type: DictionaryColumn;
+    flowrate: number[];
+    pressure: number[];
+    temperature: number[];
+  };
+}
+
+export interface EquipmentFilters {
+  equipment_type?: string;
+  session?: number;
+  flowrate_min?: number;
+  flowrate_max?: number;
+  pressure_min?: number;
+  pressure_max?: number;
+  temperature_min?: number;
+  temperature_max?: number;
+  ordering?: string;
+  search?: string;
 }
 
 export interface SummaryStats {
@@ -23,6 +60,25 @@ export interface HistoryEntry {
   item_count: number;
 }
 
+export interface ChangeSet {
+  version: number;
+  since: number;
+  sessions: HistoryEntry[];
+  // Sessions in `sessions` whose `items` are only rows appended since `since`
+  appended?: number[];
+  deleted: number[];
+  items: EquipmentItem[];
+}
+
+// Pushed on ws/updates/: the delta since `since`, or only `refetch` when it was too large
+export interface DataUpdate extends Partial<ChangeSet> {
+  message: 'data_updated';
+  version?: number;
+  since?: number | null;
+  refetch?: boolean;
+  summary?: SummaryStats;
+}
+
 export interface ApiResponse<T> {
   success: boolean;
   data: T;